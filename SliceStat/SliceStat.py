@@ -1,14 +1,20 @@
 import os
+import concurrent.futures
+import contextlib
+import importlib.util
+import time
 import vtk
+import vtk.util.numpy_support
 import slicer
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
 import logging
-import csv
 import numpy as np
 import ctk
 import qt
 
+import SliceStatLib
+
 #
 # SliceStat
 #
@@ -45,6 +51,19 @@ class SliceStatWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         ScriptedLoadableModuleWidget.__init__(self, parent)
         VTKObservationMixin.__init__(self)
         self.logic = None
+        self.job = None
+        self.onJobCompleted = None
+        self.progressDialog = None
+        # Progress dialog resolution and time to run job steps between GUI updates (seconds)
+        self.progressScale = 1000
+        self.jobTimeSlice = 0.05
+        # Live slice coverage: counts, observed segmentation and modification times of the counted labelmaps
+        self.liveCounts = None
+        self.liveSegmentationNode = None
+        self.liveReferenceVolumeNode = None
+        self.liveLabelmapTimes = {}
+        # Minimum time between live updates while painting (milliseconds)
+        self.liveUpdateInterval = 100
 
     def setup(self):
         ScriptedLoadableModuleWidget.setup(self)
@@ -99,13 +118,24 @@ class SliceStatWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.outputFileLayout = qt.QHBoxLayout(self.outputFileContainer)
         self.outputFileLayout.setContentsMargins(0, 0, 0, 0)
         self.outputFileLineEdit = qt.QLineEdit()
-        self.outputFileLineEdit.setToolTip("Path for the output CSV file. Click '...' to browse. If file exists, data will be appended.")
+        self.outputFileLineEdit.setToolTip("Path for the output CSV file. Click '...' to browse. If file exists, data will be appended and rows of existing IDs updated.")
         self.outputFileButton = qt.QPushButton("...")
         self.outputFileButton.toolTip = "Select output CSV file."
         self.outputFileLayout.addWidget(self.outputFileLineEdit)
         self.outputFileLayout.addWidget(self.outputFileButton)
         singleSampleFormLayout.addRow("Output File: ", self.outputFileContainer)
 
+        #
+        # Sequence frames for Single Sample
+        #
+        self.allFramesCheckBox = qt.QCheckBox()
+        self.allFramesCheckBox.checked = True
+        self.allFramesCheckBox.enabled = False
+        self.allFramesCheckBox.setToolTip("The segmentation is a sequence (e.g. cardiac or perfusion time series): analyze all its frames "
+                                          "and write one row per frame and segment, with Frame and FrameValue columns. "
+                                          "Frames with unchanged segmentation and geometry are not processed again.")
+        singleSampleFormLayout.addRow("All sequence frames: ", self.allFramesCheckBox)
+
         #
         # Apply Button for Single Sample
         #
@@ -137,13 +167,40 @@ class SliceStatWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.multiOutputFileLayout = qt.QHBoxLayout(self.multiOutputFileContainer)
         self.multiOutputFileLayout.setContentsMargins(0, 0, 0, 0)
         self.multiOutputFileLineEdit = qt.QLineEdit()
-        self.multiOutputFileLineEdit.setToolTip("Path for the output CSV file. Click '...' to browse. If file exists, data will be appended.")
+        self.multiOutputFileLineEdit.setToolTip("Path for the output CSV file. Click '...' to browse. If file exists, data will be appended and rows of existing IDs updated.")
         self.multiOutputFileButton = qt.QPushButton("...")
         self.multiOutputFileButton.toolTip = "Select output CSV file."
         self.multiOutputFileLayout.addWidget(self.multiOutputFileLineEdit)
         self.multiOutputFileLayout.addWidget(self.multiOutputFileButton)
         multiSampleFormLayout.addRow("Output File: ", self.multiOutputFileContainer)
 
+        #
+        # Number of worker processes for Multi Sample
+        #
+        self.workersSpinBox = qt.QSpinBox()
+        self.workersSpinBox.minimum = 1
+        self.workersSpinBox.maximum = max(1, os.cpu_count() or 1)
+        self.workersSpinBox.value = 1
+        self.workersSpinBox.setToolTip("Number of worker processes. Volumes and segmentations loaded from unmodified .nii.gz and .seg.nrrd files on the same voxel grid are processed in parallel.")
+        multiSampleFormLayout.addRow("Workers: ", self.workersSpinBox)
+
+        #
+        # Result cache for Multi Sample
+        #
+        self.useResultCacheCheckBox = qt.QCheckBox()
+        self.useResultCacheCheckBox.checked = True
+        self.useResultCacheCheckBox.setToolTip("Reuse results of volumes and segmentations that did not change since a previous export.")
+        multiSampleFormLayout.addRow("Use result cache: ", self.useResultCacheCheckBox)
+
+        #
+        # Resume interrupted exports for Multi Sample
+        #
+        self.resumeExportCheckBox = qt.QCheckBox()
+        self.resumeExportCheckBox.checked = True
+        self.resumeExportCheckBox.setToolTip("Results are written as each volume is done. If a previous export to the same "
+                                             "output file was interrupted, skip the volumes it already wrote.")
+        multiSampleFormLayout.addRow("Resume interrupted export: ", self.resumeExportCheckBox)
+
         #
         # Apply Button for Multi Sample
         #
@@ -152,11 +209,132 @@ class SliceStatWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.applyMultiButton.enabled = False
         multiSampleFormLayout.addRow(self.applyMultiButton)
 
+        #
+        # Output Options Area
+        #
+        optionsCollapsibleButton = ctk.ctkCollapsibleButton()
+        optionsCollapsibleButton.text = "Output Options"
+        optionsCollapsibleButton.collapsed = True
+        self.layout.addWidget(optionsCollapsibleButton)
+
+        # Layout within the collapsible button
+        optionsFormLayout = qt.QFormLayout(optionsCollapsibleButton)
+
+        self.intervalColumnCheckBox = qt.QCheckBox()
+        self.intervalColumnCheckBox.checked = False
+        self.intervalColumnCheckBox.setToolTip("Add a SliceIntervals column with slice ranges (e.g. 12-87,90-95) to new output files.")
+        optionsFormLayout.addRow("Slice intervals column: ", self.intervalColumnCheckBox)
+
+        self.columnarFormatComboBox = qt.QComboBox()
+        self.columnarFormatComboBox.addItem("None", "")
+        self.columnarFormatComboBox.addItem("Parquet", "parquet")
+        self.columnarFormatComboBox.addItem("Feather", "feather")
+        self.columnarFormatComboBox.addItem("NPZ", "npz")
+        self.columnarFormatComboBox.setToolTip("Also write the results to a columnar file next to the CSV file (e.g. output.parquet), "
+                                               "with the ID on every row and slice numbers stored as integer lists.")
+        optionsFormLayout.addRow("Columnar export: ", self.columnarFormatComboBox)
+
+        self.statisticsTableCheckBox = qt.QCheckBox()
+        self.statisticsTableCheckBox.checked = False
+        self.statisticsTableCheckBox.setToolTip("Also write per-slice voxel counts and areas (mm²) along the K, J and I axes "
+                                                "to a side table next to the CSV file (e.g. output_stats.csv). "
+                                                "Multi Sample volumes are then processed in the scene, without workers or result cache.")
+        optionsFormLayout.addRow("Slice statistics table: ", self.statisticsTableCheckBox)
+
+        self.exactVoxelSlicesCheckBox = qt.QCheckBox()
+        self.exactVoxelSlicesCheckBox.checked = False
+        self.exactVoxelSlicesCheckBox.setToolTip("Rasterize segments stored as closed surfaces (e.g. imported STL/OBJ models) "
+                                                 "to find their slices. Otherwise a slice is counted if its plane intersects the surface, "
+                                                 "which is much faster for large meshes.")
+        optionsFormLayout.addRow("Exact voxel slices for surfaces: ", self.exactVoxelSlicesCheckBox)
+
+        self.cohortIndexCheckBox = qt.QCheckBox()
+        self.cohortIndexCheckBox.checked = False
+        self.cohortIndexCheckBox.setToolTip("Also fill a SQLite index of the exported segments next to the CSV file "
+                                            "(e.g. output_index.sqlite), for fast cohort queries by segment, slice and slice count "
+                                            "(see SliceStatLogic.query_cohort).")
+        optionsFormLayout.addRow("Cohort index: ", self.cohortIndexCheckBox)
+
+        self.cohortSummaryCheckBox = qt.QCheckBox()
+        self.cohortSummaryCheckBox.checked = False
+        self.cohortSummaryCheckBox.setToolTip("Multi Sample: also write a summary table next to the CSV file (e.g. output_summary.csv) "
+                                              "with, per segment name, the number of cases containing it, the slice count "
+                                              "distribution (mean, standard deviation, quantiles) and the first and last slices. "
+                                              "It is computed while volumes are processed, without reading the output again.")
+        optionsFormLayout.addRow("Cohort summary table: ", self.cohortSummaryCheckBox)
+
+        self.presenceMasksCheckBox = qt.QCheckBox()
+        self.presenceMasksCheckBox.checked = False
+        self.presenceMasksCheckBox.setToolTip("Also save the slice presence of each volume and segment as bit-packed masks "
+                                              "next to the CSV file (e.g. output_masks.npz), for fast intersections, unions and "
+                                              "overlaps across segments and volumes (see SliceStatLib.PresenceMaskStore).")
+        optionsFormLayout.addRow("Slice masks file: ", self.presenceMasksCheckBox)
+
+        self.extractionCacheSizeSpinBox = qt.QSpinBox()
+        self.extractionCacheSizeSpinBox.minimum = 0
+        self.extractionCacheSizeSpinBox.maximum = 16384
+        self.extractionCacheSizeSpinBox.value = SliceStatLib.DEFAULT_EXTRACTION_CACHE_SIZE // (1024 * 1024)
+        self.extractionCacheSizeSpinBox.suffix = " MB"
+        self.extractionCacheSizeSpinBox.setToolTip("Memory limit of the session cache of extracted slices. A segmentation that is "
+                                                   "matched with several volumes on the same voxel grid, or processed again "
+                                                   "without changes, is not extracted again. 0 disables the cache.")
+        optionsFormLayout.addRow("Extraction cache: ", self.extractionCacheSizeSpinBox)
+
+        self.printResultsCheckBox = qt.QCheckBox()
+        self.printResultsCheckBox.checked = True
+        self.printResultsCheckBox.setToolTip("Print the slice numbers of each segment to the Python console.")
+        optionsFormLayout.addRow("Print results to console: ", self.printResultsCheckBox)
+
+        self.profilingCheckBox = qt.QCheckBox()
+        self.profilingCheckBox.checked = False
+        self.profilingCheckBox.setToolTip("Record wall time, allocated memory and extraction path of each stage and segment. "
+                                          "A JSON trace is written next to the CSV file (e.g. output_trace.json) "
+                                          "and a summary is shown when processing completes.")
+        optionsFormLayout.addRow("Profiling trace: ", self.profilingCheckBox)
+
+        #
+        # Live Slice Coverage Area
+        #
+        liveCollapsibleButton = ctk.ctkCollapsibleButton()
+        liveCollapsibleButton.text = "Live Slice Coverage"
+        liveCollapsibleButton.collapsed = True
+        self.layout.addWidget(liveCollapsibleButton)
+
+        # Layout within the collapsible button
+        liveFormLayout = qt.QFormLayout(liveCollapsibleButton)
+
+        self.liveUpdateCheckBox = qt.QCheckBox()
+        self.liveUpdateCheckBox.checked = False
+        self.liveUpdateCheckBox.setToolTip("Show the slices of each segment of the Single Sample segmentation and update them "
+                                           "while segments are edited (e.g. painted in Segment Editor). "
+                                           "Only modified segments are counted again.")
+        liveFormLayout.addRow("Live update: ", self.liveUpdateCheckBox)
+
+        self.liveTable = qt.QTableWidget(0, 3)
+        self.liveTable.setHorizontalHeaderLabels(["Segment", "Slices", "Voxels"])
+        self.liveTable.horizontalHeader().setStretchLastSection(True)
+        self.liveTable.verticalHeader().visible = False
+        self.liveTable.setEditTriggers(qt.QAbstractItemView.NoEditTriggers)
+        liveFormLayout.addRow(self.liveTable)
+
+        # Timer that limits live updates to one per liveUpdateInterval while painting
+        self.liveUpdateTimer = qt.QTimer()
+        self.liveUpdateTimer.setSingleShot(True)
+        self.liveUpdateTimer.setInterval(self.liveUpdateInterval)
+        self.liveUpdateTimer.connect('timeout()', self.onLiveUpdateTimer)
+
+        # Timer that runs background job steps
+        self.jobTimer = qt.QTimer()
+        self.jobTimer.setInterval(0)
+        self.jobTimer.connect('timeout()', self.onJobTimer)
+
         # Connections
         self.applyButton.connect('clicked(bool)', self.onApplyButton)
         self.applyMultiButton.connect('clicked(bool)', self.onApplyMultiButton)
         self.segmentationSelector.currentNodeChanged.connect(self.onSegmentationChanged)
         self.referenceVolumeSelector.currentNodeChanged.connect(self.updateApplyButtonState)
+        self.referenceVolumeSelector.currentNodeChanged.connect(self.onLiveInputChanged)
+        self.liveUpdateCheckBox.connect('toggled(bool)', self.onLiveInputChanged)
         self.outputFileLineEdit.textChanged.connect(self.updateApplyButtonState)
         self.outputFileButton.connect('clicked(bool)', self.onSelectOutputFile)
         self.multiOutputFileLineEdit.textChanged.connect(self.updateMultiApplyButtonState)
@@ -171,12 +349,14 @@ class SliceStatWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
     def onSegmentationChanged(self):
         segmentationNode = self.segmentationSelector.currentNode()
+        self.allFramesCheckBox.enabled = self.logic.getSequenceNode(segmentationNode) is not None
         if segmentationNode:
             # Automatically select the source volume of the segmentation as the default reference
             sourceVolume = self.logic.getReferenceVolume(segmentationNode)
             if sourceVolume:
                 self.referenceVolumeSelector.setCurrentNode(sourceVolume)
         self.updateApplyButtonState()
+        self.onLiveInputChanged()
 
     def onSelectOutputFile(self):
         saveDialog = qt.QFileDialog()
@@ -196,6 +376,20 @@ class SliceStatWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             selectedFile = saveDialog.selectedFiles()[0]
             self.multiOutputFileLineEdit.setText(selectedFile)
 
+    def getColumnarFormat(self):
+        """
+        Get the selected columnar export format, or None. Installs pyarrow if needed for Parquet and Feather.
+        """
+        columnarFormat = self.columnarFormatComboBox.currentData
+        if not columnarFormat:
+            return None
+        if columnarFormat in ("parquet", "feather"):
+            if importlib.util.find_spec("pyarrow") is None:
+                if not slicer.util.confirmOkCancelDisplay("Parquet and Feather export require the 'pyarrow' Python package. Install it now?"):
+                    raise ValueError("pyarrow is not installed, select another columnar export format.")
+                slicer.util.pip_install("pyarrow")
+        return columnarFormat
+
     def updateApplyButtonState(self):
         # A reference volume is required, either selected manually or implicitly from the segmentation
         hasReference = self.referenceVolumeSelector.currentNode() is not None or \
@@ -203,18 +397,19 @@ class SliceStatWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
         canApply = self.segmentationSelector.currentNode() is not None and \
                    self.outputFileLineEdit.text != "" and \
-                   hasReference
+                   hasReference and \
+                   self.job is None
         self.applyButton.enabled = canApply
 
     def updateMultiApplyButtonState(self):
-        canApply = self.multiOutputFileLineEdit.text != ""
+        canApply = self.multiOutputFileLineEdit.text != "" and self.job is None
         self.applyMultiButton.enabled = canApply
 
     def onApplyButton(self):
         """
         Run processing when user clicks "Apply" button for Single Sample.
+        Processing runs as a background job, see startJob.
         """
-        progressDialog = None
         try:
             segmentationNode = self.segmentationSelector.currentNode()
             referenceVolumeNode = self.referenceVolumeSelector.currentNode()
@@ -227,36 +422,38 @@ class SliceStatWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             # Determine append mode based on file existence
             appendMode = os.path.exists(outputPath)
 
-            # Show a progress dialog
-            progressDialog = slicer.util.createProgressDialog(labelText="Analyzing segments...", windowTitle="Slice Statistics", maximum=0)
+            columnarFormat = self.getColumnarFormat()
 
-            self.logic.run(segmentationNode, outputPath, referenceVolumeNode, appendMode)
+            self.applyLogicOptions()
 
-            progressDialog.close()
-            mode = "appended to" if appendMode else "saved to"
-            slicer.util.infoDisplay(f"Processing completed successfully! Results {mode}:\n{outputPath}")
+            def onCompleted(result):
+                mode = "appended to" if appendMode else "saved to"
+                slicer.util.infoDisplay(f"Processing completed successfully! Results {mode}:\n{outputPath}"
+                                        + self.getProfilingSummary())
+
+            segmentationSequenceNode = self.logic.getSequenceNode(segmentationNode)
+            if segmentationSequenceNode is not None and self.allFramesCheckBox.checked:
+                if not referenceVolumeNode:
+                    referenceVolumeNode = self.logic.getReferenceVolume(segmentationNode)
+                self.startJob(self.logic.run_sequence_steps(segmentationSequenceNode, outputPath, referenceVolumeNode,
+                                                            self.logic.getSequenceNode(referenceVolumeNode), appendMode,
+                                                            self.intervalColumnCheckBox.checked),
+                              "Analyzing sequence frames...", onCompleted)
+                return
+
+            self.startJob(self.logic.run_steps(segmentationNode, outputPath, referenceVolumeNode, appendMode,
+                                               self.intervalColumnCheckBox.checked, columnarFormat,
+                                               self.statisticsTableCheckBox.checked),
+                          "Analyzing segments...", onCompleted)
 
-        except ValueError as e:
-            if progressDialog:
-                progressDialog.close()
-            errorMessage = str(e)
-            if "master volume" in errorMessage or "reference volume" in errorMessage:
-                errorMessage = ("Could not determine the geometry for the segmentation.\n\n"
-                                "Please either select a 'Reference Volume' manually in the module UI, "
-                                "or go to the 'Segmentations' module and set the 'Source volume' for the selected segmentation.")
-            slicer.util.errorDisplay(f"Processing failed: {errorMessage}")
         except Exception as e:
-            if progressDialog:
-                progressDialog.close()
-            slicer.util.errorDisplay(f"An unexpected error occurred: {e}")
-            import traceback
-            traceback.print_exc()
+            self.onJobFailed(e)
 
     def onApplyMultiButton(self):
         """
         Run processing when user clicks "Apply" button for Multi Sample.
+        Processing runs as a background job, see startJob.
         """
-        progressDialog = None
         try:
             outputPath = self.multiOutputFileLineEdit.text
 
@@ -267,32 +464,194 @@ class SliceStatWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             # Determine append mode based on file existence
             appendMode = os.path.exists(outputPath)
 
-            # Show a progress dialog
-            progressDialog = slicer.util.createProgressDialog(labelText="Analyzing all volumes...", windowTitle="Slice Statistics", maximum=0)
-
-            warnings = self.logic.run_export_all(None, outputPath, appendMode)
-            
-            progressDialog.close()
-            mode = "appended to" if appendMode else "saved to"
-            message = f"Processing completed successfully! Results {mode}:\n{outputPath}"
-            if warnings:
-                message += f"\n\nWarnings:\n" + "\n".join(warnings)
-                slicer.util.warningDisplay(message, windowTitle="Slice Statistics")
-            else:
-                slicer.util.infoDisplay(message)
+            columnarFormat = self.getColumnarFormat()
 
-        except ValueError as e:
-            if progressDialog:
-                progressDialog.close()
-            errorMessage = str(e)
-            slicer.util.errorDisplay(f"Processing failed: {errorMessage}")
+            self.applyLogicOptions()
+
+            def onCompleted(warnings):
+                mode = "appended to" if appendMode else "saved to"
+                message = f"Processing completed successfully! Results {mode}:\n{outputPath}" + self.getProfilingSummary()
+                if warnings:
+                    message += f"\n\nWarnings:\n" + "\n".join(warnings)
+                    slicer.util.warningDisplay(message, windowTitle="Slice Statistics")
+                else:
+                    slicer.util.infoDisplay(message)
+
+            self.startJob(self.logic.run_export_all_steps(None, outputPath, appendMode, self.workersSpinBox.value,
+                                                          self.useResultCacheCheckBox.checked,
+                                                          self.intervalColumnCheckBox.checked, columnarFormat,
+                                                          self.statisticsTableCheckBox.checked),
+                          "Analyzing all volumes...", onCompleted)
+
+        except Exception as e:
+            self.onJobFailed(e)
+
+    def applyLogicOptions(self):
+        self.logic.printResults = self.printResultsCheckBox.checked
+        self.logic.resumeExports = self.resumeExportCheckBox.checked
+        self.logic.exactVoxelSlices = self.exactVoxelSlicesCheckBox.checked
+        self.logic.cohortIndexEnabled = self.cohortIndexCheckBox.checked
+        self.logic.cohortSummaryEnabled = self.cohortSummaryCheckBox.checked
+        self.logic.presenceMasksFileEnabled = self.presenceMasksCheckBox.checked
+        self.logic.extractionCache.maxSize = self.extractionCacheSizeSpinBox.value * 1024 * 1024
+        self.logic.extractionCache.evict()
+        self.logic.profilingEnabled = self.profilingCheckBox.checked
+
+    def getProfilingSummary(self):
+        """
+        Get the profiling summary of the last run to append to the completion message, or "" if profiling is off.
+        """
+        if self.logic.profiler is None:
+            return ""
+        return "\n\nProfiling:\n" + self.logic.profiler.format_summary()
+
+    def startJob(self, steps, labelText, onCompleted):
+        """
+        Run a logic steps generator from a timer, so that Slicer stays responsive.
+        Scene access runs on the main thread between GUI events, voxel work runs in worker threads/processes.
+        onCompleted is called with the return value of the job.
+        """
+        self.logic.start_background_job()
+        self.job = steps
+        self.onJobCompleted = onCompleted
+        self.progressDialog = slicer.util.createProgressDialog(labelText=labelText, windowTitle="Slice Statistics",
+                                                               maximum=self.progressScale)
+        self.progressDialog.connect('canceled()', self.logic.request_cancel)
+        self.applyButton.enabled = False
+        self.applyMultiButton.enabled = False
+        self.jobTimer.start()
+
+    def onJobTimer(self):
+        # Run job steps for a short time slice, then let the event loop update the GUI
+        deadline = time.monotonic() + self.jobTimeSlice
+        try:
+            while time.monotonic() < deadline:
+                next(self.job)
+        except StopIteration as e:
+            onCompleted = self.onJobCompleted
+            self.finishJob()
+            onCompleted(e.value)
+            return
         except Exception as e:
-            if progressDialog:
-                progressDialog.close()
-            slicer.util.errorDisplay(f"An unexpected error occurred: {e}")
+            self.finishJob()
+            self.onJobFailed(e)
+            return
+
+        if self.progressDialog and not self.progressDialog.wasCanceled:
+            progress = self.logic.progress
+            self.progressDialog.labelText = progress.format()
+            # Stay below the maximum, the dialog closes itself when it is reached
+            self.progressDialog.value = min(int(progress.fraction * self.progressScale), self.progressScale - 1)
+
+    def finishJob(self):
+        self.jobTimer.stop()
+        if self.job is not None:
+            self.job.close()
+            self.job = None
+        self.onJobCompleted = None
+        self.logic.finish_background_job()
+        if self.progressDialog:
+            self.progressDialog.close()
+            self.progressDialog = None
+        self.updateApplyButtonState()
+        self.updateMultiApplyButtonState()
+
+    def onJobFailed(self, error):
+        if isinstance(error, SliceStatLib.ExportCancelled):
+            slicer.util.infoDisplay("Processing cancelled. The output file was not changed.")
+        elif isinstance(error, ValueError):
+            errorMessage = str(error)
+            if "master volume" in errorMessage or "reference volume" in errorMessage:
+                errorMessage = ("Could not determine the geometry for the segmentation.\n\n"
+                                "Please either select a 'Reference Volume' manually in the module UI, "
+                                "or go to the 'Segmentations' module and set the 'Source volume' for the selected segmentation.")
+            slicer.util.errorDisplay(f"Processing failed: {errorMessage}")
+        else:
+            slicer.util.errorDisplay(f"An unexpected error occurred: {error}")
             import traceback
             traceback.print_exc()
 
+    def onLiveInputChanged(self):
+        """
+        Start, restart or stop live slice coverage for the selected segmentation and reference volume.
+        """
+        self.stopLiveUpdate()
+        if not self.liveUpdateCheckBox.checked:
+            return
+        segmentationNode = self.segmentationSelector.currentNode()
+        referenceVolumeNode = self.referenceVolumeSelector.currentNode()
+        if segmentationNode and not referenceVolumeNode:
+            referenceVolumeNode = self.logic.getReferenceVolume(segmentationNode)
+        if not segmentationNode or not referenceVolumeNode or referenceVolumeNode.GetImageData() is None:
+            return
+        self.liveSegmentationNode = segmentationNode
+        self.liveReferenceVolumeNode = referenceVolumeNode
+        self.liveCounts = SliceStatLib.LiveSliceCounts(referenceVolumeNode.GetImageData().GetDimensions()[2])
+        segmentation = segmentationNode.GetSegmentation()
+        for event in (slicer.vtkSegmentation.SourceRepresentationModified, slicer.vtkSegmentation.SegmentAdded,
+                      slicer.vtkSegmentation.SegmentRemoved, slicer.vtkSegmentation.SegmentModified):
+            self.addObserver(segmentation, event, self.onLiveSegmentationModified)
+        self.updateLiveCounts()
+
+    def stopLiveUpdate(self):
+        self.liveUpdateTimer.stop()
+        self.removeObservers(self.onLiveSegmentationModified)
+        self.liveCounts = None
+        self.liveSegmentationNode = None
+        self.liveReferenceVolumeNode = None
+        self.liveLabelmapTimes = {}
+        self.liveTable.setRowCount(0)
+
+    def onLiveSegmentationModified(self, caller, event):
+        # Update at most once per interval while segments are being painted
+        if not self.liveUpdateTimer.isActive():
+            self.liveUpdateTimer.start()
+
+    def onLiveUpdateTimer(self):
+        if self.job is not None:
+            # Voxel computations of a running job use the worker thread, update when it is done
+            self.liveUpdateTimer.start()
+            return
+        try:
+            self.updateLiveCounts()
+        except Exception as e:
+            logging.warning(f"Live slice coverage update failed: {e}")
+
+    def updateLiveCounts(self):
+        """
+        Count the slices of the segments whose labelmap changed since the last update and refresh the table.
+        """
+        segmentation = self.liveSegmentationNode.GetSegmentation()
+        segmentIds = [segmentation.GetNthSegmentID(i) for i in range(segmentation.GetNumberOfSegments())]
+        for segmentId in list(self.liveCounts.counts):
+            if segmentId not in segmentIds:
+                self.liveCounts.remove(segmentId)
+                self.liveLabelmapTimes.pop(segmentId, None)
+
+        # Segments of a shared layer are counted together
+        for layerSegmentIds in self.logic.group_segments_by_layer(segmentation, segmentIds):
+            labelmapTime = self.logic.getSourceRepresentationTime(self.liveSegmentationNode, layerSegmentIds[0])
+            if all(self.liveLabelmapTimes.get(segmentId) == labelmapTime for segmentId in layerSegmentIds):
+                continue
+            self.logic.update_live_counts(self.liveCounts, self.liveSegmentationNode, layerSegmentIds, self.liveReferenceVolumeNode)
+            for segmentId in layerSegmentIds:
+                self.liveLabelmapTimes[segmentId] = labelmapTime
+
+        self.liveTable.setRowCount(len(segmentIds))
+        for row, segmentId in enumerate(segmentIds):
+            intervals = self.liveCounts.intervals(segmentId)
+            for column, text in enumerate([segmentation.GetSegment(segmentId).GetName(),
+                                           f"{intervals.format() or 'None'} ({intervals.count})",
+                                           str(self.liveCounts.voxel_count(segmentId))]):
+                self.liveTable.setItem(row, column, qt.QTableWidgetItem(text))
+
+    def cleanup(self):
+        # Stop a running job and live updates when the module is closed
+        if self.job is not None:
+            self.logic.request_cancel()
+            self.finishJob()
+        self.stopLiveUpdate()
+
     def onInstallDependencies(self):
         slicer.util.confirmOkCancelDisplay(
             "This will install the openpyxl package into Slicer's Python environment. "
@@ -321,9 +680,141 @@ class SliceStatLogic(ScriptedLoadableModuleLogic):
     computation done by your module.
     """
 
-    def run(self, segmentationNode, outputPath, referenceVolumeNode=None, appendMode=False):
+    def __init__(self):
+        ScriptedLoadableModuleLogic.__init__(self)
+        self.resultCache = None
+        self.matchDiagnostics = []
+        # Progress of the running job, cancellation flag and worker thread of background jobs
+        self.progress = SliceStatLib.ExportProgress()
+        self.cancelRequested = False
+        self.computeExecutor = None
+        # Print results to the Python console, and record a profiling trace of runs (see SliceStatLib.ExportProfiler)
+        self.printResults = True
+        self.profilingEnabled = False
+        self.profiler = None
+        # Resume interrupted Multi Sample exports from their checkpoint
+        self.resumeExports = True
+        # Rasterize closed surface segments instead of intersecting them with the slice planes
+        self.exactVoxelSlices = False
+        # Fill the cohort index of the output file (see SliceStatLib.CohortIndex)
+        self.cohortIndexEnabled = False
+        # Write the per segment summary table of Multi Sample exports (see SliceStatLib.CohortAggregates)
+        self.cohortSummaryEnabled = False
+        # Bit-packed slice presence of the processed cases, and whether it is also saved next to the output file
+        self.presenceMasks = SliceStatLib.PresenceMaskStore()
+        self.presenceMasksFileEnabled = False
+        # Slice presence of segmentation/geometry pairs extracted in this session (see SliceStatLib.ExtractionCache)
+        self.extractionCache = SliceStatLib.ExtractionCache()
+
+    def start_background_job(self):
+        """
+        Prepare running a job step by step from the GUI event loop (the *_steps methods).
+        Voxel computations of the job then run in a worker thread, the main thread only accesses the scene.
+        """
+        self.cancelRequested = False
+        self.progress = SliceStatLib.ExportProgress()
+        if self.computeExecutor is None:
+            self.computeExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="SliceStat")
+
+    def finish_background_job(self):
+        if self.computeExecutor is not None:
+            self.computeExecutor.shutdown(wait=True)
+            self.computeExecutor = None
+
+    def request_cancel(self):
+        """
+        Request cancellation of the running job. It stops at the next step; Multi Sample export then
+        writes the results of the volumes completed so far.
+        """
+        self.cancelRequested = True
+
+    def check_cancel(self):
+        if self.cancelRequested:
+            raise SliceStatLib.ExportCancelled("Processing cancelled")
+
+    def compute_steps(self, function, *args, stageName=None, segment=None):
+        """
+        Run a voxel computation. In background jobs it runs in the worker thread and this yields until it is done,
+        otherwise it runs directly.
+        If stageName is given, the computation is recorded as a profiling stage (see profile_stage). In background jobs
+        it is timed in the worker thread, so the time the steps wait for the GUI timer is not counted.
+        """
+        if self.computeExecutor is None:
+            with self.profile_stage(stageName, segment) if stageName else contextlib.nullcontext():
+                return function(*args)
+        future = self.computeExecutor.submit(SliceStatLib.timed_call, function, *args)
+        try:
+            while not future.done():
+                yield
+        finally:
+            # Arrays may still be used by the worker thread, do not release them before it is done
+            concurrent.futures.wait([future])
+        result, seconds = future.result()
+        if stageName and self.profiler is not None:
+            self.profiler.record_stage(stageName, seconds, self.progress.caseName, segment)
+        return result
+
+    def start_profiling(self):
+        """
+        Start profiling a run if profilingEnabled is set. The profiler of the last run is kept in self.profiler.
+        """
+        self.profiler = SliceStatLib.ExportProfiler() if self.profilingEnabled else None
+        if self.profiler is not None:
+            self.profiler.start()
+
+    def finish_profiling(self, outputPath):
+        """
+        Stop profiling, log the summary and write the JSON trace next to the output file (e.g. output_trace.json).
+        """
+        if self.profiler is None:
+            return
+        self.profiler.stop()
+        logging.info(f"Profiling summary:\n{self.profiler.format_summary()}")
+        tracePath = SliceStatLib.trace_path(outputPath)
+        try:
+            self.profiler.write_json(tracePath)
+        except IOError as e:
+            logging.warning(f"Could not write profiling trace {tracePath}: {e}")
+
+    def profile_stage(self, stageName, segment=None):
+        """
+        Get a context manager that records a stage of the current case if profiling.
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(stageName, self.progress.caseName, segment)
+
+    def record_extraction_path(self, path, segment=None, caseName=None):
+        if self.profiler is not None:
+            self.profiler.record_path(caseName or self.progress.caseName, segment, path)
+
+    def updateStatus(self, message):
+        """
+        Show a status message. Background jobs show it in their progress display,
+        foreground runs update the GUI right away.
+        """
+        self.progress.message = message
+        if self.computeExecutor is None:
+            slicer.util.showStatusMessage(message)
+            slicer.app.processEvents()  # Update GUI
+
+    def run(self, segmentationNode, outputPath, referenceVolumeNode=None, appendMode=False, intervalColumn=False,
+            columnarFormat=None, statisticsTable=False):
         """
         Run the actual algorithm for Single Sample mode
+        If intervalColumn is set, a SliceIntervals column (e.g. "12-87,90-95") is added to the CSV file.
+        If columnarFormat is set ('parquet', 'feather' or 'npz'), results are also written to a columnar file next to the CSV file.
+        If statisticsTable is set, per-slice voxel counts and areas along all axes are written to a side table (output_stats.csv).
+        """
+        self.cancelRequested = False
+        return SliceStatLib.run_to_completion(self.run_steps(
+            segmentationNode, outputPath, referenceVolumeNode, appendMode, intervalColumn, columnarFormat, statisticsTable))
+
+    def run_steps(self, segmentationNode, outputPath, referenceVolumeNode=None, appendMode=False, intervalColumn=False,
+                  columnarFormat=None, statisticsTable=False):
+        """
+        Steps generator of run, for background jobs.
+        Raises ExportCancelled if cancelled, the output file is not changed then.
         """
         if not segmentationNode:
             raise ValueError("Invalid segmentation node provided.")
@@ -342,257 +833,1019 @@ class SliceStatLogic(ScriptedLoadableModuleLogic):
         # Get the source volume name for ID
         sourceVolumeName = referenceVolumeNode.GetName()
 
-        segmentResults = self.process_segmentation(segmentationNode, referenceVolumeNode)
+        self.start_profiling()
+        try:
+            self.progress = SliceStatLib.ExportProgress(1)
+            self.progress.start_case(sourceVolumeName)
+            segmentStatistics = {} if statisticsTable else None
+            segmentResults = yield from self.process_segmentation_steps(segmentationNode, referenceVolumeNode,
+                                                                        statistics=segmentStatistics)
+            self.check_cancel()
+            self.progress.case_done()
 
-        # 4. Write results to CSV
-        slicer.util.showStatusMessage(f"Writing {os.path.basename(outputPath)} file...")
-        slicer.app.processEvents()  # Update GUI
+            # 4. Write results to CSV
+            self.updateStatus(f"Writing {os.path.basename(outputPath)} file...")
 
-        try:
-            self.write_csv(segmentResults, outputPath, appendMode, sourceVolumeName)
-        except IOError as e:
-            raise IOError(f"Could not write to file {outputPath}: {e}")
+            try:
+                with self.profile_stage('csv'):
+                    self.write_csv(segmentResults, outputPath, appendMode, sourceVolumeName, intervalColumn)
+            except IOError as e:
+                raise IOError(f"Could not write to file {outputPath}: {e}")
+            if columnarFormat:
+                with self.profile_stage('columnar'):
+                    self.write_columnar({sourceVolumeName: segmentResults}, outputPath, appendMode, columnarFormat)
+            if statisticsTable:
+                with self.profile_stage('statistics'):
+                    self.write_statistics({sourceVolumeName: segmentStatistics}, outputPath, appendMode)
+            if self.cohortIndexEnabled:
+                with self.profile_stage('cohortIndex'):
+                    self.write_cohort_index({sourceVolumeName: segmentResults}, outputPath, appendMode)
+            self.add_presence_masks(sourceVolumeName, segmentResults, referenceVolumeNode)
+            if self.presenceMasksFileEnabled:
+                with self.profile_stage('masks'):
+                    self.write_presence_masks([sourceVolumeName], outputPath, appendMode)
+        finally:
+            self.finish_profiling(outputPath)
 
         logging.info('Processing completed')
         return True
 
-    def process_segmentation(self, segmentationNode, referenceVolumeNode):
+    def run_sequence(self, segmentationSequenceNode, outputPath, referenceVolumeNode=None, referenceSequenceNode=None,
+                     appendMode=False, intervalColumn=False):
+        """
+        Run the algorithm for all frames of a segmentation sequence (e.g. a cardiac or perfusion time series).
+        Frames are written to one CSV group with the ID of the reference volume (or of the sequence)
+        and Frame and FrameValue columns. Each frame uses the frame of referenceSequenceNode with the same index value
+        as reference volume if given, otherwise referenceVolumeNode.
+        In append mode, the frames of a sequence that is already in the output file are replaced.
+        """
+        self.cancelRequested = False
+        return SliceStatLib.run_to_completion(self.run_sequence_steps(
+            segmentationSequenceNode, outputPath, referenceVolumeNode, referenceSequenceNode, appendMode, intervalColumn))
+
+    def run_sequence_steps(self, segmentationSequenceNode, outputPath, referenceVolumeNode=None, referenceSequenceNode=None,
+                           appendMode=False, intervalColumn=False):
+        """
+        Steps generator of run_sequence, for background jobs.
+        Raises ExportCancelled if cancelled, the output file is not changed then.
+        """
+        if not segmentationSequenceNode:
+            raise ValueError("Invalid segmentation sequence provided.")
+        if not outputPath:
+            raise ValueError("Invalid output path provided.")
+        if not referenceVolumeNode and not referenceSequenceNode:
+            raise ValueError("A reference volume is required for geometry information.")
+
+        logging.info('Sequence processing started')
+
+        volumeId = (referenceVolumeNode or referenceSequenceNode).GetName()
+        self.start_profiling()
+        try:
+            frameResults = yield from self.process_sequence_steps(segmentationSequenceNode, referenceVolumeNode,
+                                                                  referenceSequenceNode)
+            self.check_cancel()
+
+            self.updateStatus(f"Writing {os.path.basename(outputPath)} file...")
+            with self.profile_stage('csv'):
+                SliceStatLib.write_frames_csv(frameResults, outputPath, volumeId, appendMode, intervalColumn)
+        finally:
+            self.finish_profiling(outputPath)
+
+        logging.info('Sequence processing completed')
+        return True
+
+    def process_sequence(self, segmentationSequenceNode, referenceVolumeNode=None, referenceSequenceNode=None, asIntervals=False):
+        """
+        Process all frames of a segmentation sequence and return a list of (frameIndex, frameValue, segmentResults).
+        Frames are read from the sequence directly, the sequence browser is not changed.
+        Frames whose segmentation content, segments and reference geometry are the same as in an earlier frame
+        reuse the results of that frame.
+        """
+        return SliceStatLib.run_to_completion(self.process_sequence_steps(
+            segmentationSequenceNode, referenceVolumeNode, referenceSequenceNode, asIntervals))
+
+    def process_sequence_steps(self, segmentationSequenceNode, referenceVolumeNode=None, referenceSequenceNode=None,
+                               asIntervals=False):
+        """
+        Steps generator of process_sequence. Reports per-frame progress.
+        """
+        numberOfFrames = segmentationSequenceNode.GetNumberOfDataNodes()
+        self.progress = SliceStatLib.ExportProgress(numberOfFrames)
+        frameValues = [segmentationSequenceNode.GetNthIndexValue(frameIndex) for frameIndex in range(numberOfFrames)]
+
+        def frameNodesOf(frameIndex):
+            # (reference volume, segmentation) of a frame
+            frameReferenceNode = referenceVolumeNode
+            if referenceSequenceNode is not None:
+                frameReferenceNode = referenceSequenceNode.GetDataNodeAtValue(frameValues[frameIndex])
+                if frameReferenceNode is None and referenceSequenceNode.GetNumberOfDataNodes() == numberOfFrames:
+                    frameReferenceNode = referenceSequenceNode.GetNthDataNode(frameIndex)
+            if frameReferenceNode is None:
+                raise ValueError(f"No reference volume for frame {frameValues[frameIndex]}.")
+            return frameReferenceNode, segmentationSequenceNode.GetNthDataNode(frameIndex)
+
+        def onFrameStarted(frameIndex):
+            self.check_cancel()
+            self.progress.start_case(f"Frame {frameIndex + 1} ({frameValues[frameIndex]})")
+
+        def computeFrame(frameIndex):
+            frameReferenceNode, frameSegmentationNode = frameNodesOf(frameIndex)
+            segmentResults = yield from self.process_segmentation_steps(frameSegmentationNode, frameReferenceNode, asIntervals)
+            return segmentResults
+
+        def onFrameDone(frameIndex, reused):
+            if reused:
+                self.record_extraction_path('unchangedFrame')
+            self.progress.case_done()
+
+        # Frames with the same content and geometry as an earlier frame are not processed again
+        frameResults = yield from SliceStatLib.process_frames_steps(
+            frameValues, computeFrame, lambda frameIndex: self.getCaseCacheKey(*frameNodesOf(frameIndex)),
+            onFrameStarted, onFrameDone)
+        return frameResults
+
+    def process_segmentation(self, segmentationNode, referenceVolumeNode, asIntervals=False, statistics=None):
         """
         Process a segmentation node and return segment results
+        Segments that share a binary labelmap layer are scanned together in a single pass,
+        other segments are processed one by one.
+        Slices of each segment are returned as a list of slice indices, or as SliceIntervals if asIntervals is set.
+        If a statistics dict is given, it is filled with {segmentName: SliceStatistics} (per-slice voxel counts
+        along all three axes) computed in the same pass.
+        """
+        return SliceStatLib.run_to_completion(self.process_segmentation_steps(
+            segmentationNode, referenceVolumeNode, asIntervals, statistics))
+
+    def process_segmentation_steps(self, segmentationNode, referenceVolumeNode, asIntervals=False, statistics=None):
+        """
+        Steps generator of process_segmentation. Reports per-segment progress and checks for cancellation.
+        Results of a segmentation and reference geometry that were already extracted in this session
+        are read from the extraction cache.
         """
-        # Do not rely on visibility-dependent merged labelmaps.
-        # Process each segment independently to avoid label value mismatches.
-        slicer.util.showStatusMessage("Converting volume to array...")
-        slicer.app.processEvents()  # Update GUI
+        self.updateStatus("Converting volume to array...")
 
         segmentation = segmentationNode.GetSegmentation()
         numberOfSegments = segmentation.GetNumberOfSegments()
+        segmentIds = [segmentation.GetNthSegmentID(i) for i in range(numberOfSegments)]
+
+        # Statistics are not cached, only slice presence
+        cacheKey = self.getExtractionCacheKey(segmentationNode, referenceVolumeNode) if statistics is None else None
+        if cacheKey is not None:
+            segmentResults = self.extractionCache.get(*cacheKey, asIntervals)
+            if segmentResults is not None:
+                self.record_extraction_path('memory')
+                self.progress.set_segments(numberOfSegments)
+                self.progress.segments_done(numberOfSegments)
+                self.print_results(segmentResults)
+                return segmentResults
+
+        sliceIndicesById = {}
+        statisticsById = {} if statistics is not None else None
+        self.progress.set_segments(numberOfSegments)
+        # Closed surface segments are intersected with the slice planes one by one, not rasterized per layer
+        useSurfaces = self.use_surface_slices(segmentationNode, referenceVolumeNode, statistics)
+
+        for layerSegmentIds in self.group_segments_by_layer(segmentation, segmentIds):
+            self.check_cancel()
+            layerResults = None
+            if len(layerSegmentIds) > 1 and not useSurfaces:
+                self.updateStatus(f"Processing {len(layerSegmentIds)} segments in shared layer...")
+                try:
+                    layerResults = yield from self.process_layer_steps(segmentationNode, layerSegmentIds, referenceVolumeNode,
+                                                                       asIntervals, statisticsById)
+                except Exception as e:
+                    logging.warning(f"Shared layer scan failed, processing segments one by one: {e}")
+                    layerResults = None
+
+            if layerResults is None:
+                layerResults = {}
+                for segmentId in layerSegmentIds:
+                    self.check_cancel()
+                    layerResults[segmentId] = yield from self.process_segment_steps(segmentationNode, segmentId, referenceVolumeNode,
+                                                                                    asIntervals, statisticsById)
+                    self.progress.segments_done()
+            else:
+                self.progress.segments_done(len(layerSegmentIds))
+
+            sliceIndicesById.update(layerResults)
+
+        # Keep the original segment order in the results
         segmentResults = {}
+        for segmentId in segmentIds:
+            segmentName = segmentation.GetSegment(segmentId).GetName()
+            segmentResults[segmentName] = sliceIndicesById[segmentId]
+            if statistics is not None:
+                statistics[segmentName] = statisticsById[segmentId]
+        if cacheKey is not None:
+            self.extractionCache.put(*cacheKey, segmentResults)
+
+        self.print_results(segmentResults)
+        return segmentResults
 
-        for i in range(numberOfSegments):
-            segment = segmentation.GetNthSegment(i)
-            segmentName = segment.GetName()
-            segmentId = segmentation.GetNthSegmentID(i)
+    def print_results(self, segmentResults):
+        """
+        Print results to Python console for immediate feedback, if printResults is set.
+        """
+        if not self.printResults:
+            return
+        print("\n--- Slice Statistics Results ---")
+        for segmentName, sliceNumbers in segmentResults.items():
+            sliceNumbersStr = ",".join(map(str, sliceNumbers)) if sliceNumbers else "None"
+            print(f"  Segment '{segmentName}': Slices [{sliceNumbersStr}]")
+        print("--------------------------------\n")
 
-            slicer.util.showStatusMessage(f"Processing segment: {segmentName}...")
-            slicer.app.processEvents()  # Update GUI
+    def process_segment(self, segmentationNode, segmentId, referenceVolumeNode, asIntervals=False, statistics=None):
+        """
+        Process a single segment independently and return its slice indices
+        If a statistics dict is given, the SliceStatistics of the segment are stored in it.
+        """
+        return SliceStatLib.run_to_completion(self.process_segment_steps(
+            segmentationNode, segmentId, referenceVolumeNode, asIntervals, statistics))
 
-            # Preferred: get binary labelmap array directly; fallback to single-segment export
-            binaryArray = None
+    def process_segment_steps(self, segmentationNode, segmentId, referenceVolumeNode, asIntervals=False, statistics=None):
+        """
+        Steps generator of process_segment.
+        """
+        segmentName = segmentationNode.GetSegmentation().GetSegment(segmentId).GetName()
+        self.updateStatus(f"Processing segment: {segmentName}...")
+
+        # Closed surface source: intersect the surface with the slice planes instead of rasterizing it
+        if self.use_surface_slices(segmentationNode, referenceVolumeNode, statistics):
             try:
+                slicePresence = yield from self.surface_slice_presence_steps(segmentationNode, segmentId, referenceVolumeNode)
+                self.record_extraction_path('surface', segmentName)
+                return SliceStatLib.slice_result(slicePresence, asIntervals)
+            except Exception as e:
+                logging.debug(f"Surface intersection failed for segment {segmentName}, rasterizing it: {e}")
+
+        # Preferred: export only the extent that contains the segment
+        try:
+            axisCounts = yield from self.export_slice_label_counts_steps(segmentationNode, [segmentId], referenceVolumeNode,
+                                                                         cropToExtent=True, allAxes=statistics is not None)
+            if statistics is not None:
+                statistics[segmentId] = SliceStatLib.SliceStatistics.from_label_counts(axisCounts, 1, referenceVolumeNode.GetSpacing())
+                labelCounts = axisCounts[0]
+            else:
+                labelCounts = axisCounts
+            return SliceStatLib.slice_result(labelCounts[:, 1] > 0, asIntervals)
+        except Exception as e:
+            logging.debug(f"Cropped export failed for segment {segmentName}, using full reference geometry: {e}")
+
+        # Fallback: get binary labelmap array directly; fallback to single-segment export
+        binaryArray = None
+        try:
+            with self.profile_stage('binaryLabelmap', segmentName):
                 binaryArray = slicer.util.arrayFromSegmentBinaryLabelmap(segmentationNode, segmentId, referenceVolumeNode)
-            except Exception:
-                binaryArray = None
+            self.record_extraction_path('binaryLabelmap', segmentName)
+        except Exception:
+            binaryArray = None
 
-            if binaryArray is None:
-                tempLabelmap = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", "TempLabelmap_Single")
-                try:
-                    ids = vtk.vtkStringArray()
-                    ids.InsertNextValue(segmentId)
+        if binaryArray is None:
+            self.record_extraction_path('exportFallback', segmentName)
+            tempLabelmap = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", "TempLabelmap_Single")
+            try:
+                ids = vtk.vtkStringArray()
+                ids.InsertNextValue(segmentId)
+                with self.profile_stage('export', segmentName):
                     ok = slicer.vtkSlicerSegmentationsModuleLogic.ExportSegmentsToLabelmapNode(
                         segmentationNode,
                         ids,
                         tempLabelmap,
                         referenceVolumeNode
                     )
-                    if not ok:
-                        raise RuntimeError("Failed to export single segment to labelmap.")
-                    tempArray = slicer.util.arrayFromVolume(tempLabelmap)
-                    binaryArray = (tempArray > 0)
-                finally:
-                    slicer.mrmlScene.RemoveNode(tempLabelmap)
-
-            # Compute slice indices along axis 0 where any voxel is present
+                if not ok:
+                    raise RuntimeError("Failed to export single segment to labelmap.")
+                tempArray = slicer.util.arrayFromVolume(tempLabelmap)
+                binaryArray = (tempArray > 0)
+            finally:
+                slicer.mrmlScene.RemoveNode(tempLabelmap)
+
+        # Compute slice indices along axis 0 where any voxel is present
+        if statistics is not None:
             presence = (binaryArray > 0) if binaryArray.dtype != np.bool_ else binaryArray
-            slices_with_segment = np.any(presence, axis=(1, 2))
-            slice_indices = np.where(slices_with_segment)[0]
+            axisCounts = yield from self.compute_steps(SliceStatLib.axis_label_counts, presence.view(np.uint8), 1,
+                                                       stageName='histogram', segment=segmentName)
+        else:
+            slices_with_segment = yield from self.compute_steps(SliceStatLib.slice_presence, binaryArray,
+                                                                stageName='histogram', segment=segmentName)
+        if statistics is not None:
+            statistics[segmentId] = SliceStatLib.SliceStatistics.from_label_counts(axisCounts, 1, referenceVolumeNode.GetSpacing())
+            return SliceStatLib.slice_result(axisCounts[0][:, 1] > 0, asIntervals)
+
+        return SliceStatLib.slice_result(slices_with_segment, asIntervals)
+
+    def process_layer(self, segmentationNode, segmentIds, referenceVolumeNode, asIntervals=False, statistics=None):
+        """
+        Process all segments of one shared binary labelmap layer in a single pass.
+        The layer is exported once as a merged labelmap, then a per-slice label histogram
+        gives the presence of every segment at once.
+        Segments in the same layer never overlap, so the merged labelmap is lossless.
+        If a statistics dict is given, the SliceStatistics of the segments are stored in it.
+        """
+        return SliceStatLib.run_to_completion(self.process_layer_steps(
+            segmentationNode, segmentIds, referenceVolumeNode, asIntervals, statistics))
 
-            segmentResults[segmentName] = [int(idx) for idx in slice_indices]
+    def process_layer_steps(self, segmentationNode, segmentIds, referenceVolumeNode, asIntervals=False, statistics=None):
+        """
+        Steps generator of process_layer.
+        """
+        axisCounts = yield from self.export_slice_label_counts_steps(segmentationNode, segmentIds, referenceVolumeNode,
+                                                                     cropToExtent=True, allAxes=statistics is not None)
+        labelCounts = axisCounts[0] if statistics is not None else axisCounts
+
+        layerResults = {}
+        for i, (segmentId, segmentResult) in enumerate(zip(segmentIds, SliceStatLib.label_slice_results(labelCounts, asIntervals))):
+            layerResults[segmentId] = segmentResult
+            if statistics is not None:
+                statistics[segmentId] = SliceStatLib.SliceStatistics.from_label_counts(axisCounts, i + 1,
+                                                                                       referenceVolumeNode.GetSpacing())
+        return layerResults
+
+    def export_slice_label_counts(self, segmentationNode, segmentIds, referenceVolumeNode, cropToExtent=True, allAxes=False):
+        """
+        Export segments as a merged labelmap in the reference geometry (segment i gets label value i+1)
+        and return its per-slice label histogram, shape (K, len(segmentIds) + 1), in the reference volume's K index space.
+        When cropToExtent is set only the effective extent of the segments is exported,
+        so memory and scan time scale with the segment size instead of the reference volume size.
+        If allAxes is set, the histograms along all three axes are computed in the same pass and
+        (kCounts, jCounts, iCounts) is returned, in the reference volume's K, J and I index spaces.
+        """
+        return SliceStatLib.run_to_completion(self.export_slice_label_counts_steps(
+            segmentationNode, segmentIds, referenceVolumeNode, cropToExtent, allAxes))
 
-        # Print results to Python console for immediate feedback
-        print("\n--- Slice Statistics Results ---")
-        for segmentName, sliceNumbers in segmentResults.items():
-            sliceNumbersStr = ",".join(map(str, sliceNumbers)) if sliceNumbers else "None"
-            print(f"  Segment '{segmentName}': Slices [{sliceNumbersStr}]")
-        print("--------------------------------\n")
+    def export_slice_label_counts_steps(self, segmentationNode, segmentIds, referenceVolumeNode, cropToExtent=True, allAxes=False):
+        """
+        Steps generator of export_slice_label_counts. The export runs on the main thread,
+        the histogram computation in the worker thread of background jobs.
+        If the internal labelmap of the segments is on the reference grid (see get_internal_labelmap),
+        it is read directly instead of being exported.
+        """
+        # Reference dimensions in K, J, I order
+        referenceShape = referenceVolumeNode.GetImageData().GetDimensions()[::-1]
+        axisCounts = [np.zeros((size, len(segmentIds) + 1), dtype=np.int64) for size in referenceShape]
 
-        return segmentResults
+        if cropToExtent:
+            extentComputationMode = slicer.vtkSegmentation.EXTENT_UNION_OF_EFFECTIVE_SEGMENTS
+        else:
+            extentComputationMode = slicer.vtkSegmentation.EXTENT_REFERENCE_GEOMETRY
 
-    def write_csv(self, segmentResults, outputPath, appendMode=False, sourceVolumeName=None):
+        segmentation = segmentationNode.GetSegmentation()
+        segmentNames = ", ".join(segmentation.GetSegment(segmentId).GetName() for segmentId in segmentIds)
+
+        internalLabelmap = self.get_internal_labelmap(segmentationNode, segmentIds, referenceVolumeNode)
+        if internalLabelmap is not None:
+            # Fast path: read the voxels of the segmentation in place, without a temporary node or resampling
+            labelArray, ijkOffset, labelValues = internalLabelmap
+            # The labelmap extent can exceed the reference volume, voxels outside of it are not counted
+            labelArray, ijkOffset = SliceStatLib.crop_to_reference(labelArray, ijkOffset, referenceShape[::-1])
+            countLabels = SliceStatLib.axis_label_counts if allAxes else SliceStatLib.slice_label_counts
+            labelAxisCounts = yield from self.compute_steps(countLabels, labelArray, max(labelValues),
+                                                            stageName='histogram', segment=segmentNames)
+            if not allAxes:
+                labelAxisCounts = [labelAxisCounts]
+            # Columns in segmentIds order, like the exported labelmap
+            croppedAxisCounts = [counts[:, [0] + labelValues] for counts in labelAxisCounts]
+            # Offsets in K, J, I order
+            ijkOffset = ijkOffset[::-1]
+            extractionPath = 'internal'
+        else:
+            tempLabelmap = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", "TempLabelmap_Export")
+            try:
+                ids = vtk.vtkStringArray()
+                for segmentId in segmentIds:
+                    ids.InsertNextValue(segmentId)
+                with self.profile_stage('export', segmentNames):
+                    ok = slicer.vtkSlicerSegmentationsModuleLogic.ExportSegmentsToLabelmapNode(
+                        segmentationNode,
+                        ids,
+                        tempLabelmap,
+                        referenceVolumeNode,
+                        extentComputationMode
+                    )
+                if not ok:
+                    raise RuntimeError("Failed to export segments to labelmap.")
+
+                imageData = tempLabelmap.GetImageData()
+                if imageData is not None and imageData.GetNumberOfPoints() > 0:
+                    # The effective extent can exceed the reference volume, voxels outside of it are not counted.
+                    # The labelmap node is kept until the computation is done, labelArray refers to its voxels
+                    labelArray, ijkOffset = SliceStatLib.crop_to_reference(
+                        slicer.util.arrayFromVolume(tempLabelmap), self.get_ijk_offset(tempLabelmap, referenceVolumeNode),
+                        referenceShape[::-1])
+                    countLabels = SliceStatLib.axis_label_counts if allAxes else SliceStatLib.slice_label_counts
+                    croppedAxisCounts = yield from self.compute_steps(countLabels, labelArray, len(segmentIds),
+                                                                      stageName='histogram', segment=segmentNames)
+                    if not allAxes:
+                        croppedAxisCounts = [croppedAxisCounts]
+                    # Offsets in K, J, I order
+                    ijkOffset = ijkOffset[::-1]
+                else:
+                    # All segments are empty
+                    croppedAxisCounts = []
+                    ijkOffset = ()
+            finally:
+                if tempLabelmap.GetDisplayNode() and tempLabelmap.GetDisplayNode().GetColorNode():
+                    slicer.mrmlScene.RemoveNode(tempLabelmap.GetDisplayNode().GetColorNode())
+                slicer.mrmlScene.RemoveNode(tempLabelmap)
+            extractionPath = 'cropped'
+        for segmentId in segmentIds:
+            self.record_extraction_path(extractionPath, segmentation.GetSegment(segmentId).GetName())
+
+        # Place the cropped slabs into the reference index ranges
+        for labelCounts, croppedCounts, sliceOffset in zip(axisCounts, croppedAxisCounts, ijkOffset):
+            SliceStatLib.place_slice_counts(labelCounts, croppedCounts, sliceOffset)
+        return tuple(axisCounts) if allAxes else axisCounts[0]
+
+    def use_surface_slices(self, segmentationNode, referenceVolumeNode, statistics=None):
+        """
+        Check whether slices are found by intersecting closed surfaces with the slice planes: the source representation
+        is closed surface, exactVoxelSlices is not set, no statistics (voxel counts) are requested and neither node is transformed.
+        """
+        if self.exactVoxelSlices or statistics is not None:
+            return False
+        if segmentationNode.GetParentTransformNode() or referenceVolumeNode.GetParentTransformNode():
+            return False
+        return self.getSourceRepresentationName(segmentationNode.GetSegmentation()) == self.getClosedSurfaceRepresentationName()
+
+    def surface_slice_presence(self, segmentationNode, segmentId, referenceVolumeNode):
+        """
+        Get the boolean presence of a closed surface segment in each K slice of the reference volume:
+        a slice is present if the plane through its voxel centers intersects the surface.
+        """
+        return SliceStatLib.run_to_completion(self.surface_slice_presence_steps(segmentationNode, segmentId, referenceVolumeNode))
+
+    def surface_slice_presence_steps(self, segmentationNode, segmentId, referenceVolumeNode):
+        """
+        Steps generator of surface_slice_presence.
+        """
+        segmentName = segmentationNode.GetSegmentation().GetSegment(segmentId).GetName()
+        polyData = segmentationNode.GetClosedSurfaceInternalRepresentation(segmentId)
+        if polyData is None:
+            raise RuntimeError("Segment has no closed surface representation.")
+        referenceDimensions = referenceVolumeNode.GetImageData().GetDimensions()
+        if polyData.GetNumberOfPoints() == 0 or polyData.GetNumberOfPolys() == 0:
+            return np.zeros(referenceDimensions[2], dtype=bool)
+
+        # Views of the mesh arrays, polyData is kept until the computation is done
+        polys = polyData.GetPolys()
+        points = vtk.util.numpy_support.vtk_to_numpy(polyData.GetPoints().GetData())
+        cellOffsets = vtk.util.numpy_support.vtk_to_numpy(polys.GetOffsetsArray())
+        cellConnectivity = vtk.util.numpy_support.vtk_to_numpy(polys.GetConnectivityArray())
+        rasToIjk = vtk.vtkMatrix4x4()
+        referenceVolumeNode.GetRASToIJKMatrix(rasToIjk)
+        slicePresence = yield from self.compute_steps(SliceStatLib.surface_slice_presence, points, cellOffsets, cellConnectivity,
+                                                      slicer.util.arrayFromVTKMatrix(rasToIjk), referenceDimensions,
+                                                      stageName='surface', segment=segmentName)
+        return slicePresence
+
+    def update_live_counts(self, liveCounts, segmentationNode, segmentIds, referenceVolumeNode):
+        """
+        Count the voxels of segments stored in the same layer in each reference slice and store them in a
+        SliceStatLib.LiveSliceCounts. Only the reference slices in which the layer labelmap changed since the last update
+        are recounted: the internal labelmap is counted in place if it is on the reference grid, otherwise only those
+        reference slices are resampled from it. Segments without a binary labelmap source or with transformed nodes
+        are exported through the reference geometry.
+        Returns {segmentId: (first, last + 1) range of slices whose presence changed, or None}.
+        """
+        referenceDimensions = referenceVolumeNode.GetImageData().GetDimensions()
+        internalLabelmap = self.get_internal_labelmap(segmentationNode, segmentIds, referenceVolumeNode)
+        if internalLabelmap is not None:
+            labelArray, ijkOffset, labelValues = internalLabelmap
+            labelArray, ijkOffset = SliceStatLib.crop_to_reference(labelArray, ijkOffset, referenceDimensions)
+            return liveCounts.update_labelmap(segmentIds, labelArray, ijkOffset, labelValues)
+
+        layerLabelmap = None
+        if not referenceVolumeNode.GetParentTransformNode():
+            layerLabelmap = self.get_layer_labelmap(segmentationNode, segmentIds)
+        if layerLabelmap is not None:
+            labelmap, labelArray, extentOffset, labelValues = layerLabelmap
+            imageToWorld = vtk.vtkMatrix4x4()
+            labelmap.GetImageToWorldMatrix(imageToWorld)
+            rasToIjk = vtk.vtkMatrix4x4()
+            referenceVolumeNode.GetRASToIJKMatrix(rasToIjk)
+            ijkToReference = slicer.util.arrayFromVTKMatrix(rasToIjk) @ slicer.util.arrayFromVTKMatrix(imageToWorld)
+            sliceRange = liveCounts.changed_slice_range(segmentIds, labelArray, extentOffset, ijkToReference)
+            if sliceRange is None:
+                return dict.fromkeys(segmentIds)
+            labelCounts, firstSlice = self.resample_slice_label_counts(labelmap, referenceVolumeNode, sliceRange, max(labelValues))
+            return {segmentId: liveCounts.set_counts(segmentId, labelCounts[:, labelValue], firstSlice, sliceRange)
+                    for segmentId, labelValue in zip(segmentIds, labelValues)}
+
+        labelCounts = self.export_slice_label_counts(segmentationNode, segmentIds, referenceVolumeNode)
+        return {segmentId: liveCounts.set_counts(segmentId, labelCounts[:, i + 1]) for i, segmentId in enumerate(segmentIds)}
+
+    def resample_slice_label_counts(self, labelmap, referenceVolumeNode, sliceRange, maxLabel):
+        """
+        Resample a labelmap (vtkOrientedImageData) with nearest neighbor interpolation to the reference slices
+        of sliceRange ((first, last + 1)) only, and count the voxels of each label in each of them.
+        Returns (labelCounts, firstSlice): labelCounts has shape (number of slices, maxLabel + 1) and starts at
+        reference slice firstSlice.
+        """
+        referenceDimensions = referenceVolumeNode.GetImageData().GetDimensions()
+        referenceGeometry = slicer.vtkOrientedImageData()
+        referenceGeometry.SetExtent(0, referenceDimensions[0] - 1, 0, referenceDimensions[1] - 1, sliceRange[0], sliceRange[1] - 1)
+        ijkToRas = vtk.vtkMatrix4x4()
+        referenceVolumeNode.GetIJKToRASMatrix(ijkToRas)
+        referenceGeometry.SetImageToWorldMatrix(ijkToRas)
+        resampled = slicer.vtkOrientedImageData()
+        if not slicer.vtkOrientedImageDataResample.ResampleOrientedImageToReferenceOrientedImage(
+                labelmap, referenceGeometry, resampled):
+            raise RuntimeError("Failed to resample the segment labelmap to the reference volume.")
+        extent = resampled.GetExtent()
+        scalars = resampled.GetPointData().GetScalars()
+        if scalars is None or extent[1] < extent[0] or extent[3] < extent[2] or extent[5] < extent[4]:
+            return np.zeros((0, maxLabel + 1), dtype=np.int64), sliceRange[0]
+        labelArray = vtk.util.numpy_support.vtk_to_numpy(scalars).reshape(
+            extent[5] - extent[4] + 1, extent[3] - extent[2] + 1, extent[1] - extent[0] + 1)
+        labelArray, ijkOffset = SliceStatLib.crop_to_reference(labelArray, extent[0::2], referenceDimensions)
+        return SliceStatLib.slice_label_counts(labelArray, maxLabel), ijkOffset[2]
+
+    def get_layer_labelmap(self, segmentationNode, segmentIds):
+        """
+        Get the internal binary labelmap of segments stored in the same layer of a binary labelmap source representation
+        of a segmentation that is not transformed.
+        Returns (labelmap, labelArray, extentOffset, labelValues) or None: labelmap is the vtkOrientedImageData of the layer,
+        labelArray refers to its voxels (no copy), extentOffset is the (I, J, K) index of its first voxel in the labelmap
+        index space, labelValues are the label values of the segments.
+        """
+        segmentation = segmentationNode.GetSegmentation()
+        if self.getSourceRepresentationName(segmentation) != self.getBinaryLabelmapRepresentationName():
+            return None
+        if segmentationNode.GetParentTransformNode():
+            return None
+        try:
+            if len({segmentation.GetLayerIndex(segmentId) for segmentId in segmentIds}) != 1:
+                return None
+            labelmap = segmentationNode.GetBinaryLabelmapInternalRepresentation(segmentIds[0])
+        except Exception as e:
+            logging.debug(f"Internal labelmap is not available: {e}")
+            return None
+        if labelmap is None or labelmap.GetPointData().GetScalars() is None:
+            return None
+        extentOffset = tuple(labelmap.GetExtent()[0::2])
+        labelArray = slicer.util.arrayFromSegmentInternalBinaryLabelmap(segmentationNode, segmentIds[0])
+        labelValues = [segmentation.GetSegment(segmentId).GetLabelValue() for segmentId in segmentIds]
+        return labelmap, labelArray, extentOffset, labelValues
+
+    def get_internal_labelmap(self, segmentationNode, segmentIds, referenceVolumeNode):
+        """
+        Get the internal binary labelmap of segments if it can be used without resampling: the segments are stored
+        in the same layer of a binary labelmap source representation, neither node is transformed, and the labelmap
+        grid is the reference grid or a crop of it (shifted by whole voxels).
+        Returns (labelArray, ijkOffset, labelValues) or None. labelArray refers to the voxels of the segmentation (no copy),
+        ijkOffset is the reference (I, J, K) index of its first voxel, labelValues are the label values of the segments.
+        """
+        if referenceVolumeNode.GetParentTransformNode():
+            return None
+        layerLabelmap = self.get_layer_labelmap(segmentationNode, segmentIds)
+        if layerLabelmap is None:
+            return None
+        labelmap, labelArray, extentOffset, labelValues = layerLabelmap
+
+        imageToWorld = vtk.vtkMatrix4x4()
+        labelmap.GetImageToWorldMatrix(imageToWorld)
+        ijkToRas = vtk.vtkMatrix4x4()
+        referenceVolumeNode.GetIJKToRASMatrix(ijkToRas)
+        gridOffset = SliceStatLib.integer_index_offset(slicer.util.arrayFromVTKMatrix(imageToWorld),
+                                                       slicer.util.arrayFromVTKMatrix(ijkToRas))
+        if gridOffset is None:
+            return None
+        ijkOffset = tuple(gridOffset[axis] + extentOffset[axis] for axis in range(3))
+        return labelArray, ijkOffset, labelValues
+
+    def get_slice_offset(self, labelmapNode, referenceVolumeNode):
+        """
+        Get the reference volume K index of the first slice of a labelmap exported in the reference geometry.
+        """
+        return self.get_ijk_offset(labelmapNode, referenceVolumeNode)[2]
+
+    def get_ijk_offset(self, labelmapNode, referenceVolumeNode):
+        """
+        Get the reference volume (I, J, K) index of the first voxel of a labelmap exported in the reference geometry.
+        """
+        extent = labelmapNode.GetImageData().GetExtent()
+        ijkToRas = vtk.vtkMatrix4x4()
+        labelmapNode.GetIJKToRASMatrix(ijkToRas)
+        rasToIjk = vtk.vtkMatrix4x4()
+        referenceVolumeNode.GetRASToIJKMatrix(rasToIjk)
+        firstVoxelRas = ijkToRas.MultiplyPoint((extent[0], extent[2], extent[4], 1.0))
+        firstVoxelReferenceIjk = rasToIjk.MultiplyPoint(firstVoxelRas)
+        return tuple(int(round(firstVoxelReferenceIjk[axis])) for axis in range(3))
+
+    def group_segments_by_layer(self, segmentation, segmentIds):
+        """
+        Group segment IDs by the binary labelmap layer they are stored in.
+        Segments without a binary labelmap representation (e.g. closed surface source)
+        each get their own group. Group order follows the first segment of each group.
+        """
+        return SliceStatLib.group_by_layer(segmentIds, segmentation.GetLayerIndex)
+
+    def write_csv(self, segmentResults, outputPath, appendMode=False, sourceVolumeName=None, intervalColumn=False):
         """
         Write segment results to CSV file for Single Sample mode
         ID column: only first row has value (source volume name), other rows are empty but keep comma
         """
-        file_exists = os.path.exists(outputPath) and appendMode
-
-        with open(outputPath, 'a' if appendMode else 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
-            
-            # Write header if not appending or if file doesn't exist
-            if not file_exists:
-                writer.writerow(['ID', 'SegmentName', 'SliceNumbers', 'SliceCount'])
-            
-            # Write data rows - only first row has ID, others have empty ID
-            first_segment = True
-            for segmentName, sliceNumbers in segmentResults.items():
-                if first_segment:
-                    # First row: use source volume name as ID
-                    segmentId = sourceVolumeName if sourceVolumeName else segmentName
-                    # Add tab prefix to prevent Excel SYLK format detection
-                    if segmentId and not segmentId.startswith('\t'):
-                        segmentId = '\t' + str(segmentId)
-                    first_segment = False
-                else:
-                    # Other rows: empty ID but keep comma
-                    segmentId = ""
-                
-                sliceNumbersStr = ",".join(map(str, sliceNumbers)) if sliceNumbers else ""
-                sliceCount = len(sliceNumbers) if sliceNumbers else 0
-                writer.writerow([segmentId, segmentName, sliceNumbersStr, sliceCount])
+        SliceStatLib.write_csv(segmentResults, outputPath, appendMode, sourceVolumeName, intervalColumn)
 
-    def run_export_all(self, segmentationNode, outputPath, appendMode=False):
+    def run_export_all(self, segmentationNode, outputPath, appendMode=False, numberOfWorkers=1, useResultCache=False,
+                       intervalColumn=False, columnarFormat=None, statisticsTable=False, shardIndex=0, shardCount=1):
         """
         Export all volumes in the scene that match segment IDs (Multi Sample mode)
         Automatically matches volumes (.nii.gz) with corresponding segments (.seg.nrrd or .seg[final].nrrd)
         segmentationNode parameter is not used anymore as auto-matching is done internally
+        If numberOfWorkers > 1, cases loaded from files are processed in parallel worker processes.
+        If useResultCache is set, unchanged cases are read from the persistent result cache.
+        In append mode, volumes already in the output file are updated in place.
+        Ambiguous volume/segmentation matches are reported in the warnings and in self.matchDiagnostics.
+        If intervalColumn is set, a SliceIntervals column (e.g. "12-87,90-95") is added to the CSV file.
+        If columnarFormat is set ('parquet', 'feather' or 'npz'), results are also written to a columnar file next to the CSV file.
+        If statisticsTable is set, per-slice voxel counts and areas along all axes are written to a side table (output_stats.csv).
+        Rows are written as soon as each volume is done, with checkpoints (see SliceStatLib.CheckpointedCsvWriter).
+        If resumeExports is set, an interrupted export to the same output file skips the volumes already written.
+        If shardCount > 1, only the volumes of shard shardIndex (0 to shardCount - 1) are exported, sorted by name,
+        to the shard file of the output file (e.g. output.shard-002-of-008.csv) with a manifest, so that several
+        Slicer instances can share a cohort; merge_shards then combines the shards (see SliceStatLib.Sharding).
+        """
+        self.cancelRequested = False
+        return SliceStatLib.run_to_completion(self.run_export_all_steps(
+            segmentationNode, outputPath, appendMode, numberOfWorkers, useResultCache, intervalColumn, columnarFormat,
+            statisticsTable, shardIndex, shardCount))
+
+    def run_export_all_steps(self, segmentationNode, outputPath, appendMode=False, numberOfWorkers=1, useResultCache=False,
+                             intervalColumn=False, columnarFormat=None, statisticsTable=False, shardIndex=0, shardCount=1):
+        """
+        Steps generator of run_export_all, for background jobs.
+        If cancelled, the results of the volumes completed so far are written.
         """
         if not outputPath:
             raise ValueError("Invalid output path provided.")
 
         logging.info('Export all mode started')
 
-        warnings = []
-        allResults = {}
-
-        # Get all volume nodes in the scene
-        volumeNodes = slicer.util.getNodesByClass("vtkMRMLScalarVolumeNode")
-        
-        # Get all segmentation nodes in the scene
-        segmentationNodes = slicer.util.getNodesByClass("vtkMRMLSegmentationNode")
-        
-        # Process each volume
-        for volumeNode in volumeNodes:
-            volumeName = volumeNode.GetName()
-            
-            # Try to find matching segmentation for this volume
-            matchingSegNode = None
-            
-            # Get the file path from storage node to extract original filename
-            volumeBaseName = None
-            storageNode = volumeNode.GetStorageNode()
-            if storageNode:
-                filePath = storageNode.GetFileName()
-                if filePath:
-                    # Extract base name from file path
-                    fileName = os.path.basename(filePath)
-                    # Remove extensions: .nii.gz or .nii
-                    if fileName.endswith('.nii.gz'):
-                        volumeBaseName = fileName[:-7]
-                    elif fileName.endswith('.nii'):
-                        volumeBaseName = fileName[:-4]
-                    else:
-                        volumeBaseName = fileName
-            
-            # Fallback to node name if no file path available
-            if not volumeBaseName:
-                volumeBaseName = volumeName
-            
-            # Try to find matching segmentation by prefix of the source base name
-            # Collect all candidates that start with the volumeBaseName (allow arbitrary suffix),
-            # prefer ones containing "(final)" in the name if multiple exist.
-            candidateSegNodes = []
-            finalPreferredSegNodes = []
-            for segNode in segmentationNodes:
-                segStorageNode = segNode.GetStorageNode()
-                segIdentifier = None
-                if segStorageNode and segStorageNode.GetFileName():
-                    segIdentifier = os.path.basename(segStorageNode.GetFileName())
+        self.start_profiling()
+        try:
+            # Match each volume with its segmentation (by file name, or node name if not stored)
+            volumeNodes = slicer.util.getNodesByClass("vtkMRMLScalarVolumeNode")
+            segmentationNodes = slicer.util.getNodesByClass("vtkMRMLSegmentationNode")
+            with self.profile_stage('matching'):
+                matches, self.matchDiagnostics, warnings = SliceStatLib.match_volumes(
+                    [(self.getVolumeBaseName(volumeNode), volumeNode.GetName()) for volumeNode in volumeNodes],
+                    [self.getSegmentationIdentifier(segNode) for segNode in segmentationNodes])
+            matchedCases = {volumeNode.GetName(): (volumeNode, segmentationNodes[index])
+                            for volumeNode, index in zip(volumeNodes, matches) if index is not None}
+
+            # Rows of each volume are written as soon as it is done, volumes of an interrupted export are skipped
+            export = SliceStatLib.CohortExport(outputPath, appendMode, intervalColumn, self.resumeExports, statisticsTable,
+                                               columnarFormat, self.cohortIndexEnabled, self.cohortSummaryEnabled,
+                                               shardIndex, shardCount)
+            outputPath = export.outputPath
+            pendingIds = [volumeName for volumeName in export.shard_cases(matchedCases) if volumeName not in export.completed]
+            self.progress = SliceStatLib.ExportProgress(len(pendingIds))
+            # Statistics are computed in the scene, so worker processes and the result cache are not used then
+            if statisticsTable:
+                numberOfWorkers = 1
+                useResultCache = False
+            statisticsByName = {}
+
+            def computeCase(volumeName):
+                volumeNode, segNode = matchedCases[volumeName]
+                statistics = statisticsByName[volumeName] = {} if statisticsTable else None
+                segmentResults = yield from self.process_segmentation_steps(segNode, volumeNode, statistics=statistics)
+                return segmentResults
+
+            def workerCasePathsOf(volumeName):
+                volumeNode, segNode = matchedCases[volumeName]
+                if self.get_cached_extraction(segNode, volumeNode) is not None:
+                    return None
+                return self.getWorkerCasePaths(volumeNode, segNode)
+
+            def onCaseStarted(volumeName, waiting):
+                self.progress.start_case(volumeName)
+                if waiting:
+                    self.updateStatus(f"Waiting for volume: {volumeName}...")
                 else:
-                    segIdentifier = segNode.GetName()
-
-                if not segIdentifier:
-                    continue
-
-                if segIdentifier.startswith(volumeBaseName):
-                    # Any suffix allowed (e.g., .seg.nrrd, _v2.seg.nrrd, (final).seg.nrrd, etc.)
-                    candidateSegNodes.append(segNode)
-                    if ' (final)' in segIdentifier:
-                        finalPreferredSegNodes.append(segNode)
-
-            if finalPreferredSegNodes:
-                matchingSegNode = finalPreferredSegNodes[0]
-            elif candidateSegNodes:
-                matchingSegNode = candidateSegNodes[0]
-            
-            if not matchingSegNode:
-                warnings.append(f"Volume '{volumeName}' has no matching segmentation")
-                continue
-            
-            slicer.util.showStatusMessage(f"Processing volume: {volumeName} with segment: {matchingSegNode.GetName()}...")
-            slicer.app.processEvents()
+                    self.updateStatus(f"Processing volume: {volumeName} with segment: {matchedCases[volumeName][1].GetName()}...")
+
+            def onCaseDone(volumeName, outcome, extractionPath, written):
+                if extractionPath is not None:
+                    self.record_extraction_path(extractionPath, caseName=volumeName)
+                statisticsByName.pop(volumeName, None)
+                if written:
+                    self.add_presence_masks(volumeName, outcome[0], matchedCases[volumeName][0])
+                self.progress.case_done()
+
+            def onResumedCase(volumeName, segmentResults):
+                # Volumes resumed from the checkpoint are read back once for the presence masks
+                if volumeName in matchedCases:
+                    self.add_presence_masks(volumeName, segmentResults, matchedCases[volumeName][0])
+
+            warnings += yield from SliceStatLib.export_cases_steps(
+                export, list(matchedCases), computeCase,
+                caseOrder=[volumeNode.GetName() for volumeNode in volumeNodes],
+                resultCache=self.getResultCache() if useResultCache else None,
+                cacheKeyOf=lambda volumeName: self.getCaseCacheKey(*matchedCases[volumeName]),
+                workerCasePathsOf=workerCasePathsOf,
+                numberOfWorkers=numberOfWorkers,
+                statisticsOf=statisticsByName.get,
+                onCaseStarted=onCaseStarted,
+                onCaseDone=onCaseDone,
+                onResumedCase=onResumedCase,
+                isCancelled=lambda: self.cancelRequested,
+                pollWorkers=self.computeExecutor is not None,
+                stage=self.profile_stage,
+                onWriting=lambda: self.updateStatus(f"Writing {os.path.basename(outputPath)} file..."))
+            if export.has_output and self.presenceMasksFileEnabled and not export.sharded:
+                with self.profile_stage('masks'):
+                    self.write_presence_masks(list(export.csvWriter.cases), outputPath, appendMode, export.csvWriter.skipped)
+        finally:
+            self.finish_profiling(outputPath)
 
-            try:
-                # Process this volume with its matching segmentation
-                segmentResults = self.process_segmentation(matchingSegNode, volumeNode)
-                
-                # Check if any segments were found
-                found_any = any(sliceNumbers for sliceNumbers in segmentResults.values())
-                
-                if found_any:
-                    # Store results with volume name as ID
-                    allResults[volumeName] = segmentResults
-                else:
-                    warnings.append(f"Volume '{volumeName}' has no matching segments")
-                    
-            except Exception as e:
-                warnings.append(f"Failed to process volume '{volumeName}': {str(e)}")
-                logging.warning(f"Failed to process volume {volumeName}: {e}")
+        logging.info('Export all mode completed')
+        return warnings
 
-        # Write all results to CSV
-        if allResults or appendMode:
-            slicer.util.showStatusMessage(f"Writing {os.path.basename(outputPath)} file...")
-            slicer.app.processEvents()
+    def getResultCache(self):
+        """
+        Get the persistent result cache, stored in the Slicer cache folder.
+        """
+        if self.resultCache is None:
+            self.resultCache = SliceStatLib.ResultCache(os.path.join(slicer.app.cachePath, "SliceStat"))
+        return self.resultCache
 
-            try:
-                self.write_csv_all(allResults, outputPath, appendMode)
-            except IOError as e:
-                raise IOError(f"Could not write to file {outputPath}: {e}")
+    def getCaseCacheKey(self, volumeNode, segmentationNode):
+        """
+        Get the result cache key of a volume/segmentation pair, or None if the pair cannot be cached.
+        The key combines the segmentation content (or file modification time and size),
+        the reference geometry, the segment IDs and names, and the source representation and options
+        that change the extraction in the scene. Worker processes only get pairs whose results are the same
+        as in the scene (see getWorkerCasePaths), so their results are stored under the same key.
+        """
+        if volumeNode.GetImageData() is None or volumeNode.GetParentTransformNode():
+            return None
+        segmentationKey = self.getSegmentationContentKey(segmentationNode)
+        if segmentationKey is None:
+            return None
+        ijkToRas = vtk.vtkMatrix4x4()
+        volumeNode.GetIJKToRASMatrix(ijkToRas)
+        segmentation = segmentationNode.GetSegmentation()
+        segmentKeys = []
+        for i in range(segmentation.GetNumberOfSegments()):
+            segmentKeys.append([segmentation.GetNthSegmentID(i), segmentation.GetNthSegment(i).GetName()])
+        options = {'sourceRepresentation': self.getSourceRepresentationName(segmentation),
+                   'exactVoxelSlices': self.exactVoxelSlices}
+        return SliceStatLib.case_key(segmentationKey, volumeNode.GetImageData().GetDimensions(),
+                                     slicer.util.arrayFromVTKMatrix(ijkToRas), segmentKeys, SliceStatLib.SCENE_EXTRACTION, options)
+
+    def get_cached_extraction(self, segmentationNode, referenceVolumeNode, asIntervals=False):
+        """
+        Get the results of a segmentation/reference volume pair from the extraction cache, or None.
+        """
+        cacheKey = self.getExtractionCacheKey(segmentationNode, referenceVolumeNode)
+        return self.extractionCache.get(*cacheKey, asIntervals) if cacheKey is not None else None
 
-        logging.info('Export all mode completed')
-        return warnings
+    def getExtractionCacheKey(self, segmentationNode, referenceVolumeNode):
+        """
+        Get the (owner, stamp, key) of a segmentation/reference volume pair in the extraction cache,
+        or None if it cannot be cached (cache disabled, node not in the scene, transformed nodes or no reference image).
+        The stamp is made of the modified times of the segmentation node, its segments and their source
+        representations, so editing a segment invalidates the entries of the node. The key combines the
+        reference geometry (dimensions, spacing, origin, directions), the segment IDs and names and the options
+        that change the extraction.
+        """
+        if self.extractionCache is None or self.extractionCache.maxSize <= 0:
+            return None
+        if segmentationNode.GetID() is None or segmentationNode.GetParentTransformNode() \
+                or referenceVolumeNode.GetParentTransformNode() or referenceVolumeNode.GetImageData() is None:
+            return None
+        segmentation = segmentationNode.GetSegmentation()
+        segmentIds = [segmentation.GetNthSegmentID(i) for i in range(segmentation.GetNumberOfSegments())]
+        stamp = (segmentationNode.GetMTime(), segmentation.GetMTime(),
+                 tuple(self.getSourceRepresentationTime(segmentationNode, segmentId) for segmentId in segmentIds))
+        ijkToRas = vtk.vtkMatrix4x4()
+        referenceVolumeNode.GetIJKToRASMatrix(ijkToRas)
+        key = SliceStatLib.extraction_key(
+            referenceVolumeNode.GetImageData().GetDimensions(), slicer.util.arrayFromVTKMatrix(ijkToRas),
+            [(segmentId, segmentation.GetSegment(segmentId).GetName()) for segmentId in segmentIds],
+            {'exactVoxelSlices': self.exactVoxelSlices})
+        return segmentationNode.GetID(), stamp, key
+
+    def getSegmentationContentKey(self, segmentationNode):
+        """
+        Get a key that changes whenever the segmentation content changes.
+        Segmentations read from a file and not modified since use the file modification time and size,
+        others use a hash of their internal binary labelmaps. Returns None if it cannot be determined.
+        """
+        if segmentationNode.GetParentTransformNode():
+            return None
+
+        storageNode = segmentationNode.GetStorageNode()
+        if storageNode and storageNode.GetFileName() and os.path.exists(storageNode.GetFileName()) \
+                and not segmentationNode.GetModifiedSinceRead():
+            return SliceStatLib.file_key(storageNode.GetFileName())
+
+        from vtk.util import numpy_support
+        segmentation = segmentationNode.GetSegmentation()
+        representationName = self.getBinaryLabelmapRepresentationName()
+        if segmentation.GetNumberOfSegments() == 0 or not segmentation.ContainsRepresentation(representationName):
+            return None
+
+        segmentLabels = []
+        layers = []
+        hashedImages = set()
+        for i in range(segmentation.GetNumberOfSegments()):
+            segment = segmentation.GetNthSegment(i)
+            segmentLabels.append((segmentation.GetNthSegmentID(i), segment.GetLabelValue()))
+            image = segment.GetRepresentation(representationName)
+            if image is None:
+                return None
+            # Segments in a shared layer have the same image, hash it only once
+            if image in hashedImages:
+                continue
+            hashedImages.add(image)
+            imageToWorld = vtk.vtkMatrix4x4()
+            image.GetImageToWorldMatrix(imageToWorld)
+            scalars = image.GetPointData().GetScalars()
+            layers.append((image.GetExtent(), slicer.util.arrayFromVTKMatrix(imageToWorld),
+                           numpy_support.vtk_to_numpy(scalars) if scalars is not None else None))
+        return SliceStatLib.content_key(segmentLabels, layers)
+
+    def getBinaryLabelmapRepresentationName(self):
+        converter = slicer.vtkSegmentationConverter
+        if hasattr(converter, 'GetSegmentationBinaryLabelmapRepresentationName'):
+            return converter.GetSegmentationBinaryLabelmapRepresentationName()
+        return converter.GetBinaryLabelmapRepresentationName()
+
+    def getClosedSurfaceRepresentationName(self):
+        converter = slicer.vtkSegmentationConverter
+        if hasattr(converter, 'GetSegmentationClosedSurfaceRepresentationName'):
+            return converter.GetSegmentationClosedSurfaceRepresentationName()
+        return converter.GetClosedSurfaceRepresentationName()
+
+    def getSourceRepresentationName(self, segmentation):
+        if hasattr(segmentation, 'GetSourceRepresentationName'):
+            return segmentation.GetSourceRepresentationName()
+        return segmentation.GetMasterRepresentationName()
+
+    def getSourceRepresentationTime(self, segmentationNode, segmentId):
+        """
+        Get the modification time of the source representation of a segment (shared by the segments of a layer),
+        0 if it has none.
+        """
+        segmentation = segmentationNode.GetSegmentation()
+        representation = segmentation.GetSegment(segmentId).GetRepresentation(self.getSourceRepresentationName(segmentation))
+        return representation.GetMTime() if representation is not None else 0
 
-    def write_csv_all(self, allResults, outputPath, appendMode=False):
+    def getWorkerCasePaths(self, volumeNode, segmentationNode):
+        """
+        Get the (volume file, segmentation file) paths of a pair that worker processes give the same results for
+        as the scene: both nodes are file backed (see getFileBackedCasePaths), and the segmentation file grid
+        is the reference grid shifted by whole voxels, so the scene does not resample it either.
+        Returns None otherwise.
+        """
+        casePaths = self.getFileBackedCasePaths(volumeNode, segmentationNode)
+        if not casePaths or volumeNode.GetImageData() is None:
+            return None
+        ijkToRas = vtk.vtkMatrix4x4()
+        volumeNode.GetIJKToRASMatrix(ijkToRas)
+        return SliceStatLib.worker_case_paths(*casePaths, slicer.util.arrayFromVTKMatrix(ijkToRas),
+                                              volumeNode.GetImageData().GetDimensions())
+
+    def getFileBackedCasePaths(self, volumeNode, segmentationNode):
+        """
+        Get the (volume file, segmentation file) paths if both nodes can be processed directly from their files
+        (see SliceStatLib.file_backed_case_paths): volume stored in .nii.gz/.nii, segmentation in .seg.nrrd,
+        neither modified since read nor transformed. Returns None otherwise.
+        """
+        paths = []
+        for node in (volumeNode, segmentationNode):
+            storageNode = node.GetStorageNode()
+            if not storageNode or node.GetModifiedSinceRead() or node.GetParentTransformNode():
+                return None
+            paths.append(storageNode.GetFileName())
+        return SliceStatLib.file_backed_case_paths(*paths)
+
+    def write_csv_all(self, allResults, outputPath, appendMode=False, intervalColumn=False):
         """
         Write all volume results to CSV file for Multi Sample mode
         ID column: only first row of each volume group has value (volume name), other rows are empty but keep comma
         """
-        file_exists = os.path.exists(outputPath) and appendMode
-
-        with open(outputPath, 'a' if appendMode else 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
-            
-            # Write header if not appending or if file doesn't exist
-            if not file_exists:
-                writer.writerow(['ID', 'SegmentName', 'SliceNumbers', 'SliceCount'])
-            
-            # Write data rows for each volume
-            for volumeId, segmentResults in allResults.items():
-                first_segment = True
-                for segmentName, sliceNumbers in segmentResults.items():
-                    if first_segment:
-                        # First row of volume: use volume name as ID
-                        segmentId = volumeId
-                        # Add tab prefix to prevent Excel SYLK format detection
-                        if segmentId and not segmentId.startswith('\t'):
-                            segmentId = '\t' + str(segmentId)
-                        first_segment = False
-                    else:
-                        # Other rows of same volume: empty ID but keep comma
-                        segmentId = ""
-                    
-                    sliceNumbersStr = ",".join(map(str, sliceNumbers)) if sliceNumbers else ""
-                    sliceCount = len(sliceNumbers) if sliceNumbers else 0
-                    writer.writerow([segmentId, segmentName, sliceNumbersStr, sliceCount])
+        SliceStatLib.write_csv_all(allResults, outputPath, appendMode, intervalColumn)
+
+    def write_columnar(self, allResults, outputPath, appendMode=False, columnarFormat='parquet'):
+        """
+        Write all volume results to a columnar file (Parquet, Feather or NPZ) next to the CSV output file
+        Every row has its ID and slice numbers are stored as integer lists, for fast loading in analysis tools.
+        """
+        columnarOutputPath = SliceStatLib.columnar_path(outputPath, columnarFormat)
+        try:
+            SliceStatLib.write_columnar(allResults, columnarOutputPath, appendMode, columnarFormat)
+        except IOError as e:
+            raise IOError(f"Could not write to file {columnarOutputPath}: {e}")
+
+    def write_statistics(self, allStatistics, outputPath, appendMode=False):
+        """
+        Write per-slice voxel counts and areas of all volumes to the statistics side table of the CSV output file
+        One row per volume, segment, axis (K, J, I) and non-empty slice, with the ID on every row.
+        """
+        statisticsOutputPath = SliceStatLib.statistics_path(outputPath)
+        try:
+            SliceStatLib.write_statistics_csv(allStatistics, statisticsOutputPath, appendMode)
+        except IOError as e:
+            raise IOError(f"Could not write to file {statisticsOutputPath}: {e}")
+
+    def add_presence_masks(self, caseId, segmentResults, referenceVolumeNode):
+        """
+        Keep the slice presence of a case as bit-packed masks (one bit per slice of the reference volume)
+        in self.presenceMasks, for set operations across segments and cases (see SliceStatLib.PresenceMaskStore).
+        """
+        imageData = referenceVolumeNode.GetImageData() if referenceVolumeNode is not None else None
+        numberOfSlices = imageData.GetDimensions()[2] if imageData is not None else None
+        self.presenceMasks.add_case(caseId, segmentResults, numberOfSlices)
+
+    def write_presence_masks(self, caseIds, outputPath, appendMode=False, removedIds=()):
+        """
+        Save the slice masks of cases to the masks file of the CSV output file (e.g. output_masks.npz).
+        In append mode, the other cases of an existing masks file are kept, except for the cases in removedIds.
+        """
+        SliceStatLib.write_case_masks(self.presenceMasks, caseIds, outputPath, appendMode, removedIds)
+
+    def load_presence_masks(self, outputPath):
+        """
+        Add the cases of the masks file of a CSV output file to self.presenceMasks and return it.
+        """
+        self.presenceMasks.update_from_file(SliceStatLib.masks_path(outputPath))
+        return self.presenceMasks
+
+    def merge_shards(self, outputPath, columnarFormat=None, allowIncomplete=False):
+        """
+        Merge the shard files of a sharded Multi Sample export (see run_export_all) into outputPath, sorted by volume name.
+        Missing shards or volumes and conflicting duplicates raise ValueError (missing ones are only reported
+        in the returned warnings if allowIncomplete is set). The cohort index is rebuilt if cohortIndexEnabled is set.
+        """
+        return SliceStatLib.merge_shards(outputPath, None, columnarFormat, allowIncomplete, self.cohortIndexEnabled)
+
+    def write_cohort_index(self, caseResults, outputPath, appendMode=False):
+        """
+        Add case results ({volumeId: segmentResults} or (volumeId, segmentResults) pairs) to the cohort index
+        of the CSV output file (e.g. output_index.sqlite). Without append mode the index is cleared first;
+        in append mode an index that does not exist yet is built from the existing output file.
+        """
+        SliceStatLib.write_index(caseResults, outputPath, appendMode)
+
+    def open_cohort_index(self, outputPath, rebuild=False):
+        """
+        Open the cohort index of a CSV output file. It is built from the CSV file if it does not exist or rebuild is set.
+        The caller closes the returned SliceStatLib.CohortIndex (it can be used in a with statement).
+        """
+        indexOutputPath = SliceStatLib.index_path(outputPath)
+        if rebuild or not os.path.exists(indexOutputPath):
+            if not os.path.exists(outputPath):
+                raise ValueError(f"Output file {outputPath} does not exist.")
+            SliceStatLib.build_index(outputPath, indexOutputPath)
+        return SliceStatLib.CohortIndex(indexOutputPath)
+
+    def query_cohort(self, outputPath, segmentName=None, sliceIndex=None, minimumCount=None, maximumCount=None):
+        """
+        Query the cohort index of a CSV output file, without loading any volume.
+        Returns (caseId, segmentName, sliceCount) of the segments with the given name, present on slice sliceIndex
+        and with a slice count in [minimumCount, maximumCount]; conditions that are None are not checked.
+        For example, cases with Liver on slice 120: query_cohort(path, 'Liver', sliceIndex=120),
+        cases with more than 50 Tumor slices: query_cohort(path, 'Tumor', minimumCount=51).
+        """
+        with self.open_cohort_index(outputPath) as cohortIndex:
+            return cohortIndex.query(segmentName, sliceIndex, minimumCount, maximumCount)
+
+    def getSequenceNode(self, proxyNode):
+        """
+        Get the sequence of a sequence browser proxy node (e.g. the segmentation shown for the current frame),
+        or None if the node is not a proxy node.
+        """
+        if proxyNode is None or not hasattr(slicer.modules, 'sequences'):
+            return None
+        browserNode = slicer.modules.sequences.logic().GetFirstBrowserNodeForProxyNode(proxyNode)
+        if browserNode is None:
+            return None
+        return browserNode.GetSequenceNode(proxyNode)
+
+    def getVolumeBaseName(self, volumeNode):
+        """
+        Get the base name of a volume: its file name without .nii.gz or .nii extension,
+        or the node name if the volume is not stored in a file.
+        """
+        storageNode = volumeNode.GetStorageNode()
+        if storageNode and storageNode.GetFileName():
+            volumeBaseName = SliceStatLib.volume_base_name(os.path.basename(storageNode.GetFileName()))
+            if volumeBaseName:
+                return volumeBaseName
+        return volumeNode.GetName()
+
+    def getSegmentationIdentifier(self, segmentationNode):
+        """
+        Get the identifier used for matching a segmentation: its file name, or the node name if not stored in a file.
+        """
+        segStorageNode = segmentationNode.GetStorageNode()
+        if segStorageNode and segStorageNode.GetFileName():
+            return os.path.basename(segStorageNode.GetFileName())
+        return segmentationNode.GetName()
 
     def getReferenceVolume(self, segmentationNode):
         """
@@ -0,0 +1,182 @@
+"""
+Streaming cohort-level summary of exported results, per segment name.
+
+CohortAggregates is updated with the results of each case as soon as it is done, so the summary is available
+when the export finishes without reading the output file again. Each segment name uses constant memory:
+running sums for the mean and standard deviation of the slice count, minimum and maximum of the slice count
+and of the first and last slices, and a fixed-size histogram sketch for the slice count quantiles.
+"""
+import csv
+import math
+import os
+
+import numpy as np
+
+from .CsvExport import segment_results_from_rows
+from .Intervals import SliceIntervals
+
+SUMMARY_HEADER = ['SegmentName', 'Cases', 'EmptyCases',
+                  'SliceCountMin', 'SliceCountMean', 'SliceCountStd',
+                  'SliceCountP10', 'SliceCountP25', 'SliceCountMedian', 'SliceCountP75', 'SliceCountP90', 'SliceCountMax',
+                  'FirstSliceMin', 'FirstSliceMax', 'LastSliceMin', 'LastSliceMax']
+
+SUMMARY_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+DEFAULT_SKETCH_BINS = 1024
+
+
+def summary_path(outputPath):
+    """
+    Get the path of the summary table of an output CSV file, e.g. output.csv -> output_summary.csv.
+    """
+    basePath, extension = os.path.splitext(outputPath)
+    if extension.lower() != '.csv':
+        basePath = outputPath
+    return basePath + '_summary.csv'
+
+
+class QuantileSketch:
+    """
+    Histogram of non-negative integers with a fixed number of bins. Bins are one value wide until a value does not fit,
+    then neighbouring bins are merged and the bin width doubles, so quantiles are exact for values below maxBins
+    and otherwise within one bin width. Sketches with the same number of bins can be merged.
+    """
+
+    def __init__(self, maxBins=DEFAULT_SKETCH_BINS):
+        self.maxBins = maxBins + maxBins % 2
+        self.binWidth = 1
+        self.counts = np.zeros(self.maxBins, dtype=np.int64)
+        self.total = 0
+
+    def _widen(self):
+        self.counts = np.concatenate((self.counts.reshape(-1, 2).sum(axis=1), np.zeros(self.maxBins // 2, dtype=np.int64)))
+        self.binWidth *= 2
+
+    def add(self, value, count=1):
+        value = max(int(value), 0)
+        while value >= self.binWidth * self.maxBins:
+            self._widen()
+        self.counts[value // self.binWidth] += count
+        self.total += count
+
+    def merge(self, other):
+        if other.maxBins != self.maxBins:
+            raise ValueError("Only sketches with the same number of bins can be merged.")
+        while self.binWidth < other.binWidth:
+            self._widen()
+        otherCounts = other.counts
+        if other.binWidth < self.binWidth:
+            factor = self.binWidth // other.binWidth
+            otherCounts = np.bincount(np.arange(len(otherCounts)) // factor, weights=otherCounts,
+                                      minlength=self.maxBins).astype(np.int64)[:self.maxBins]
+        self.counts += otherCounts
+        self.total += other.total
+
+    def quantile(self, q):
+        """
+        Get the q quantile (0 to 1) of the added values: the lowest value of the first bin that reaches it,
+        or None if no value was added.
+        """
+        if self.total == 0:
+            return None
+        rank = max(math.ceil(q * self.total), 1)
+        binIndex = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return binIndex * self.binWidth
+
+
+class SegmentAggregate:
+    """
+    Summary of one segment name: number of cases with slices, number of cases where it is empty,
+    slice count statistics and extent of the first and last slices.
+    """
+
+    def __init__(self, sketchBins=DEFAULT_SKETCH_BINS):
+        self.cases = 0
+        self.emptyCases = 0
+        self.countSum = 0
+        self.countSquareSum = 0
+        self.countMin = None
+        self.countMax = None
+        self.firstMin = None
+        self.firstMax = None
+        self.lastMin = None
+        self.lastMax = None
+        self.sliceCounts = QuantileSketch(sketchBins)
+
+    def add(self, sliceNumbers):
+        if isinstance(sliceNumbers, SliceIntervals):
+            count = sliceNumbers.count
+            first = int(sliceNumbers.starts[0]) if count else None
+            last = int(sliceNumbers.stops[-1]) - 1 if count else None
+        else:
+            count = len(sliceNumbers) if sliceNumbers else 0
+            first = min(sliceNumbers) if count else None
+            last = max(sliceNumbers) if count else None
+        if count == 0:
+            self.emptyCases += 1
+            return
+        self.cases += 1
+        self.countSum += count
+        self.countSquareSum += count * count
+        self.countMin = count if self.countMin is None else min(self.countMin, count)
+        self.countMax = count if self.countMax is None else max(self.countMax, count)
+        self.firstMin = first if self.firstMin is None else min(self.firstMin, first)
+        self.firstMax = first if self.firstMax is None else max(self.firstMax, first)
+        self.lastMin = last if self.lastMin is None else min(self.lastMin, last)
+        self.lastMax = last if self.lastMax is None else max(self.lastMax, last)
+        self.sliceCounts.add(count)
+
+    def summary_row(self, segmentName):
+        mean = std = None
+        if self.cases:
+            mean = self.countSum / self.cases
+            std = math.sqrt(max(self.countSquareSum / self.cases - mean * mean, 0.0))
+        quantiles = [self.sliceCounts.quantile(q) for q in SUMMARY_QUANTILES]
+        values = [segmentName, self.cases, self.emptyCases, self.countMin,
+                  round(mean, 3) if mean is not None else None, round(std, 3) if std is not None else None,
+                  *quantiles, self.countMax, self.firstMin, self.firstMax, self.lastMin, self.lastMax]
+        return ["" if value is None else value for value in values]
+
+
+class CohortAggregates:
+    """
+    Per segment name summaries of a cohort, updated one case at a time.
+    """
+
+    def __init__(self, sketchBins=DEFAULT_SKETCH_BINS):
+        self.sketchBins = sketchBins
+        self.numberOfCases = 0
+        # {segmentName: SegmentAggregate} in order of first appearance
+        self.segments = {}
+
+    def add_case(self, segmentResults):
+        """
+        Add the {segmentName: slice numbers or SliceIntervals} results of a case.
+        """
+        self.numberOfCases += 1
+        for segmentName, sliceNumbers in segmentResults.items():
+            aggregate = self.segments.get(segmentName)
+            if aggregate is None:
+                aggregate = self.segments[segmentName] = SegmentAggregate(self.sketchBins)
+            aggregate.add(sliceNumbers)
+
+    def add_rows(self, rows):
+        """
+        Add a case from its CSV rows (e.g. written by an earlier export).
+        """
+        self.add_case(segment_results_from_rows(rows))
+
+    def summary_rows(self):
+        return [aggregate.summary_row(segmentName) for segmentName, aggregate in self.segments.items()]
+
+    def write_csv(self, path):
+        """
+        Write the summary table, one row per segment name (see SUMMARY_HEADER).
+        The file is written to a temporary file first and then replaces the original.
+        """
+        tempPath = path + '.tmp'
+        with open(tempPath, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(SUMMARY_HEADER)
+            writer.writerows(self.summary_rows())
+        os.replace(tempPath, path)
@@ -0,0 +1,192 @@
+"""
+Headless batch export of slice statistics for a directory of volumes and segmentations.
+
+Volumes (.nii.gz, .nii) are paired with segmentations (.seg.nrrd) using the same rules as
+Multi Sample mode and go through the same export loop (see SliceStatLib.Export.export_cases_steps),
+but the files are read directly, without Slicer, Qt or a MRML scene.
+Only the volume headers are read; segmentation voxels are streamed with a bounded memory budget.
+
+Usage:
+    python -m SliceStatLib.Batch <input directory> <output.csv> [--append] [--workers N] [--memory-budget MB]
+                                 [--intervals] [--columnar {parquet,feather,npz}]
+                                 [--cache-dir DIR] [--cache-size MB] [--no-resume] [--index] [--summary]
+                                 [--shard-index I --shard-count N] [--prefetch N] [--prefetch-memory MB]
+
+Rows are written as soon as each case is done, with checkpoints next to the output file;
+an interrupted export to the same output file resumes and skips the cases already written.
+With --shard-count, only the cases of one shard are exported to a shard file (see SliceStatLib.Sharding),
+so that a large cohort can be exported by several nodes and merged afterwards.
+With --prefetch, the next cases are loaded while the current one is processed (see SliceStatLib.Pipeline).
+"""
+import argparse
+import contextlib
+import logging
+import os
+import sys
+
+from .Columnar import COLUMNAR_FORMATS
+from .Core import process_case, process_loaded_case
+from .DiskCache import DEFAULT_CACHE_SIZE, FILE_EXTRACTION, ResultCache, case_key, file_key
+from .Export import SEGMENTATION_EXTENSIONS, VOLUME_EXTENSIONS, CohortExport, export_cases_steps
+from .FileIO import NiftiHeader, SegmentationFile
+from .Matching import match_volumes, volume_base_name
+from .Pipeline import DEFAULT_PREFETCH_MEMORY, CasePrefetcher
+from .Progress import run_to_completion
+from .Streaming import DEFAULT_MEMORY_BUDGET
+
+
+def find_case_pairs(directory):
+    """
+    Pair the volumes in a directory with their matching segmentation.
+    Returns a list of (volumeId, volumePath, segmentationPath) sorted by volume file name,
+    and a list of warnings for volumes without a matching segmentation or with an ambiguous match.
+    """
+    fileNames = sorted(os.listdir(directory))
+    segmentationFileNames = [name for name in fileNames if name.lower().endswith(SEGMENTATION_EXTENSIONS)]
+    volumeFileNames = [name for name in fileNames if name.lower().endswith(VOLUME_EXTENSIONS)]
+
+    volumeIds = [volume_base_name(volumeFileName) for volumeFileName in volumeFileNames]
+    matches, _, warnings = match_volumes([(volumeId, volumeId) for volumeId in volumeIds], segmentationFileNames)
+    pairs = [(volumeId, os.path.join(directory, volumeFileName), os.path.join(directory, segmentationFileNames[index]))
+             for volumeId, volumeFileName, index in zip(volumeIds, volumeFileNames, matches) if index is not None]
+    return pairs, warnings
+
+
+def case_cache_key(volumePath, segmentationPath):
+    """
+    Get the result cache key of a case from the segmentation file and the volume geometry.
+    Only file headers are read.
+    """
+    volumeHeader = NiftiHeader(volumePath)
+    segmentationFile = SegmentationFile(segmentationPath)
+    segmentKeys = [[segment.segmentId, segment.name] for segment in segmentationFile.segments]
+    return case_key(file_key(segmentationPath), volumeHeader.dimensions, volumeHeader.ijk_to_ras(),
+                    segmentKeys, FILE_EXTRACTION)
+
+
+def run_directory_batch(directory, outputPath, appendMode=False, numberOfWorkers=1, memoryBudget=DEFAULT_MEMORY_BUDGET,
+                        resultCache=None, intervalColumn=False, columnarFormat=None, resume=True, cohortIndex=False,
+                        shardIndex=0, shardCount=1, cohortSummary=False, prefetchCases=0,
+                        prefetchMemory=DEFAULT_PREFETCH_MEMORY):
+    """
+    Export slice statistics of all volume/segmentation pairs in a directory to a Multi Sample CSV file.
+    Cases are processed by numberOfWorkers worker processes, results are written in volume file name order.
+    Each worker holds at most memoryBudget bytes of segmentation voxels at a time.
+    If a ResultCache is given, unchanged cases are read from it instead of being processed again.
+    If intervalColumn is set, a SliceIntervals column (e.g. "12-87,90-95") is added to the CSV file.
+    If columnarFormat is set ('parquet', 'feather' or 'npz'), the results are also written to a columnar file
+    next to the CSV file.
+    Rows are written as soon as each case is done, with checkpoints (see CheckpointedCsvWriter). If resume is set,
+    an interrupted export to the same output file skips the cases already written.
+    If cohortIndex is set, the exported cases are written to the cohort index of the output file (output_index.sqlite).
+    If shardCount > 1, only the cases of shard shardIndex (0 to shardCount - 1) are exported, sorted by case ID,
+    to the shard file of the output file (e.g. output.shard-002-of-008.csv) with a manifest; the shards are then
+    combined by SliceStatLib.Sharding.merge_shards, which also writes the columnar file and the cohort index.
+    If cohortSummary is set, a per segment summary table (output_summary.csv, see CohortAggregates) is updated
+    as each case is done and written next to the output file; it is not written for shards.
+    If prefetchCases > 0 and there is one worker, up to prefetchCases cases are loaded ahead of their processing,
+    holding at most prefetchMemory bytes, and results are written in a separate thread (see SliceStatLib.Pipeline).
+    The cases go through the same export loop as Multi Sample mode (see SliceStatLib.Export.export_cases_steps).
+    Returns the list of warnings.
+    """
+    if not os.path.isdir(directory):
+        raise ValueError(f"Invalid input directory provided: {directory}")
+    if not outputPath:
+        raise ValueError("Invalid output path provided.")
+
+    logging.info('Directory batch export started')
+
+    pairs, warnings = find_case_pairs(directory)
+    casePaths = {volumeId: (volumePath, segmentationPath) for volumeId, volumePath, segmentationPath in pairs}
+    export = CohortExport(outputPath, appendMode, intervalColumn, resume, columnarFormat=columnarFormat,
+                          cohortIndex=cohortIndex, cohortSummary=cohortSummary, shardIndex=shardIndex, shardCount=shardCount)
+    if export.sharded:
+        logging.info(f"Exporting shard {shardIndex} of {shardCount} to {export.outputPath}")
+    pipelined = prefetchCases > 0 and numberOfWorkers <= 1
+
+    with contextlib.ExitStack() as stack:
+        prefetched = []
+
+        def onComputePlanned(caseIds):
+            logging.info(f"Processing {len(caseIds)} cases with {max(numberOfWorkers, 1)} worker(s)...")
+            if pipelined and len(caseIds) > 1:
+                prefetcher = stack.enter_context(CasePrefetcher([casePaths[caseId] for caseId in caseIds],
+                                                                prefetchCases, prefetchMemory))
+                stack.callback(lambda: logging.info(f"Waited {prefetcher.waitTime:.1f} s for cases to be loaded"))
+                prefetched.extend((prefetcher, iter(prefetcher)))
+
+        def computeCase(caseId):
+            # One step per case, the batch export runs to completion
+            yield
+            if not prefetched:
+                return process_case(*casePaths[caseId], memoryBudget)
+            # Cases are computed in the planned order, like the prefetcher loads them
+            prefetcher, cases = prefetched
+            case = next(cases)
+            try:
+                if case.errorMessage is not None:
+                    raise RuntimeError(case.errorMessage)
+                return process_loaded_case(case.volumeHeader, case.segmentationFile, memoryBudget)
+            finally:
+                prefetcher.release(case)
+
+        warnings.extend(run_to_completion(export_cases_steps(
+            export, [volumeId for volumeId, _, _ in pairs], computeCase,
+            resultCache=resultCache,
+            cacheKeyOf=lambda caseId: case_cache_key(*casePaths[caseId]),
+            workerCasePathsOf=lambda caseId: casePaths[caseId],
+            numberOfWorkers=numberOfWorkers,
+            memoryBudget=memoryBudget,
+            onComputePlanned=onComputePlanned,
+            writeInBackground=pipelined)))
+
+    logging.info('Directory batch export completed')
+    return warnings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export slice statistics for a directory of volumes and segmentations.")
+    parser.add_argument("directory", help="Directory containing volumes (.nii.gz, .nii) and segmentations (.seg.nrrd)")
+    parser.add_argument("output", help="Output CSV file")
+    parser.add_argument("--append", action="store_true", help="Append to the output file if it exists")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (default: 1)")
+    parser.add_argument("--memory-budget", type=float, default=DEFAULT_MEMORY_BUDGET / (1024 * 1024),
+                        help="Maximum segmentation voxel memory per worker, in MB (default: %(default)g)")
+    parser.add_argument("--intervals", action="store_true", help="Add a SliceIntervals column (e.g. 12-87,90-95)")
+    parser.add_argument("--columnar", choices=sorted(COLUMNAR_FORMATS),
+                        help="Also write the results to a columnar file next to the CSV file")
+    parser.add_argument("--cache-dir", help="Directory of the result cache, unchanged cases are not processed again")
+    parser.add_argument("--cache-size", type=float, default=DEFAULT_CACHE_SIZE / (1024 * 1024),
+                        help="Maximum size of the result cache, in MB (default: %(default)g)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Start over instead of resuming an interrupted export to the same output file")
+    parser.add_argument("--index", action="store_true",
+                        help="Also build a SQLite cohort index next to the CSV file (e.g. output_index.sqlite)")
+    parser.add_argument("--summary", action="store_true",
+                        help="Also write a per segment summary table next to the CSV file (e.g. output_summary.csv)")
+    parser.add_argument("--shard-index", type=int, default=0, help="Index of the shard to export, 0 to N - 1 (default: 0)")
+    parser.add_argument("--shard-count", type=int, default=1,
+                        help="Number of shards N: export only the cases of one shard to a shard file, "
+                             "merge the shards with python -m SliceStatLib.Sharding (default: 1)")
+    parser.add_argument("--prefetch", type=int, default=0,
+                        help="Number of cases to load ahead of their processing with one worker, "
+                             "overlapping file reading with computation (default: 0, no prefetching)")
+    parser.add_argument("--prefetch-memory", type=float, default=DEFAULT_PREFETCH_MEMORY / (1024 * 1024),
+                        help="Maximum segmentation data held by prefetched cases, in MB (default: %(default)g)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    appendMode = args.append and os.path.exists(args.output)
+    memoryBudget = int(args.memory_budget * 1024 * 1024)
+    resultCache = ResultCache(args.cache_dir, int(args.cache_size * 1024 * 1024)) if args.cache_dir else None
+    warnings = run_directory_batch(args.directory, args.output, appendMode, args.workers, memoryBudget, resultCache,
+                                   args.intervals, args.columnar, not args.no_resume, args.index,
+                                   args.shard_index, args.shard_count, args.summary,
+                                   args.prefetch, int(args.prefetch_memory * 1024 * 1024))
+    for warning in warnings:
+        logging.warning(warning)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
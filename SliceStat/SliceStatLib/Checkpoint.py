@@ -0,0 +1,263 @@
+"""
+Streaming, crash-resumable writing of cohort CSV files.
+
+CheckpointedCsvWriter writes the rows of each case as soon as the case is done instead of keeping
+the results of the whole cohort in memory. Rows are appended to a partial file (output.csv.partial);
+after each flush the partial file is synced and a checkpoint manifest (output.csv.checkpoint.json)
+with the byte range of every written case replaces the previous one. By default every case is flushed,
+so an interrupted export only loses the case it was processing; flushCases > 1 buffers several cases per write.
+An interrupted export is resumed from the last checkpoint: rows written after it are dropped and
+the cases in the manifest are skipped. finish() merges the partial file into the output file
+(replacing the rows of cases already in it in append mode, or removing them if they now have no rows)
+and removes the checkpoint.
+"""
+import csv
+import io
+import json
+import logging
+import os
+
+from .CsvExport import FRAME_COLUMNS, INTERVALS_COLUMN, csv_header, iter_csv_groups, read_csv_header
+
+CHECKPOINT_VERSION = 1
+
+# Number of cases buffered in memory between flushes
+DEFAULT_FLUSH_CASES = 1
+
+
+def checkpoint_path(outputPath):
+    """
+    Get the path of the checkpoint manifest of an output file, e.g. output.csv -> output.csv.checkpoint.json.
+    """
+    return outputPath + '.checkpoint.json'
+
+
+def partial_path(outputPath):
+    """
+    Get the path of the partial file that holds the rows written since the export started.
+    """
+    return outputPath + '.partial'
+
+
+def open_checkpointed_csv(outputPath, appendMode=False, intervalColumn=False, resume=True, flushCases=DEFAULT_FLUSH_CASES,
+                          frameColumns=False):
+    """
+    Create the CheckpointedCsvWriter of a results CSV file, with the frame columns of sequences if frameColumns is set.
+    Returns (writer, intervalColumn); in append mode the header of the existing file decides
+    whether the slice intervals column is written.
+    Raises ValueError if the frame columns of an existing file do not match.
+    """
+    header = None
+    if appendMode and os.path.exists(outputPath):
+        header = read_csv_header(outputPath)
+    if header:
+        intervalColumn = INTERVALS_COLUMN in header
+        if all(column in header for column in FRAME_COLUMNS) != frameColumns:
+            if frameColumns:
+                raise ValueError(f"Output file {outputPath} has no frame columns, sequence results cannot be added to it.")
+            raise ValueError(f"Output file {outputPath} has sequence frame columns, only sequence results can be added to it.")
+    else:
+        header = csv_header(intervalColumn, frameColumns)
+    return CheckpointedCsvWriter(outputPath, header, appendMode, flushCases, resume), intervalColumn
+
+
+class CheckpointedCsvWriter:
+    """
+    Writes the rows of cases (volumes) to a CSV output file one case at a time, with checkpoints.
+    Usage:
+        writer = CheckpointedCsvWriter(outputPath, header, appendMode)
+        for each case not in writer.completed: writer.add_case(volumeId, rows) or writer.skip_case(volumeId)
+        writer.finish(caseOrder)
+    If the export fails, close() writes a last checkpoint; a new writer with the same output path,
+    header and append mode then resumes from it.
+    """
+
+    def __init__(self, outputPath, header, appendMode=False, flushCases=DEFAULT_FLUSH_CASES, resume=True):
+        self.outputPath = outputPath
+        self.header = list(header)
+        self.appendMode = appendMode
+        self.flushCases = max(flushCases, 1)
+        self.partialPath = partial_path(outputPath)
+        self.manifestPath = checkpoint_path(outputPath)
+        # Committed cases: {volumeId: (offset, length)} in the partial file, in write order
+        self.cases = {}
+        # Cases that were done but have no rows (e.g. no segments found)
+        self.skipped = set()
+        self.partialSize = 0
+        self.resumedCases = 0
+        self._buffer = []
+        # Cases skipped since the last flush
+        self._pendingSkips = 0
+        self._checkpointChanged = False
+
+        if not (resume and self._load_checkpoint()):
+            self.discard()
+            with open(self.partialPath, 'wb'):
+                pass
+
+    def _load_checkpoint(self):
+        """
+        Load the checkpoint of an interrupted export. Returns False if there is none or it does not match this export.
+        """
+        if not (os.path.exists(self.manifestPath) and os.path.exists(self.partialPath)):
+            return False
+        try:
+            with open(self.manifestPath, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if (manifest.get('version') != CHECKPOINT_VERSION or manifest.get('header') != self.header
+                    or manifest.get('appendMode') != self.appendMode):
+                logging.info(f"Checkpoint {self.manifestPath} belongs to a different export, starting over")
+                return False
+            partialSize = int(manifest['partialSize'])
+            if os.path.getsize(self.partialPath) < partialSize:
+                logging.warning(f"Partial file {self.partialPath} is shorter than its checkpoint, starting over")
+                return False
+            cases = {volumeId: (int(offset), int(length)) for volumeId, offset, length in manifest['cases']}
+            skipped = set(manifest.get('skipped', []))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Could not read checkpoint {self.manifestPath}, starting over: {e}")
+            return False
+
+        # Drop rows written after the last checkpoint
+        with open(self.partialPath, 'r+b') as f:
+            f.truncate(partialSize)
+        self.cases = cases
+        self.skipped = skipped
+        self.partialSize = partialSize
+        self.resumedCases = len(cases) + len(skipped)
+        logging.info(f"Resuming export from checkpoint, {self.resumedCases} cases are already done")
+        return True
+
+    @property
+    def completed(self):
+        """Volume IDs of the cases that are done, including buffered ones."""
+        return set(self.cases) | self.skipped | {volumeId for volumeId, _ in self._buffer}
+
+    def add_case(self, volumeId, rows):
+        """
+        Add the rows of a case. Rows are buffered and written at the next flush.
+        A case that was already written is replaced.
+        """
+        text = io.StringIO()
+        csv.writer(text, quoting=csv.QUOTE_MINIMAL).writerows(rows)
+        self._buffer.append((volumeId, text.getvalue().encode('utf-8')))
+        self.skipped.discard(volumeId)
+        self._flush_if_full()
+
+    def skip_case(self, volumeId):
+        """
+        Mark a case without rows as done, so that it is not processed again when resuming.
+        In append mode, rows of the case in the existing file are removed.
+        """
+        if volumeId not in self.skipped:
+            self.skipped.add(volumeId)
+            self._checkpointChanged = True
+            self._pendingSkips += 1
+            self._flush_if_full()
+
+    def _flush_if_full(self):
+        if len(self._buffer) + self._pendingSkips >= self.flushCases:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the buffered rows to the partial file in one write, sync it, then atomically replace the checkpoint.
+        """
+        if not self._buffer and not self._checkpointChanged:
+            return
+        if self._buffer:
+            with open(self.partialPath, 'r+b') as f:
+                f.seek(self.partialSize)
+                f.write(b''.join(data for _, data in self._buffer))
+                f.flush()
+                os.fsync(f.fileno())
+            for volumeId, data in self._buffer:
+                self.cases.pop(volumeId, None)
+                self.cases[volumeId] = (self.partialSize, len(data))
+                self.partialSize += len(data)
+            self._buffer = []
+
+        manifest = {
+            'version': CHECKPOINT_VERSION,
+            'header': self.header,
+            'appendMode': self.appendMode,
+            'partialSize': self.partialSize,
+            'cases': [[volumeId, offset, length] for volumeId, (offset, length) in self.cases.items()],
+            'skipped': sorted(self.skipped),
+        }
+        tempPath = self.manifestPath + '.tmp'
+        with open(tempPath, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tempPath, self.manifestPath)
+        self._checkpointChanged = False
+        self._pendingSkips = 0
+
+    def close(self):
+        """
+        Write a last checkpoint without finishing, so that the export can be resumed.
+        """
+        self.flush()
+
+    def iter_cases(self):
+        """
+        Iterate over (volumeId, rows) of the written cases, one case at a time.
+        """
+        self.flush()
+        with open(self.partialPath, 'rb') as partialFile:
+            for volumeId in self.cases:
+                yield volumeId, self._read_case(partialFile, volumeId)
+
+    def _read_case(self, partialFile, volumeId):
+        offset, length = self.cases[volumeId]
+        partialFile.seek(offset)
+        return list(csv.reader(io.StringIO(partialFile.read(length).decode('utf-8'), newline='')))
+
+    def finish(self, caseOrder=None, onKeptCase=None):
+        """
+        Write the output file: in append mode the rows of the existing file are kept, except for the cases
+        written by this export, which are replaced in place, and the cases it skipped, which are removed;
+        new cases follow in caseOrder (volume IDs), then in write order. The file is written to a temporary file first and then replaces the original.
+        If onKeptCase is given, it is called with (volumeId, rows) of each case kept from the existing file.
+        The partial file and the checkpoint are removed.
+        """
+        self.flush()
+        tempPath = self.outputPath + '.tmp'
+        writtenIds = set()
+        with open(tempPath, 'w', newline='', encoding='utf-8-sig') as csvfile, open(self.partialPath, 'rb') as partialFile:
+            writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+            if self.appendMode and os.path.exists(self.outputPath):
+                with open(self.outputPath, 'r', newline='', encoding='utf-8-sig') as existingFile:
+                    header = next(csv.reader(existingFile), None)
+                    writer.writerow(header or self.header)
+                    for volumeId, rows in iter_csv_groups(existingFile):
+                        if volumeId in self.cases:
+                            if volumeId not in writtenIds:
+                                writer.writerows(self._read_case(partialFile, volumeId))
+                                writtenIds.add(volumeId)
+                        elif volumeId in self.skipped:
+                            # Processed again and now without rows
+                            continue
+                        else:
+                            writer.writerows(rows)
+                            if onKeptCase is not None and volumeId is not None:
+                                onKeptCase(volumeId, rows)
+            else:
+                writer.writerow(self.header)
+            orderedIds = [volumeId for volumeId in (caseOrder or []) if volumeId in self.cases]
+            for volumeId in orderedIds + list(self.cases):
+                if volumeId not in writtenIds:
+                    writer.writerows(self._read_case(partialFile, volumeId))
+                    writtenIds.add(volumeId)
+        os.replace(tempPath, self.outputPath)
+        self.discard()
+
+    def discard(self):
+        """
+        Remove the partial file and the checkpoint.
+        """
+        self._buffer = []
+        for path in (self.partialPath, self.manifestPath, self.manifestPath + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
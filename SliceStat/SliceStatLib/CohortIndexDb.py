@@ -0,0 +1,206 @@
+"""
+Persistent SQLite index of exported results for cohort queries.
+
+The index stores the case ID, segment name, slice count and slice intervals of every exported segment,
+with indexes for lookups by segment, by slice and by slice count range, so cohort queries such as
+"which cases have Liver on slice 120" or "which cases have more than 50 Tumor slices" do not need
+the volumes or the CSV file. Only the standard library sqlite3 module is required.
+"""
+import csv
+import os
+import sqlite3
+
+from .CsvExport import FRAME_COLUMNS, iter_csv_groups, segment_results_from_rows
+from .Intervals import SliceIntervals
+
+INDEX_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    segmentKey INTEGER PRIMARY KEY,
+    caseId TEXT NOT NULL,
+    segmentName TEXT NOT NULL,
+    sliceCount INTEGER NOT NULL,
+    firstSlice INTEGER,
+    lastSlice INTEGER,
+    UNIQUE (caseId, segmentName)
+);
+CREATE INDEX IF NOT EXISTS segmentsByName ON segments (segmentName, sliceCount);
+CREATE TABLE IF NOT EXISTS intervals (
+    segmentKey INTEGER NOT NULL REFERENCES segments (segmentKey) ON DELETE CASCADE,
+    start INTEGER NOT NULL,
+    stop INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS intervalsBySegment ON intervals (segmentKey, start);
+CREATE INDEX IF NOT EXISTS intervalsBySlice ON intervals (start, stop);
+"""
+
+
+def index_path(outputPath):
+    """
+    Get the path of the cohort index of an output CSV file, e.g. output.csv -> output_index.sqlite.
+    """
+    basePath, extension = os.path.splitext(outputPath)
+    if extension.lower() != '.csv':
+        basePath = outputPath
+    return basePath + '_index.sqlite'
+
+
+class CohortIndex:
+    """
+    SQLite index of {caseId: {segmentName: slice indices or SliceIntervals}} results.
+    Can be used as a context manager; changes are committed per update.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, INDEX_VERSION):
+            raise ValueError(f"Cohort index {path} has unsupported version {version}.")
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+            self.connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM intervals")
+            self.connection.execute("DELETE FROM segments")
+
+    def update(self, allResults):
+        """
+        Add or replace the segments of cases, allResults is {caseId: {segmentName: sliceNumbers}} or an iterable
+        of (caseId, segmentResults). Segments of a case that are not in its new results are removed.
+        """
+        items = allResults.items() if isinstance(allResults, dict) else allResults
+        with self.connection:
+            for caseId, segmentResults in items:
+                self._remove_case(caseId)
+                for segmentName, sliceNumbers in segmentResults.items():
+                    intervals = sliceNumbers if isinstance(sliceNumbers, SliceIntervals) else SliceIntervals.from_indices(sliceNumbers or [])
+                    firstSlice = int(intervals.starts[0]) if len(intervals.starts) else None
+                    lastSlice = int(intervals.stops[-1]) - 1 if len(intervals.stops) else None
+                    cursor = self.connection.execute(
+                        "INSERT INTO segments (caseId, segmentName, sliceCount, firstSlice, lastSlice) VALUES (?, ?, ?, ?, ?)",
+                        (caseId, segmentName, intervals.count, firstSlice, lastSlice))
+                    self.connection.executemany(
+                        "INSERT INTO intervals (segmentKey, start, stop) VALUES (?, ?, ?)",
+                        [(cursor.lastrowid, start, stop) for start, stop in zip(intervals.starts.tolist(), intervals.stops.tolist())])
+
+    def remove_case(self, caseId):
+        with self.connection:
+            self._remove_case(caseId)
+
+    def _remove_case(self, caseId):
+        self.connection.execute("DELETE FROM segments WHERE caseId = ?", (caseId,))
+
+    def case_ids(self):
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT caseId FROM segments ORDER BY caseId")]
+
+    def segment_names(self):
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT segmentName FROM segments ORDER BY segmentName")]
+
+    def query(self, segmentName=None, sliceIndex=None, minimumCount=None, maximumCount=None):
+        """
+        Get the (caseId, segmentName, sliceCount) of the segments that match all given conditions:
+        segment name, presence on slice sliceIndex, and slice count in [minimumCount, maximumCount].
+        """
+        conditions = []
+        parameters = []
+        if segmentName is not None:
+            conditions.append("segments.segmentName = ?")
+            parameters.append(segmentName)
+        if minimumCount is not None:
+            conditions.append("segments.sliceCount >= ?")
+            parameters.append(minimumCount)
+        if maximumCount is not None:
+            conditions.append("segments.sliceCount <= ?")
+            parameters.append(maximumCount)
+        if sliceIndex is None:
+            sql = "SELECT caseId, segmentName, sliceCount FROM segments"
+        else:
+            # Driven by the intervals containing the slice (intervalsBySlice), CROSS JOIN keeps intervals as
+            # the outer table. The intervals of a segment do not overlap, so each segment is joined at most once
+            sql = ("SELECT caseId, segmentName, sliceCount FROM intervals "
+                   "CROSS JOIN segments ON segments.segmentKey = intervals.segmentKey")
+            conditions.insert(0, "intervals.start <= ? AND intervals.stop > ?")
+            parameters[:0] = [sliceIndex, sliceIndex]
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY caseId, segmentName"
+        return [tuple(row) for row in self.connection.execute(sql, parameters)]
+
+    def cases_with_segment(self, segmentName, sliceIndex=None, minimumCount=1, maximumCount=None):
+        """
+        Get the IDs of cases that have a non-empty segment (present on sliceIndex if given,
+        with a slice count in [minimumCount, maximumCount]).
+        """
+        return sorted({caseId for caseId, _, _ in self.query(segmentName, sliceIndex, minimumCount, maximumCount)})
+
+    def segment_intervals(self, caseId, segmentName):
+        """
+        Get the SliceIntervals of a segment of a case, or None if it is not in the index.
+        """
+        row = self.connection.execute("SELECT segmentKey FROM segments WHERE caseId = ? AND segmentName = ?",
+                                      (caseId, segmentName)).fetchone()
+        if row is None:
+            return None
+        intervals = self.connection.execute("SELECT start, stop FROM intervals WHERE segmentKey = ? ORDER BY start",
+                                            (row[0],)).fetchall()
+        return SliceIntervals([start for start, _ in intervals], [stop for _, stop in intervals])
+
+    def update_from_csv(self, csvPath):
+        """
+        Add or replace the cases of an output CSV file, reading it one case at a time.
+        Sequence results (with frame columns) cannot be indexed.
+        """
+        with open(csvPath, 'r', newline='', encoding='utf-8-sig') as csvfile:
+            header = next(csv.reader(csvfile), None)
+            if header and all(column in header for column in FRAME_COLUMNS):
+                raise ValueError(f"Output file {csvPath} has sequence frame columns, it cannot be indexed.")
+            self.update((caseId, segment_results_from_rows(rows))
+                        for caseId, rows in iter_csv_groups(csvfile) if caseId is not None)
+
+
+def write_index(caseResults, outputPath, appendMode=False, removedIds=()):
+    """
+    Add case results ({caseId: segmentResults} or (caseId, segmentResults) pairs) to the cohort index of an output
+    CSV file. Without append mode the index is cleared first; in append mode an index that does not exist yet is
+    built from the existing output file, and the cases in removedIds are removed from it.
+    Raises IOError if the index cannot be written.
+    """
+    path = index_path(outputPath)
+    try:
+        if appendMode and not os.path.exists(path) and os.path.exists(outputPath):
+            build_index(outputPath, path)
+        with CohortIndex(path) as cohortIndex:
+            if not appendMode:
+                cohortIndex.clear()
+            for caseId in removedIds:
+                cohortIndex.remove_case(caseId)
+            cohortIndex.update(caseResults)
+    except (sqlite3.Error, ValueError) as e:
+        raise IOError(f"Could not write to file {path}: {e}")
+
+
+def build_index(csvPath, path=None):
+    """
+    Build the cohort index of an output CSV file from scratch and return its path.
+    """
+    path = path or index_path(csvPath)
+    with CohortIndex(path) as cohortIndex:
+        cohortIndex.clear()
+        cohortIndex.update_from_csv(csvPath)
+    return path
@@ -0,0 +1,261 @@
+"""
+Columnar binary export of slice statistics results (Parquet, Feather, NPZ).
+
+Unlike the CSV format, every row has its ID, and slice numbers are stored as native integers:
+a list<int32> column in Parquet/Feather, a flat SliceNumbers array with SliceOffsets in NPZ
+(slices of row i are SliceNumbers[SliceOffsets[i]:SliceOffsets[i + 1]]).
+Parquet and Feather require pyarrow, NPZ only requires numpy.
+Parquet and Feather files are written chunk by chunk; an NPZ file stores each column as a single array,
+so it cannot be written incrementally and its rows are held in memory until the file is closed.
+"""
+import itertools
+import os
+
+import numpy as np
+
+from .Intervals import SliceIntervals
+
+# Format name: file extension
+COLUMNAR_FORMATS = {
+    'parquet': '.parquet',
+    'feather': '.feather',
+    'npz': '.npz',
+}
+
+# Number of volumes per written chunk (Parquet row group, Feather record batch)
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def columnar_path(outputPath, columnarFormat):
+    """
+    Get the path of the columnar file written next to a CSV output file, e.g. output.csv -> output.parquet.
+    """
+    basePath, extension = os.path.splitext(outputPath)
+    if extension.lower() != '.csv':
+        basePath = outputPath
+    return basePath + COLUMNAR_FORMATS[columnarFormat]
+
+
+def columnar_format(path):
+    """
+    Get the columnar format of a file from its extension.
+    """
+    for columnarFormat, extension in COLUMNAR_FORMATS.items():
+        if path.lower().endswith(extension):
+            return columnarFormat
+    raise ValueError(f"Unknown columnar file format: {path}")
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet and Feather export require pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def _arrow_schema(pa):
+    return pa.schema([
+        ('ID', pa.string()),
+        ('SegmentName', pa.string()),
+        ('SliceCount', pa.int32()),
+        ('SliceNumbers', pa.list_(pa.int32())),
+    ])
+
+
+def result_columns(allResults):
+    """
+    Convert {volumeId: {segmentName: slice numbers}} to columns:
+    ID, SegmentName (str arrays), SliceCount (int32), SliceOffsets (int64, one more than rows), SliceNumbers (int32).
+    """
+    ids = []
+    segmentNames = []
+    sliceArrays = []
+    for volumeId, segmentResults in allResults.items():
+        for segmentName, sliceNumbers in segmentResults.items():
+            ids.append(str(volumeId))
+            segmentNames.append(str(segmentName))
+            if isinstance(sliceNumbers, SliceIntervals):
+                sliceArrays.append(sliceNumbers.to_array())
+            else:
+                sliceArrays.append(np.asarray(sliceNumbers if sliceNumbers else [], dtype=np.int64))
+    sliceCounts = np.array([sliceArray.size for sliceArray in sliceArrays], dtype=np.int32)
+    return {
+        'ID': np.array(ids, dtype=str),
+        'SegmentName': np.array(segmentNames, dtype=str),
+        'SliceCount': sliceCounts,
+        'SliceOffsets': np.concatenate(([0], np.cumsum(sliceCounts, dtype=np.int64))),
+        'SliceNumbers': np.concatenate(sliceArrays).astype(np.int32) if sliceArrays else np.zeros(0, dtype=np.int32),
+    }
+
+
+def _select_columns(columns, rowMask):
+    """
+    Get the rows of columns where rowMask is set.
+    """
+    counts = columns['SliceCount'][rowMask]
+    offsets = columns['SliceOffsets']
+    sliceMask = np.repeat(rowMask, np.diff(offsets))
+    return {
+        'ID': columns['ID'][rowMask],
+        'SegmentName': columns['SegmentName'][rowMask],
+        'SliceCount': counts,
+        'SliceOffsets': np.concatenate(([0], np.cumsum(counts, dtype=np.int64))),
+        'SliceNumbers': columns['SliceNumbers'][sliceMask],
+    }
+
+
+class ColumnarWriter:
+    """
+    Write result chunks to a Parquet, Feather or NPZ file.
+    Each write() call adds one chunk (Parquet row group or Feather record batch), so large cohorts can be
+    written without holding all rows in memory. NPZ cannot be written incrementally: its chunks are kept in memory,
+    as compact column arrays, until close() concatenates them; use Parquet or Feather for very large cohorts.
+    """
+
+    def __init__(self, path, columnarFormat=None):
+        self.path = path
+        self.columnarFormat = columnarFormat or columnar_format(path)
+        if self.columnarFormat not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unknown columnar file format: {self.columnarFormat}")
+        self._writer = None
+        self._chunks = []
+        if self.columnarFormat != 'npz':
+            self._pa = _import_pyarrow()
+            self._schema = _arrow_schema(self._pa)
+            if self.columnarFormat == 'parquet':
+                self._writer = self._pa.parquet.ParquetWriter(path, self._schema)
+            else:
+                self._writer = self._pa.ipc.new_file(path, self._schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def write(self, allResults):
+        """
+        Write the results of some volumes ({volumeId: {segmentName: slice numbers}}) as one chunk.
+        """
+        self.write_columns(result_columns(allResults))
+
+    def write_columns(self, columns):
+        """
+        Write one chunk given as columns (see result_columns).
+        """
+        if len(columns['ID']) == 0:
+            return
+        if self._writer is None:
+            self._chunks.append(columns)
+            return
+        pa = self._pa
+        sliceNumbers = pa.ListArray.from_arrays(
+            pa.array(columns['SliceOffsets'].astype(np.int32)),
+            pa.array(columns['SliceNumbers'], type=pa.int32()))
+        table = pa.Table.from_arrays([
+            pa.array(columns['ID'].tolist(), type=pa.string()),
+            pa.array(columns['SegmentName'].tolist(), type=pa.string()),
+            pa.array(columns['SliceCount'], type=pa.int32()),
+            sliceNumbers,
+        ], schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif self.columnarFormat == 'npz' and self._chunks is not None:
+            columns = _concatenate_columns(self._chunks)
+            # np.savez adds .npz to paths without that extension, write through a file object instead
+            with open(self.path, 'wb') as f:
+                np.savez(f, **columns)
+            self._chunks = None
+
+
+def _concatenate_columns(chunks):
+    if not chunks:
+        return result_columns({})
+    counts = np.concatenate([chunk['SliceCount'] for chunk in chunks])
+    return {
+        'ID': np.concatenate([chunk['ID'] for chunk in chunks]),
+        'SegmentName': np.concatenate([chunk['SegmentName'] for chunk in chunks]),
+        'SliceCount': counts,
+        'SliceOffsets': np.concatenate(([0], np.cumsum(counts, dtype=np.int64))),
+        'SliceNumbers': np.concatenate([chunk['SliceNumbers'] for chunk in chunks]),
+    }
+
+
+def iter_columnar_chunks(path):
+    """
+    Read a columnar file chunk by chunk (Parquet row group, Feather record batch, whole NPZ file).
+    Yields columns (see result_columns).
+    """
+    columnarFormat = columnar_format(path)
+    if columnarFormat == 'npz':
+        with np.load(path, allow_pickle=False) as data:
+            yield {name: data[name] for name in data.files}
+        return
+
+    pa = _import_pyarrow()
+    if columnarFormat == 'parquet':
+        parquetFile = pa.parquet.ParquetFile(path)
+        batches = (parquetFile.read_row_group(index) for index in range(parquetFile.num_row_groups))
+    else:
+        reader = pa.ipc.open_file(path)
+        batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+    for batch in batches:
+        counts = np.asarray(batch.column('SliceCount'), dtype=np.int32)
+        sliceNumbers = batch.column('SliceNumbers')
+        if isinstance(sliceNumbers, pa.ChunkedArray):
+            sliceNumbers = sliceNumbers.combine_chunks()
+        yield {
+            'ID': np.array(batch.column('ID').to_pylist(), dtype=str),
+            'SegmentName': np.array(batch.column('SegmentName').to_pylist(), dtype=str),
+            'SliceCount': counts,
+            'SliceOffsets': np.concatenate(([0], np.cumsum(counts, dtype=np.int64))),
+            'SliceNumbers': np.asarray(sliceNumbers.flatten(), dtype=np.int32),
+        }
+
+
+def read_columnar(path):
+    """
+    Read all rows of a columnar file. Returns columns (see result_columns).
+    """
+    return _concatenate_columns(list(iter_columnar_chunks(path)))
+
+
+def write_columnar(allResults, outputPath, appendMode=False, columnarFormat=None, chunkSize=DEFAULT_CHUNK_SIZE,
+                   updatedIds=None):
+    """
+    Write all volume results to a Parquet, Feather or NPZ file, chunkSize volumes per chunk.
+    allResults is {volumeId: {segmentName: slice numbers}} or an iterable of (volumeId, segmentResults),
+    which is consumed one chunk at a time.
+    In append mode, rows of the existing file are kept chunk by chunk, except for volumes that are
+    in updatedIds (the volumes of allResults by default), which are replaced (like the CSV writers).
+    The file is written to a temporary file first and then replaces the original.
+    """
+    columnarFormat = columnarFormat or columnar_format(outputPath)
+    if isinstance(allResults, dict):
+        updatedIds = list(allResults) if updatedIds is None else updatedIds
+        allResults = allResults.items()
+    elif appendMode and updatedIds is None:
+        raise ValueError("The IDs of the updated volumes are required to append results given as an iterable.")
+    tempPath = outputPath + '.tmp'
+    try:
+        with ColumnarWriter(tempPath, columnarFormat) as writer:
+            if appendMode and os.path.exists(outputPath):
+                updatedIds = np.array([str(volumeId) for volumeId in updatedIds], dtype=str)
+                for columns in iter_columnar_chunks(outputPath):
+                    writer.write_columns(_select_columns(columns, ~np.isin(columns['ID'], updatedIds)))
+            items = iter(allResults)
+            while True:
+                chunk = dict(itertools.islice(items, max(chunkSize, 1)))
+                if not chunk:
+                    break
+                writer.write(chunk)
+        os.replace(tempPath, outputPath)
+    finally:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
@@ -0,0 +1,71 @@
+"""
+Slicer-free compute core: slice presence on arrays and files, interval encoding, and the CSV and columnar writers.
+
+Importing this module only imports numpy and the few standard library modules the core needs (no Slicer, VTK, Qt,
+sqlite3 or process pools), so it is cheap to import in worker processes and headless tests. The Slicer module
+logic gets the voxel arrays of the scene and passes them to these functions.
+"""
+from .Columnar import COLUMNAR_FORMATS, columnar_path, read_columnar, write_columnar
+from .CsvExport import CSV_HEADER, csv_header, segment_results_from_rows, segment_rows, write_csv, write_csv_all
+from .FileIO import NiftiHeader, SegmentationFile
+from .Intervals import SliceIntervals, format_intervals, slice_result
+from .Presence import (axis_label_counts, integer_index_offset, place_slice_counts, reference_slice_label_counts,
+                       slice_label_counts, slice_presence)
+from .Streaming import DEFAULT_MEMORY_BUDGET, segmentation_slice_indices
+
+__all__ = [
+    'COLUMNAR_FORMATS', 'columnar_path', 'read_columnar', 'write_columnar',
+    'CSV_HEADER', 'csv_header', 'segment_results_from_rows', 'segment_rows', 'write_csv', 'write_csv_all',
+    'NiftiHeader', 'SegmentationFile',
+    'SliceIntervals', 'format_intervals', 'slice_result',
+    'axis_label_counts', 'integer_index_offset', 'place_slice_counts', 'reference_slice_label_counts',
+    'slice_label_counts', 'slice_presence',
+    'DEFAULT_MEMORY_BUDGET', 'segmentation_slice_indices',
+    'label_slice_results', 'process_case', 'case_on_reference_grid', 'process_loaded_case',
+]
+
+
+def label_slice_results(labelCounts, asIntervals=False):
+    """
+    Get the slice result (see slice_result) of each label of a per-slice label histogram of shape (K, labels + 1),
+    as a list in label order (label 1 first, background is skipped).
+    """
+    presence = labelCounts[:, 1:] > 0
+    return [slice_result(presence[:, column], asIntervals) for column in range(presence.shape[1])]
+
+
+def process_case(volumePath, segmentationPath, memoryBudget=DEFAULT_MEMORY_BUDGET):
+    """
+    Compute the slice indices of every segment of a .seg.nrrd file in the K index space of a volume file.
+    The segmentation is streamed, holding at most memoryBudget bytes of voxels at a time.
+    Returns {segmentName: [slice indices]} in segment order.
+    """
+    return process_loaded_case(NiftiHeader(volumePath), SegmentationFile(segmentationPath), memoryBudget)
+
+
+def case_on_reference_grid(volumePath, segmentationPath, referenceIjkToRas, referenceDimensions):
+    """
+    Check whether process_case of the files gives the same slices as extracting the segmentation in the reference
+    geometry: the volume file has the reference geometry and the segmentation grid is the reference grid shifted
+    by whole voxels, so no voxel is resampled. Only file headers are read.
+    """
+    volumeHeader = NiftiHeader(volumePath)
+    if list(volumeHeader.dimensions) != [int(size) for size in referenceDimensions]:
+        return False
+    if integer_index_offset(volumeHeader.ijk_to_ras(), referenceIjkToRas) != (0, 0, 0):
+        return False
+    return integer_index_offset(SegmentationFile(segmentationPath).ijk_to_ras(), referenceIjkToRas) is not None
+
+
+def process_loaded_case(volumeHeader, segmentationFile, memoryBudget=DEFAULT_MEMORY_BUDGET):
+    """
+    Compute the slice indices of every segment of an opened segmentation file in the K index space of a volume header,
+    see process_case.
+    """
+    sliceIndicesBySegment = segmentation_slice_indices(
+        segmentationFile, volumeHeader.ijk_to_ras(), volumeHeader.dimensions, memoryBudget)
+
+    segmentResults = {}
+    for segment in segmentationFile.segments:
+        segmentResults[segment.name] = sliceIndicesBySegment[segment.segmentId]
+    return segmentResults
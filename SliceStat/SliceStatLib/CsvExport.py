@@ -0,0 +1,173 @@
+"""
+CSV writers for slice statistics results.
+"""
+import csv
+import os
+
+from .Intervals import format_intervals
+
+CSV_HEADER = ['ID', 'SegmentName', 'SliceNumbers', 'SliceCount']
+INTERVALS_COLUMN = 'SliceIntervals'
+# Frame number and index value (e.g. time) of sequence frames
+FRAME_COLUMNS = ['Frame', 'FrameValue']
+
+
+def csv_header(intervalColumn=False, frameColumns=False):
+    """
+    Get the CSV header, optionally with the slice intervals column (e.g. "12-87,90-95")
+    and the frame columns of sequences.
+    """
+    header = CSV_HEADER + [INTERVALS_COLUMN] if intervalColumn else list(CSV_HEADER)
+    if frameColumns:
+        header += FRAME_COLUMNS
+    return header
+
+
+def segment_rows(volumeId, segmentResults, intervalColumn=False):
+    """
+    Get the CSV rows of one volume.
+    ID column: only first row has value (volume name), other rows are empty but keep comma
+    Slice numbers can be lists of slice indices or SliceIntervals.
+    """
+    rows = []
+    first_segment = True
+    for segmentName, sliceNumbers in segmentResults.items():
+        if first_segment:
+            # First row of volume: use volume name as ID
+            segmentId = volumeId
+            # Add tab prefix to prevent Excel SYLK format detection
+            if segmentId and not segmentId.startswith('\t'):
+                segmentId = '\t' + str(segmentId)
+            first_segment = False
+        else:
+            # Other rows of same volume: empty ID but keep comma
+            segmentId = ""
+
+        sliceNumbersStr = ",".join(map(str, sliceNumbers)) if sliceNumbers else ""
+        sliceCount = len(sliceNumbers) if sliceNumbers else 0
+        row = [segmentId, segmentName, sliceNumbersStr, sliceCount]
+        if intervalColumn:
+            row.append(format_intervals(sliceNumbers))
+        rows.append(row)
+    return rows
+
+
+def iter_csv_groups(csvFile):
+    """
+    Iterate over the [volumeId, rows] groups of the data rows of a CSV file object (header already read).
+    A group starts at each row with an ID; rows before the first ID are in a group with volumeId None.
+    """
+    group = None
+    for row in csv.reader(csvFile):
+        if not row:
+            continue
+        volumeId = row[0].lstrip('\t')
+        if volumeId or group is None:
+            if group is not None:
+                yield group
+            group = [volumeId or None, []]
+        group[1].append(row)
+    if group is not None:
+        yield group
+
+
+def read_csv_header(outputPath):
+    """
+    Read the header row of an existing output CSV file, None if the file is empty.
+    """
+    with open(outputPath, 'r', newline='', encoding='utf-8-sig') as csvfile:
+        return next(csv.reader(csvfile), None)
+
+
+def frame_rows(volumeId, frameResults, intervalColumn=False):
+    """
+    Get the CSV rows of the frames of a sequence, frameResults is a list of (frameIndex, frameValue, segmentResults).
+    All frames are in one group: only the first row has the ID, every row has the frame columns.
+    """
+    rows = []
+    for frameIndex, frameValue, segmentResults in frameResults:
+        for row in segment_rows(volumeId if not rows else "", segmentResults, intervalColumn):
+            rows.append(row + [frameIndex, frameValue])
+    return rows
+
+
+def read_csv_groups(outputPath):
+    """
+    Read an existing output CSV file.
+    Returns (header, groups) where groups is a list of [volumeId, rows] in file order.
+    Rows before the first ID are kept in a group with volumeId None.
+    """
+    with open(outputPath, 'r', newline='', encoding='utf-8-sig') as csvfile:
+        header = next(csv.reader(csvfile), None)
+        groups = list(iter_csv_groups(csvfile))
+    return header, groups
+
+
+def segment_results_from_rows(rows):
+    """
+    Get the {segmentName: sliceNumbers} of the CSV rows of one volume (inverse of segment_rows).
+    """
+    return {row[1]: [int(sliceNumber) for sliceNumber in row[2].split(',') if sliceNumber] for row in rows}
+
+
+def write_csv_all(allResults, outputPath, appendMode=False, intervalColumn=False):
+    """
+    Write all volume results to CSV file for Multi Sample mode
+    ID column: only first row of each volume group has value (volume name), other rows are empty but keep comma
+    In append mode, volumes that are already in the file are updated in place instead of being added again,
+    and the columns of the existing file are kept.
+    """
+    file_exists = os.path.exists(outputPath) and appendMode
+
+    header = None
+    if file_exists:
+        header, groups = read_csv_groups(outputPath)
+        if header:
+            intervalColumn = INTERVALS_COLUMN in header
+        if any(volumeId in allResults for volumeId, _ in groups):
+            _update_csv_groups(outputPath, header, groups, allResults, intervalColumn)
+            return
+
+    with open(outputPath, 'a' if appendMode else 'w', newline='', encoding='utf-8-sig') as csvfile:
+        writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+
+        # Write header if not appending or if file doesn't exist or is empty
+        if not header:
+            writer.writerow(csv_header(intervalColumn))
+
+        # Write data rows for each volume
+        for volumeId, segmentResults in allResults.items():
+            writer.writerows(segment_rows(volumeId, segmentResults, intervalColumn))
+
+
+def write_csv(segmentResults, outputPath, appendMode=False, sourceVolumeName=None, intervalColumn=False):
+    """
+    Write segment results to CSV file for Single Sample mode
+    ID column: only first row has value (source volume name, or first segment name if not set),
+    other rows are empty but keep comma
+    """
+    volumeId = sourceVolumeName if sourceVolumeName else next(iter(segmentResults), "")
+    write_csv_all({volumeId: segmentResults}, outputPath, appendMode, intervalColumn)
+
+
+def _update_csv_groups(outputPath, header, groups, allResults, intervalColumn=False):
+    """
+    Rewrite an output CSV file, replacing the rows of volumes in allResults and adding new volumes at the end.
+    The file is written to a temporary file first and then replaces the original.
+    """
+    writtenIds = set()
+    tempPath = outputPath + '.tmp'
+    with open(tempPath, 'w', newline='', encoding='utf-8-sig') as csvfile:
+        writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(header or csv_header(intervalColumn))
+        for volumeId, rows in groups:
+            if volumeId in allResults:
+                if volumeId not in writtenIds:
+                    writer.writerows(segment_rows(volumeId, allResults[volumeId], intervalColumn))
+                    writtenIds.add(volumeId)
+            else:
+                writer.writerows(rows)
+        for volumeId, segmentResults in allResults.items():
+            if volumeId not in writtenIds:
+                writer.writerows(segment_rows(volumeId, segmentResults, intervalColumn))
+    os.replace(tempPath, outputPath)
@@ -0,0 +1,164 @@
+"""
+Persistent on-disk cache of per-case slice statistics results.
+
+Entries are keyed by a hash of what determines the result: the segmentation content
+(or its file path, modification time and size), the reference geometry, the segment IDs,
+how the segmentation was extracted (in the Slicer scene or from the files) and the options that change it.
+Each entry is a small JSON file; when the total size exceeds the limit the least recently
+used entries are removed.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+# Increment when the computation changes, so that older entries are not used anymore
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# How results were extracted: resampled to the reference geometry in the Slicer scene,
+# or streamed from the files with nearest reference voxel mapping (SliceStatLib.Core.process_case)
+SCENE_EXTRACTION = 'scene'
+FILE_EXTRACTION = 'file'
+
+
+def file_key(path):
+    """
+    Get the cache key component of a file: absolute path, modification time and size.
+    """
+    stat = os.stat(path)
+    return ['file', os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+
+
+def geometry_key(dimensions, ijkToRas):
+    """
+    Get the cache key component of a reference geometry.
+    """
+    return [[int(size) for size in dimensions], np.round(np.asarray(ijkToRas, dtype=float), 6).tolist()]
+
+
+def content_key(segmentLabels, layers):
+    """
+    Get the cache key component of a segmentation that is not read from a file: a hash of the (segmentId, labelValue)
+    of its segments and of the (extent, imageToWorld, voxels) of its binary labelmap layers, voxels as an array or None.
+    """
+    digest = hashlib.sha256()
+    for segmentId, labelValue in segmentLabels:
+        digest.update(f"{segmentId}:{labelValue}".encode('utf-8'))
+    for extent, imageToWorld, voxels in layers:
+        digest.update(str(tuple(extent)).encode('utf-8'))
+        digest.update(np.asarray(imageToWorld, dtype=float).tobytes())
+        if voxels is not None:
+            digest.update(np.ascontiguousarray(voxels).tobytes())
+    return ['content', digest.hexdigest()]
+
+
+def make_key(segmentationKey, geometryKey, segmentKeys, extraction=SCENE_EXTRACTION, options=None):
+    """
+    Combine the key components into the hash used as entry name.
+    extraction is SCENE_EXTRACTION or FILE_EXTRACTION, options is a dict of the settings that change
+    the extracted slices (e.g. {'exactVoxelSlices': True}).
+    """
+    keyText = json.dumps([CACHE_VERSION, extraction, segmentationKey, geometryKey, segmentKeys, options or {}],
+                         sort_keys=True)
+    return hashlib.sha256(keyText.encode('utf-8')).hexdigest()
+
+
+def case_key(segmentationKey, dimensions, ijkToRas, segmentKeys, extraction=SCENE_EXTRACTION, options=None):
+    """
+    Get the entry name of a case from its segmentation key (file_key or content_key), the reference dimensions
+    and IJK to RAS matrix, and the [segmentId, segmentName] of its segments (see make_key).
+    """
+    return make_key(segmentationKey, geometry_key(dimensions, ijkToRas), segmentKeys, extraction, options)
+
+
+class ResultCache:
+    """
+    Directory of cached {segmentName: [slice indices]} results with a total size limit.
+    """
+
+    def __init__(self, directory, maxSize=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.maxSize = maxSize
+        os.makedirs(directory, exist_ok=True)
+        self.totalSize = sum(size for _, size, _ in self._entries())
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _entries(self):
+        entries = []
+        for fileName in os.listdir(self.directory):
+            if not fileName.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, fileName)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime_ns))
+        return entries
+
+    def get(self, key):
+        """
+        Get the cached results for a key, or None. Marks the entry as recently used.
+        """
+        if key is None:
+            return None
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return {segmentName: sliceNumbers for segmentName, sliceNumbers in entry['segments']}
+
+    def put(self, key, segmentResults):
+        """
+        Store the results for a key, then evict old entries if the cache is over its size limit.
+        """
+        if key is None:
+            return
+        path = self._entry_path(key)
+        tempPath = path + '.tmp'
+        try:
+            with open(tempPath, 'w', encoding='utf-8') as f:
+                json.dump({'segments': [[segmentName, list(sliceNumbers)] for segmentName, sliceNumbers in segmentResults.items()]}, f)
+            previousSize = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tempPath, path)
+            self.totalSize += os.path.getsize(path) - previousSize
+        except OSError as e:
+            logging.warning(f"Could not write result cache entry {path}: {e}")
+            return
+        if self.totalSize > self.maxSize:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache is within its size limit.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self.totalSize = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self.totalSize <= self.maxSize:
+                break
+            try:
+                os.remove(path)
+                self.totalSize -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        for path, _, _ in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.totalSize = 0
@@ -0,0 +1,412 @@
+"""
+Multi Sample export orchestration, shared by the Slicer module and the headless batch export.
+
+process_cases_steps runs the case loop: cases are served from the result cache, file-backed cases are sent to
+worker processes, and the other cases are computed by the caller (e.g. from the arrays of the Slicer scene).
+CohortExport writes the outcome of each case as soon as it is done: rows go to a checkpointed CSV file
+(and the slice statistics side table) and the cohort summary is updated; finish() then writes the output file,
+the columnar file, the summary table, the cohort index and the shard manifest.
+export_cases_steps combines both: it selects the cases of the shard that an interrupted export did not write,
+runs the case loop, writes each case and collects the warnings. The callers only compute the segment results of each case.
+"""
+import concurrent.futures
+import contextlib
+import logging
+import multiprocessing
+import os
+
+from .Aggregates import CohortAggregates, summary_path
+from .Checkpoint import CheckpointedCsvWriter, open_checkpointed_csv
+from .CohortIndexDb import write_index
+from .Columnar import columnar_path, write_columnar
+from .Core import case_on_reference_grid, process_case
+from .CsvExport import segment_results_from_rows, segment_rows
+from .Pipeline import ResultWriter
+from .Progress import ExportCancelled
+from .Sharding import check_shard, shard_of, shard_path, write_shard_manifest
+from .Statistics import STATISTICS_HEADER, statistics_path, statistics_rows
+from .Streaming import DEFAULT_MEMORY_BUDGET
+
+VOLUME_EXTENSIONS = ('.nii.gz', '.nii')
+SEGMENTATION_EXTENSIONS = ('.seg.nrrd',)
+
+
+def create_process_pool(numberOfWorkers):
+    """
+    Create a pool of worker processes for process_case.
+    Workers are spawned (not forked) so that it is safe to use from a GUI application.
+    """
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=numberOfWorkers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def file_backed_case_paths(volumePath, segmentationPath):
+    """
+    Get the (volumePath, segmentationPath) of a case if both files exist and can be read by process_case
+    (volume in .nii.gz/.nii, segmentation in .seg.nrrd), otherwise None.
+    """
+    for path, extensions in ((volumePath, VOLUME_EXTENSIONS), (segmentationPath, SEGMENTATION_EXTENSIONS)):
+        if not path or not path.lower().endswith(extensions) or not os.path.exists(path):
+            return None
+    return volumePath, segmentationPath
+
+
+def worker_case_paths(volumePath, segmentationPath, referenceIjkToRas, referenceDimensions):
+    """
+    Get the (volumePath, segmentationPath) of a file-backed case if process_case gives the same results as extracting
+    the segmentation in the reference geometry (see case_on_reference_grid), otherwise None.
+    """
+    casePaths = file_backed_case_paths(volumePath, segmentationPath)
+    if casePaths is None:
+        return None
+    try:
+        onReferenceGrid = case_on_reference_grid(*casePaths, referenceIjkToRas, referenceDimensions)
+    except Exception as e:
+        logging.debug(f"Could not read the headers of {casePaths}: {e}")
+        return None
+    return casePaths if onReferenceGrid else None
+
+
+def process_cases_steps(caseIds, computeCase, resultCache=None, cacheKeyOf=None, workerCasePathsOf=None,
+                        numberOfWorkers=1, onCaseDone=None, onCaseStarted=None, isCancelled=None, pollWorkers=False,
+                        stage=None, memoryBudget=DEFAULT_MEMORY_BUDGET, onComputePlanned=None):
+    """
+    Steps generator of the case loop of a cohort export. Returns the (segmentResults, errorMessage) of each case
+    in caseIds order; if cancelled, the outcomes of the cases that were not processed are None.
+    - computeCase(index) is a steps generator returning the segment results of a case, run in the calling thread.
+    - If a result cache is given, cacheKeyOf(index) gets the cache key of a case (None if it cannot be cached):
+      cached cases are not processed and new results are stored.
+    - If numberOfWorkers > 1, the cases for which workerCasePathsOf(index) gets (volumePath, segmentationPath)
+      are processed by process_case in a pool of worker processes while the other cases are computed. It must only
+      return paths for cases where process_case gives the same results as computeCase. Each worker holds at most
+      memoryBudget bytes of segmentation voxels at a time.
+    onComputePlanned(indices) is called with the indices of the cases that computeCase will compute, in order,
+    before the first one (e.g. to load them ahead). onCaseStarted(index, waiting) is called before computing a case
+    or waiting for its worker.
+    If onCaseDone is given, it is called with (index, outcome, extractionPath) as soon as each case is done
+    ('cache', 'worker' or None when computed); results are then handed over and not kept, the returned outcomes
+    are (None, errorMessage). isCancelled() stops the loop, and computeCase may raise ExportCancelled.
+    If pollWorkers is set, this yields while workers run instead of blocking. stage(name) gets a context manager
+    that records the time spent waiting for workers (e.g. ExportProfiler.stage).
+    """
+    isCancelled = isCancelled or (lambda: False)
+    stage = stage or (lambda name: contextlib.nullcontext())
+    outcomes = [None] * len(caseIds)
+    cacheKeys = [None] * len(caseIds)
+    futures = {}
+    executor = None
+
+    def caseDone(index, outcome, extractionPath=None):
+        if resultCache is not None and extractionPath != 'cache' and outcome[1] is None and cacheKeys[index] is not None:
+            resultCache.put(cacheKeys[index], outcome[0])
+        if onCaseDone is not None:
+            onCaseDone(index, outcome, extractionPath)
+            outcome = (None, outcome[1])
+        outcomes[index] = outcome
+
+    if resultCache is not None:
+        for index, caseId in enumerate(caseIds):
+            try:
+                cacheKeys[index] = cacheKeyOf(index)
+            except Exception as e:
+                logging.warning(f"Could not compute cache key of volume {caseId}: {e}")
+                continue
+            cachedResults = resultCache.get(cacheKeys[index]) if cacheKeys[index] is not None else None
+            if cachedResults is not None:
+                caseDone(index, (cachedResults, None), 'cache')
+
+    try:
+        if numberOfWorkers > 1 and workerCasePathsOf is not None:
+            for index in range(len(caseIds)):
+                if outcomes[index] is not None:
+                    continue
+                casePaths = workerCasePathsOf(index)
+                if not casePaths:
+                    continue
+                if executor is None:
+                    executor = create_process_pool(numberOfWorkers)
+                futures[index] = executor.submit(process_case, *casePaths, memoryBudget)
+
+        if onComputePlanned is not None:
+            onComputePlanned([index for index in range(len(caseIds)) if outcomes[index] is None and index not in futures])
+        for index in range(len(caseIds)):
+            if outcomes[index] is not None or index in futures:
+                continue
+            if isCancelled():
+                break
+            if onCaseStarted is not None:
+                onCaseStarted(index, False)
+            try:
+                segmentResults = yield from computeCase(index)
+                outcome = (segmentResults, None)
+            except ExportCancelled:
+                break
+            except Exception as e:
+                outcome = (None, str(e))
+            caseDone(index, outcome)
+
+        for index, future in futures.items():
+            if isCancelled():
+                break
+            if onCaseStarted is not None:
+                onCaseStarted(index, True)
+            with stage('worker'):
+                if pollWorkers:
+                    while not future.done() and not isCancelled():
+                        yield
+                    if not future.done():
+                        break
+                try:
+                    outcome = (future.result(), None)
+                except Exception as e:
+                    outcome = (None, str(e))
+            caseDone(index, outcome, 'worker')
+    finally:
+        if executor is not None:
+            # Do not wait for running cases when cancelled
+            executor.shutdown(wait=not isCancelled(), cancel_futures=True)
+
+    return outcomes
+
+
+class CohortExport:
+    """
+    Writes the results of a Multi Sample export to an output CSV file and its side files, one case at a time.
+    Usage:
+        export = CohortExport(outputPath, ...)
+        caseIds = [caseId for caseId in export.shard_cases(caseIds) if caseId not in export.completed]
+        export.resume_cases()
+        for each case: warning = export.add_case(caseId, outcome)
+        export.close()
+        export.finish(caseOrder, assignedIds)
+    Rows are written with checkpoints (see CheckpointedCsvWriter): if the export fails, close() keeps a checkpoint
+    and a new export to the same output file with resume set skips the cases in completed.
+    If shardCount > 1, the output goes to the shard file of shard shardIndex (see SliceStatLib.Sharding)
+    and the columnar file, the cohort index and the summary table are left to the merge.
+    """
+
+    def __init__(self, outputPath, appendMode=False, intervalColumn=False, resume=True, statisticsTable=False,
+                 columnarFormat=None, cohortIndex=False, cohortSummary=False, shardIndex=0, shardCount=1):
+        self.shardIndex = shardIndex
+        self.shardCount = shardCount
+        self.sharded = shardCount > 1
+        if self.sharded:
+            check_shard(shardIndex, shardCount)
+            if appendMode or statisticsTable:
+                raise ValueError("Append mode and the slice statistics table are not supported for shards, "
+                                 "append when merging them instead.")
+            outputPath = shard_path(outputPath, shardIndex, shardCount)
+            columnarFormat = None
+            cohortIndex = False
+            cohortSummary = False
+        self.outputPath = outputPath
+        self.appendMode = appendMode
+        self.columnarFormat = columnarFormat
+        self.cohortIndex = cohortIndex
+        self.csvWriter, self.intervalColumn = open_checkpointed_csv(outputPath, appendMode, intervalColumn, resume)
+        self.statisticsWriter = None
+        if statisticsTable:
+            self.statisticsWriter = CheckpointedCsvWriter(statistics_path(outputPath), STATISTICS_HEADER, appendMode,
+                                                          resume=resume)
+        # Cohort summary, updated as each case is done
+        self.aggregates = CohortAggregates() if cohortSummary else None
+        # {caseId: errorMessage} of the cases that failed
+        self.failedCases = {}
+
+    @property
+    def completed(self):
+        """Case IDs that were done by an interrupted export (in every written table)."""
+        completedIds = self.csvWriter.completed
+        if self.statisticsWriter is not None:
+            completedIds &= self.statisticsWriter.completed
+        return completedIds
+
+    def shard_cases(self, caseIds):
+        """
+        Get the case IDs of the shard of this export, sorted for merging, or all of them if it is not sharded.
+        """
+        if not self.sharded:
+            return list(caseIds)
+        return sorted(caseId for caseId in caseIds if shard_of(caseId, self.shardCount) == self.shardIndex)
+
+    def resume_cases(self, onCase=None):
+        """
+        Read back the cases written by an interrupted export once: they are added to the cohort summary,
+        and onCase(caseId, segmentResults) is called for each of them if given.
+        """
+        if not self.csvWriter.cases or (self.aggregates is None and onCase is None):
+            return
+        for caseId, rows in self.csvWriter.iter_cases():
+            if self.aggregates is not None:
+                self.aggregates.add_rows(rows)
+            if onCase is not None:
+                onCase(caseId, segment_results_from_rows(rows))
+
+    def add_case(self, caseId, outcome, segmentStatistics=None):
+        """
+        Write the outcome (segmentResults, errorMessage) of a case, with its {segmentName: SliceStatistics}
+        if the statistics table is written. Returns None if rows were written, otherwise the warning of the case
+        (failed, or no segment with slices).
+        """
+        segmentResults, errorMessage = outcome
+        if errorMessage is not None:
+            self.failedCases[caseId] = errorMessage
+            logging.warning(f"Failed to process volume {caseId}: {errorMessage}")
+            return f"Failed to process volume '{caseId}': {errorMessage}"
+
+        if not any(sliceNumbers for sliceNumbers in segmentResults.values()):
+            if self.statisticsWriter is not None:
+                self.statisticsWriter.skip_case(caseId)
+            self.csvWriter.skip_case(caseId)
+            return f"Volume '{caseId}' has no matching segments"
+
+        self.csvWriter.add_case(caseId, segment_rows(caseId, segmentResults, self.intervalColumn))
+        if self.statisticsWriter is not None:
+            self.statisticsWriter.add_case(caseId, statistics_rows(caseId, segmentStatistics))
+        if self.aggregates is not None:
+            self.aggregates.add_case(segmentResults)
+        return None
+
+    def close(self):
+        """
+        Write a last checkpoint, so that the export can be resumed if it is not finished.
+        """
+        self.csvWriter.close()
+        if self.statisticsWriter is not None:
+            self.statisticsWriter.close()
+
+    @property
+    def has_output(self):
+        """Whether finish() writes the output file (otherwise there is nothing to write and it is left unchanged)."""
+        return bool(self.csvWriter.cases) or self.appendMode or self.sharded
+
+    def finish(self, caseOrder=None, assignedIds=None, complete=True, stage=None):
+        """
+        Write the output file with the cases in caseOrder first (see CheckpointedCsvWriter.finish), then the
+        columnar file, cohort index, summary and statistics tables that are enabled. A shard also gets its
+        manifest with assignedIds, the case IDs of the shard, if complete is set.
+        stage(name) gets a context manager that records the time of each file (e.g. ExportProfiler.stage).
+        If no case was written, the checkpoint is discarded and no file is written.
+        """
+        stage = stage or (lambda name: contextlib.nullcontext())
+        if not self.has_output:
+            self.discard()
+            return
+
+        if self.columnarFormat:
+            # Read back from the written rows one chunk at a time, so that resumed cases are included
+            columnarOutputPath = columnar_path(self.outputPath, self.columnarFormat)
+            with stage('columnar'):
+                try:
+                    write_columnar(((caseId, segment_results_from_rows(rows)) for caseId, rows in self.csvWriter.iter_cases()),
+                                   columnarOutputPath, self.appendMode, self.columnarFormat,
+                                   updatedIds=list(self.csvWriter.cases) + sorted(self.csvWriter.skipped))
+                except IOError as e:
+                    raise IOError(f"Could not write to file {columnarOutputPath}: {e}")
+        if self.cohortIndex:
+            # Before finishing, an index that does not exist yet is built from the previous output file
+            with stage('cohortIndex'):
+                write_index(((caseId, segment_results_from_rows(rows)) for caseId, rows in self.csvWriter.iter_cases()),
+                            self.outputPath, self.appendMode, self.csvWriter.skipped)
+        aggregates = self.aggregates
+        with stage('csv'):
+            try:
+                # Cases kept from the existing file in append mode are added to the summary while merging
+                self.csvWriter.finish(caseOrder, (lambda caseId, rows: aggregates.add_rows(rows)) if aggregates is not None else None)
+            except IOError as e:
+                raise IOError(f"Could not write to file {self.outputPath}: {e}")
+        if aggregates is not None:
+            summaryOutputPath = summary_path(self.outputPath)
+            with stage('summary'):
+                try:
+                    aggregates.write_csv(summaryOutputPath)
+                except IOError as e:
+                    raise IOError(f"Could not write to file {summaryOutputPath}: {e}")
+        if self.statisticsWriter is not None:
+            with stage('statistics'):
+                try:
+                    self.statisticsWriter.finish(caseOrder)
+                except IOError as e:
+                    raise IOError(f"Could not write to file {statistics_path(self.outputPath)}: {e}")
+        if self.sharded and complete:
+            # The manifest marks the shard as complete for merging
+            write_shard_manifest(self.outputPath, self.shardIndex, self.shardCount, self.csvWriter.header,
+                                 assignedIds or [], self.csvWriter.skipped, self.failedCases)
+
+    def discard(self):
+        """
+        Remove the checkpoints without writing anything.
+        """
+        self.csvWriter.discard()
+        if self.statisticsWriter is not None:
+            self.statisticsWriter.discard()
+
+
+def export_cases_steps(export, caseIds, computeCase, caseOrder=None, resultCache=None, cacheKeyOf=None,
+                       workerCasePathsOf=None, numberOfWorkers=1, memoryBudget=DEFAULT_MEMORY_BUDGET, statisticsOf=None,
+                       onCaseStarted=None, onCaseDone=None, onResumedCase=None, onComputePlanned=None, isCancelled=None,
+                       pollWorkers=False, stage=None, writeInBackground=False, onWriting=None):
+    """
+    Steps generator of a cohort export to a CohortExport. The cases of caseIds that belong to the shard of the export
+    and were not written by an interrupted export are processed by process_cases_steps and written as soon as each is done,
+    then export.finish() writes the output files with the cases in caseOrder (caseIds by default) first.
+    The callbacks get case IDs where process_cases_steps gives indices: computeCase(caseId), cacheKeyOf(caseId),
+    workerCasePathsOf(caseId), onCaseStarted(caseId, waiting) and onComputePlanned(caseIds).
+    - statisticsOf(caseId) gets the {segmentName: SliceStatistics} of a computed case if the statistics table is written.
+    - onCaseDone(caseId, outcome, extractionPath, written) is called after each case is written; written is False
+      if it failed or has no segment with slices.
+    - onResumedCase(caseId, segmentResults) is called for the cases read back from the checkpoint.
+    If writeInBackground is set, cases are written in a writer thread (see ResultWriter) while the next ones are processed.
+    onWriting() is called before the output files are written, unless there is nothing to write.
+    If the export is cancelled, the cases done so far are written. Returns the list of warnings.
+    """
+    isCancelled = isCancelled or (lambda: False)
+    warnings = []
+    caseIds = list(caseIds)
+    assignedIds = export.shard_cases(caseIds)
+    completedIds = export.completed
+    pendingIds = [caseId for caseId in assignedIds if caseId not in completedIds]
+    if len(pendingIds) < len(assignedIds):
+        warnings.append(f"Resumed an interrupted export: {len(assignedIds) - len(pendingIds)} volumes were already written")
+    caseWarnings = [None] * len(pendingIds)
+
+    # Cases resumed from the checkpoint are read back once for the cohort summary
+    export.resume_cases(onResumedCase)
+
+    def writeCase(index, outcome, extractionPath):
+        caseId = pendingIds[index]
+        segmentStatistics = statisticsOf(caseId) if statisticsOf is not None and outcome[1] is None else None
+        caseWarnings[index] = export.add_case(caseId, outcome, segmentStatistics)
+        if onCaseDone is not None:
+            onCaseDone(caseId, outcome, extractionPath, caseWarnings[index] is None)
+
+    with contextlib.ExitStack() as stack:
+        # Checkpoints are kept to resume from if processing fails, the writer is closed first
+        stack.callback(export.close)
+        if writeInBackground:
+            writer = stack.enter_context(ResultWriter(lambda index, item: writeCase(index, *item)))
+
+            def caseDone(index, outcome, extractionPath):
+                writer.submit(index, (outcome, extractionPath))
+        else:
+            caseDone = writeCase
+        outcomes = yield from process_cases_steps(
+            pendingIds, lambda index: computeCase(pendingIds[index]), resultCache,
+            cacheKeyOf and (lambda index: cacheKeyOf(pendingIds[index])),
+            workerCasePathsOf and (lambda index: workerCasePathsOf(pendingIds[index])),
+            numberOfWorkers, caseDone,
+            onCaseStarted and (lambda index, waiting: onCaseStarted(pendingIds[index], waiting)),
+            isCancelled, pollWorkers, stage, memoryBudget,
+            onComputePlanned and (lambda indices: onComputePlanned([pendingIds[index] for index in indices])))
+    warnings.extend(caseWarning for caseWarning in caseWarnings if caseWarning)
+
+    cancelled = isCancelled()
+    if cancelled:
+        numberOfProcessed = sum(1 for outcome in outcomes if outcome is not None)
+        warnings.insert(0, f"Export cancelled: {numberOfProcessed} of {len(outcomes)} volumes were processed, "
+                           f"their results were written")
+
+    if onWriting is not None and export.has_output:
+        onWriting()
+    export.finish(caseOrder if caseOrder is not None else caseIds, assignedIds, not cancelled, stage)
+    return warnings
@@ -0,0 +1,470 @@
+"""
+Minimal readers for NRRD (.seg.nrrd) and NIfTI (.nii, .nii.gz) files.
+Only the information needed for slice statistics is read: image geometry, segment metadata
+and labelmap voxels. Only numpy and the standard library are used, so files can be read
+without Slicer or a MRML scene.
+"""
+import bz2
+import gzip
+import io
+import os
+import struct
+
+import numpy as np
+
+NRRD_TYPES = {
+    'signed char': 'i1', 'int8': 'i1', 'int8_t': 'i1',
+    'uchar': 'u1', 'unsigned char': 'u1', 'uint8': 'u1', 'uint8_t': 'u1',
+    'short': 'i2', 'short int': 'i2', 'signed short': 'i2', 'signed short int': 'i2', 'int16': 'i2', 'int16_t': 'i2',
+    'ushort': 'u2', 'unsigned short': 'u2', 'unsigned short int': 'u2', 'uint16': 'u2', 'uint16_t': 'u2',
+    'int': 'i4', 'signed int': 'i4', 'int32': 'i4', 'int32_t': 'i4',
+    'uint': 'u4', 'unsigned int': 'u4', 'uint32': 'u4', 'uint32_t': 'u4',
+    'longlong': 'i8', 'long long': 'i8', 'long long int': 'i8', 'signed long long': 'i8',
+    'signed long long int': 'i8', 'int64': 'i8', 'int64_t': 'i8',
+    'ulonglong': 'u8', 'unsigned long long': 'u8', 'unsigned long long int': 'u8', 'uint64': 'u8', 'uint64_t': 'u8',
+    'float': 'f4', 'double': 'f8',
+}
+
+NIFTI_TYPES = {
+    2: 'u1', 4: 'i2', 8: 'i4', 16: 'f4', 64: 'f8',
+    256: 'i1', 512: 'u2', 768: 'u4', 1024: 'i8', 1280: 'u8',
+}
+
+
+def open_compressed(path):
+    """
+    Open a file for binary reading, transparently decompressing .gz files.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def read_exact(stream, buffer):
+    """
+    Fill a writable buffer from a (possibly compressed) stream.
+    """
+    view = memoryview(buffer).cast('B')
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            raise ValueError("Unexpected end of image data.")
+        filled += count
+
+
+def iter_array_slabs(stream, shape, dtype, memoryBudget):
+    """
+    Read an array with the given numpy shape from a stream, a slab of consecutive slices (first axis) at a time.
+    Yields (firstSlice, slab) in native byte order. At most memoryBudget bytes of voxels are held at once
+    (but always at least one slice). The slab buffer is reused, so slabs must be consumed before the next one is read.
+    The stream is closed when the iteration ends.
+    """
+    dtype = np.dtype(dtype)
+    numberOfSlices = shape[0]
+    sliceBytes = max(1, int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize)
+    slabSlices = max(1, min(numberOfSlices, int(memoryBudget) // sliceBytes))
+    with stream:
+        if numberOfSlices == 0:
+            return
+        buffer = np.empty((slabSlices,) + tuple(shape[1:]), dtype=dtype)
+        for firstSlice in range(0, numberOfSlices, slabSlices):
+            slab = buffer[:min(slabSlices, numberOfSlices - firstSlice)]
+            read_exact(stream, slab)
+            if not slab.dtype.isnative:
+                slab = slab.astype(slab.dtype.newbyteorder('='))
+            yield firstSlice, slab
+
+
+#
+# NRRD
+#
+
+class NrrdHeader:
+    """
+    Parsed NRRD header: standard fields, key/value pairs and the location of the image data.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fields = {}
+        self.keyValues = {}
+
+        with open(path, 'rb') as f:
+            magic = f.readline()
+            if not magic.startswith(b'NRRD'):
+                raise ValueError(f"Not a NRRD file: {path}")
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                line = line.decode('utf-8', errors='replace').rstrip('\r\n')
+                if not line:
+                    break
+                if line.startswith('#'):
+                    continue
+                keyValueSeparator = line.find(':=')
+                fieldSeparator = line.find(': ')
+                if keyValueSeparator >= 0 and (fieldSeparator < 0 or keyValueSeparator < fieldSeparator):
+                    self.keyValues[line[:keyValueSeparator]] = line[keyValueSeparator + 2:]
+                elif fieldSeparator >= 0:
+                    self.fields[line[:fieldSeparator].strip().lower()] = line[fieldSeparator + 2:].strip()
+            self.headerSize = f.tell()
+
+        self.sizes = [int(size) for size in self.fields['sizes'].split()]
+        typeName = self.fields['type'].lower()
+        if typeName not in NRRD_TYPES:
+            raise ValueError(f"Unsupported NRRD type '{typeName}' in {path}")
+        byteOrder = '>' if self.fields.get('endian', 'little').lower() == 'big' else '<'
+        self.dtype = np.dtype(NRRD_TYPES[typeName]).newbyteorder(byteOrder)
+        self.encoding = self.fields.get('encoding', 'raw').lower()
+        # Image data held in memory by preload(): bytes of the data file, or the decoded voxels
+        self.preloadedData = None
+        self.preloadedDecoded = False
+
+    @property
+    def shape(self):
+        """Shape of the image data as a numpy array (fastest axis last)."""
+        return tuple(reversed(self.sizes))
+
+    @property
+    def dataSize(self):
+        """Size of the decoded image data in bytes."""
+        return int(np.prod(self.sizes)) * self.dtype.itemsize
+
+    def preload(self, decode=True):
+        """
+        Read the image data into memory, so that open_data() does not access the file anymore.
+        If decode is set, compressed data is also decompressed and the voxels are held,
+        otherwise the bytes of the data file are held and decompressed when the data is read.
+        Returns the number of bytes held.
+        """
+        if decode:
+            with self.open_data() as stream:
+                data = stream.read(self.dataSize)
+            if len(data) < self.dataSize:
+                raise ValueError("Unexpected end of image data.")
+        else:
+            with open(self.dataPath, 'rb') as f:
+                data = f.read()
+        self.preloadedData = data
+        self.preloadedDecoded = decode
+        return len(data)
+
+    @property
+    def dataPath(self):
+        dataFile = self.fields.get('data file') or self.fields.get('datafile')
+        if not dataFile:
+            return self.path
+        if os.path.isabs(dataFile):
+            return dataFile
+        return os.path.join(os.path.dirname(self.path), dataFile)
+
+    def spatial_axes(self):
+        """
+        Get the indices of the axes that have a space direction (list axes, like segmentation layers, have none).
+        """
+        directions = self.fields.get('space directions')
+        if not directions:
+            return list(range(len(self.sizes)))[-3:]
+        return [axis for axis, direction in enumerate(directions.split()) if direction.lower() != 'none']
+
+    def ijk_to_ras(self):
+        """
+        Get the 4x4 IJK to RAS matrix of the spatial axes.
+        """
+        matrix = np.eye(4)
+        directions = self.fields.get('space directions')
+        if directions:
+            vectors = [_parse_vector(direction) for direction in directions.split() if direction.lower() != 'none']
+            for column, vector in enumerate(vectors[:3]):
+                matrix[:3, column] = vector
+        elif self.fields.get('spacings'):
+            spacings = [float(spacing) for spacing in self.fields['spacings'].split() if spacing.lower() != 'nan']
+            for column, spacing in enumerate(spacings[:3]):
+                matrix[column, column] = spacing
+        if self.fields.get('space origin'):
+            matrix[:3, 3] = _parse_vector(self.fields['space origin'])
+
+        space = self.fields.get('space', '').lower()
+        if space in ('left-posterior-superior', 'lps'):
+            matrix[0:2, :] *= -1.0
+        return matrix
+
+    def read_data(self):
+        """
+        Read the whole image data into a numpy array in native byte order.
+        """
+        array = np.empty(self.shape, dtype=self.dtype)
+        with self.open_data() as stream:
+            read_exact(stream, array)
+        if not array.dtype.isnative:
+            array = array.astype(array.dtype.newbyteorder('='))
+        return array
+
+    @property
+    def dimensions(self):
+        """Size of the spatial axes (I, J, K)."""
+        return [self.sizes[axis] for axis in self.spatial_axes()][:3]
+
+    def iter_slabs(self, memoryBudget):
+        """
+        Stream the image data slab by slab, see iter_array_slabs.
+        """
+        yield from iter_array_slabs(self.open_data(), self.shape, self.dtype, memoryBudget)
+
+    def open_data(self):
+        """
+        Open the image data as a stream positioned at the first voxel, read from memory if it was preloaded.
+        """
+        if self.preloadedDecoded:
+            return io.BytesIO(self.preloadedData)
+        dataPath = self.dataPath
+        f = io.BytesIO(self.preloadedData) if self.preloadedData is not None else open(dataPath, 'rb')
+        try:
+            if dataPath == self.path:
+                f.seek(self.headerSize)
+            for _ in range(int(self.fields.get('line skip', 0))):
+                f.readline()
+            byteSkip = int(self.fields.get('byte skip', 0))
+            if self.encoding == 'raw':
+                if byteSkip == -1:
+                    f.seek(-int(np.prod(self.sizes)) * self.dtype.itemsize, os.SEEK_END)
+                else:
+                    f.seek(byteSkip, os.SEEK_CUR)
+                return f
+            if self.encoding in ('gzip', 'gz'):
+                stream = gzip.GzipFile(fileobj=f, mode='rb')
+            elif self.encoding in ('bzip2', 'bz2'):
+                stream = bz2.BZ2File(f, mode='rb')
+            else:
+                raise ValueError(f"Unsupported NRRD encoding '{self.encoding}' in {self.path}")
+            if byteSkip > 0:
+                stream.read(byteSkip)
+            return _ClosingStream(stream, f)
+        except Exception:
+            f.close()
+            raise
+
+
+class _ClosingStream:
+    """
+    Decompression stream that also closes the underlying file.
+    """
+
+    def __init__(self, stream, fileObject):
+        self.stream = stream
+        self.fileObject = fileObject
+
+    def readinto(self, buffer):
+        return self.stream.readinto(buffer)
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def close(self):
+        self.stream.close()
+        self.fileObject.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _parse_vector(text):
+    return [float(value) for value in text.strip().strip('()').split(',')]
+
+
+class SegmentInfo:
+    """
+    Metadata of one segment stored in a .seg.nrrd file.
+    """
+
+    def __init__(self, segmentId, name, labelValue, layer):
+        self.segmentId = segmentId
+        self.name = name
+        self.labelValue = labelValue
+        self.layer = layer
+
+
+class SegmentationFile:
+    """
+    Segmentation stored in a .seg.nrrd file.
+    Single-layer files are 3D labelmaps, multi-layer files have an additional list axis (the fastest one)
+    with one labelmap per layer.
+    """
+
+    def __init__(self, path):
+        self.header = NrrdHeader(path)
+        self.path = path
+        self.numberOfLayers = self.header.sizes[0] if len(self.header.sizes) == 4 else 1
+        self.segments = []
+        segmentIndex = 0
+        keyValues = self.header.keyValues
+        while f'Segment{segmentIndex}_ID' in keyValues:
+            prefix = f'Segment{segmentIndex}_'
+            defaultLayer = segmentIndex if self.numberOfLayers > 1 else 0
+            self.segments.append(SegmentInfo(
+                keyValues[prefix + 'ID'],
+                keyValues.get(prefix + 'Name', keyValues[prefix + 'ID']),
+                int(keyValues.get(prefix + 'LabelValue', 1)),
+                int(keyValues.get(prefix + 'Layer', defaultLayer))))
+            segmentIndex += 1
+
+    @property
+    def dimensions(self):
+        """Size of the spatial axes (I, J, K)."""
+        return self.header.dimensions
+
+    def ijk_to_ras(self):
+        return self.header.ijk_to_ras()
+
+    def read_layers(self):
+        """
+        Read the labelmap voxels and return a list with one (K, J, I) array per layer.
+        """
+        array = self.header.read_data()
+        if self.numberOfLayers == 1 and array.ndim == 3:
+            return [array]
+        return [array[..., layer] for layer in range(self.numberOfLayers)]
+
+    def iter_layer_slabs(self, memoryBudget):
+        """
+        Stream the labelmap voxels. Yields (firstSlice, layerSlabs) with one (slices, J, I) slab per layer.
+        """
+        for firstSlice, slab in self.header.iter_slabs(memoryBudget):
+            if slab.ndim == 3:
+                yield firstSlice, [slab]
+            else:
+                yield firstSlice, [slab[..., layer] for layer in range(self.numberOfLayers)]
+
+
+def read_labelmap_header(path):
+    """
+    Read the header of a labelmap volume file (.nii.gz, .nii, .nrrd or .seg.nrrd).
+    The returned header provides dimensions, ijk_to_ras(), read_data() and iter_slabs().
+    """
+    if path.lower().endswith(('.nii', '.nii.gz')):
+        return NiftiHeader(path)
+    return NrrdHeader(path)
+
+
+#
+# NIfTI
+#
+
+class NiftiHeader:
+    """
+    Geometry of a NIfTI-1 or NIfTI-2 image, read from the header only.
+    Voxels of the first 3D volume can be read afterwards, as a whole or slab by slab.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open_compressed(path) as f:
+            header = f.read(540)
+
+        if len(header) < 348:
+            raise ValueError(f"Not a NIfTI file: {path}")
+        for byteOrder in ('<', '>'):
+            sizeofHeader = struct.unpack(byteOrder + 'i', header[:4])[0]
+            if sizeofHeader in (348, 540):
+                break
+        else:
+            raise ValueError(f"Not a NIfTI file: {path}")
+
+        if sizeofHeader == 348:
+            self._parse_nifti1(header, byteOrder)
+        else:
+            self._parse_nifti2(header, byteOrder)
+
+        if self.datatype not in NIFTI_TYPES:
+            raise ValueError(f"Unsupported NIfTI datatype {self.datatype} in {path}")
+        self.dtype = np.dtype(NIFTI_TYPES[self.datatype]).newbyteorder(byteOrder)
+
+    def _parse_nifti1(self, header, byteOrder):
+        dim = struct.unpack(byteOrder + '8h', header[40:56])
+        self.datatype = struct.unpack(byteOrder + 'h', header[70:72])[0]
+        self.pixdim = struct.unpack(byteOrder + '8f', header[76:108])
+        self.voxOffset = int(struct.unpack(byteOrder + 'f', header[108:112])[0])
+        self.qformCode, self.sformCode = struct.unpack(byteOrder + '2h', header[252:256])
+        self.quatern = struct.unpack(byteOrder + '6f', header[256:280])
+        self.srow = np.array(struct.unpack(byteOrder + '12f', header[280:328]), dtype=float).reshape(3, 4)
+        self._set_dimensions(dim)
+
+    def _parse_nifti2(self, header, byteOrder):
+        self.datatype = struct.unpack(byteOrder + 'h', header[12:14])[0]
+        dim = struct.unpack(byteOrder + '8q', header[16:80])
+        self.pixdim = struct.unpack(byteOrder + '8d', header[104:168])
+        self.voxOffset = struct.unpack(byteOrder + 'q', header[168:176])[0]
+        self.qformCode, self.sformCode = struct.unpack(byteOrder + '2i', header[344:352])
+        self.quatern = struct.unpack(byteOrder + '6d', header[352:400])
+        self.srow = np.array(struct.unpack(byteOrder + '12d', header[400:496]), dtype=float).reshape(3, 4)
+        self._set_dimensions(dim)
+
+    def _set_dimensions(self, dim):
+        numberOfDimensions = max(1, min(int(dim[0]), 7))
+        self.shapeIjk = [int(size) for size in dim[1:numberOfDimensions + 1]]
+        self.dimensions = (self.shapeIjk + [1, 1, 1])[:3]
+
+    @property
+    def shape(self):
+        """Shape of the first 3D volume as a numpy array (K, J, I)."""
+        return tuple(reversed(self.dimensions))
+
+    def open_data(self):
+        """
+        Open the image data as a stream positioned at the first voxel.
+        """
+        stream = open_compressed(self.path)
+        try:
+            stream.seek(self.voxOffset)
+        except Exception:
+            stream.close()
+            raise
+        return stream
+
+    def read_data(self):
+        """
+        Read the first 3D volume into a numpy array (K, J, I) in native byte order.
+        """
+        array = np.empty(self.shape, dtype=self.dtype)
+        with self.open_data() as stream:
+            read_exact(stream, array)
+        if not array.dtype.isnative:
+            array = array.astype(array.dtype.newbyteorder('='))
+        return array
+
+    def iter_slabs(self, memoryBudget):
+        """
+        Stream the first 3D volume slab by slab, see iter_array_slabs.
+        """
+        yield from iter_array_slabs(self.open_data(), self.shape, self.dtype, memoryBudget)
+
+    def ijk_to_ras(self):
+        """
+        Get the 4x4 IJK to RAS matrix. The sform is used when it is set, then the qform,
+        then the voxel spacing alone.
+        """
+        matrix = np.eye(4)
+        if self.sformCode > 0:
+            matrix[:3, :] = self.srow
+            return matrix
+
+        spacing = [abs(value) if value else 1.0 for value in self.pixdim[1:4]]
+        if self.qformCode > 0:
+            b, c, d, offsetX, offsetY, offsetZ = self.quatern
+            a = np.sqrt(max(0.0, 1.0 - (b * b + c * c + d * d)))
+            rotation = np.array([
+                [a * a + b * b - c * c - d * d, 2 * (b * c - a * d), 2 * (b * d + a * c)],
+                [2 * (b * c + a * d), a * a + c * c - b * b - d * d, 2 * (c * d - a * b)],
+                [2 * (b * d - a * c), 2 * (c * d + a * b), a * a + d * d - c * c - b * b]])
+            qfac = -1.0 if self.pixdim[0] < 0 else 1.0
+            matrix[:3, :3] = rotation * np.array([spacing[0], spacing[1], spacing[2] * qfac])
+            matrix[:3, 3] = (offsetX, offsetY, offsetZ)
+            return matrix
+
+        matrix[0, 0], matrix[1, 1], matrix[2, 2] = spacing
+        return matrix
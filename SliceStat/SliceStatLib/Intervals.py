@@ -0,0 +1,162 @@
+"""
+Run-length (interval) representation of slice indices.
+"""
+import numpy as np
+
+
+class SliceIntervals:
+    """
+    Sorted, non-overlapping, non-adjacent half-open intervals [start, stop) of slice indices,
+    stored as two numpy arrays.
+    Behaves like a read-only sequence of slice indices (iteration, len, in), so it can be used
+    wherever a list of slice indices is expected, while count, contains and overlap are answered
+    from the intervals without expanding them.
+    """
+
+    def __init__(self, starts=(), stops=()):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+
+    @classmethod
+    def from_mask(cls, mask):
+        """
+        Create from a boolean presence mask (one value per slice).
+        """
+        mask = np.asarray(mask, dtype=bool)
+        edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+        return cls(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+    @classmethod
+    def from_indices(cls, sliceIndices):
+        """
+        Create from an iterable of slice indices (any order, duplicates allowed).
+        """
+        indices = np.unique(np.asarray(list(sliceIndices), dtype=np.int64))
+        if indices.size == 0:
+            return cls()
+        breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+        return cls(indices[np.concatenate(([0], breaks))], indices[np.concatenate((breaks - 1, [indices.size - 1]))] + 1)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Create from the text format, e.g. "12-87,90-95,100" (inclusive ranges).
+        """
+        starts = []
+        stops = []
+        for item in text.replace(' ', '').split(','):
+            if not item:
+                continue
+            first, _, last = item.partition('-')
+            starts.append(int(first))
+            stops.append(int(last if last else first) + 1)
+        return cls(starts, stops)
+
+    def format(self):
+        """
+        Get the text format, e.g. "12-87,90-95,100" (inclusive ranges).
+        """
+        return ",".join(str(start) if stop - start == 1 else f"{start}-{stop - 1}"
+                        for start, stop in zip(self.starts.tolist(), self.stops.tolist()))
+
+    def __str__(self):
+        return self.format()
+
+    def __repr__(self):
+        return f"SliceIntervals('{self.format()}')"
+
+    @property
+    def count(self):
+        """Number of slices."""
+        return int((self.stops - self.starts).sum())
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.starts.size > 0
+
+    def __iter__(self):
+        for start, stop in zip(self.starts.tolist(), self.stops.tolist()):
+            yield from range(start, stop)
+
+    def __eq__(self, other):
+        if isinstance(other, SliceIntervals):
+            return np.array_equal(self.starts, other.starts) and np.array_equal(self.stops, other.stops)
+        return NotImplemented
+
+    def to_array(self):
+        """
+        Get the expanded slice indices as a numpy array.
+        """
+        if self.starts.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        lengths = self.stops - self.starts
+        offsets = np.repeat(self.starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        return np.arange(int(lengths.sum()), dtype=np.int64) + offsets
+
+    def to_list(self):
+        """
+        Get the expanded slice indices as a list of ints (the original result format).
+        """
+        return self.to_array().tolist()
+
+    def contains(self, sliceIndex):
+        """
+        Check whether a slice (or each slice of an array) is in the intervals.
+        """
+        sliceIndex = np.asarray(sliceIndex)
+        if self.starts.size == 0:
+            inside = np.zeros(sliceIndex.shape, dtype=bool)
+        else:
+            position = np.searchsorted(self.starts, sliceIndex, side='right') - 1
+            inside = (position >= 0) & (sliceIndex < self.stops[np.clip(position, 0, None)])
+        return bool(inside) if inside.ndim == 0 else inside
+
+    def __contains__(self, sliceIndex):
+        return self.contains(sliceIndex)
+
+    def intersection(self, other):
+        """
+        Get the slices that are in both interval sets.
+        """
+        if not self or not other:
+            return SliceIntervals()
+        # For each interval of self, the range of intervals of other that can overlap it
+        firstOther = np.searchsorted(other.stops, self.starts, side='right')
+        lastOther = np.searchsorted(other.starts, self.stops, side='left')
+        pairCounts = np.clip(lastOther - firstOther, 0, None)
+        total = int(pairCounts.sum())
+        if total == 0:
+            return SliceIntervals()
+        selfIndices = np.repeat(np.arange(self.starts.size), pairCounts)
+        pairOffsets = np.arange(total) - np.repeat(np.cumsum(pairCounts) - pairCounts, pairCounts)
+        otherIndices = np.repeat(firstOther, pairCounts) + pairOffsets
+        starts = np.maximum(self.starts[selfIndices], other.starts[otherIndices])
+        stops = np.minimum(self.stops[selfIndices], other.stops[otherIndices])
+        keep = starts < stops
+        return SliceIntervals(starts[keep], stops[keep])
+
+    def overlap(self, other):
+        """
+        Get the number of slices that are in both interval sets.
+        """
+        return self.intersection(other).count
+
+
+def slice_result(mask, asIntervals=False):
+    """
+    Convert a per-slice presence mask to a slice result: SliceIntervals, or a list of slice indices.
+    """
+    if asIntervals:
+        return SliceIntervals.from_mask(mask)
+    return np.flatnonzero(mask).tolist()
+
+
+def format_intervals(sliceNumbers):
+    """
+    Get the interval text of a slice result (SliceIntervals or list of slice indices).
+    """
+    if not isinstance(sliceNumbers, SliceIntervals):
+        sliceNumbers = SliceIntervals.from_indices(sliceNumbers or [])
+    return sliceNumbers.format()
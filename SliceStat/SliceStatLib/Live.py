@@ -0,0 +1,153 @@
+"""
+Per-slice voxel counts of segments that are kept up to date while a segmentation is edited.
+
+Slicer's segmentation events do not carry the modified extent, so a copy of each labelmap is kept and compared
+with the next one: only the reference slices that contain changed voxels are recounted, and only those slices
+of the stored counts are replaced.
+"""
+import numpy as np
+
+from .Intervals import SliceIntervals
+from .Presence import slice_label_counts
+
+
+def changed_box(previousArray, previousOffset, labelArray, ijkOffset):
+    """
+    Get the index box of the voxels that differ between two labelmaps with shape (K, J, I), whose first voxels
+    are at the (I, J, K) indices previousOffset and ijkOffset. If their extents differ, the box around both extents
+    is returned. Returns ((I, J, K) minimum, (I, J, K) maximum + 1), or None if the labelmaps are equal.
+    """
+    if previousArray.shape == labelArray.shape and tuple(previousOffset) == tuple(ijkOffset):
+        differs = previousArray != labelArray
+        changedK = np.flatnonzero(differs.any(axis=(1, 2)))
+        if len(changedK) == 0:
+            return None
+        differs = differs[changedK[0]:changedK[-1] + 1]
+        changedJ = np.flatnonzero(differs.any(axis=(0, 2)))
+        changedI = np.flatnonzero(differs.any(axis=(0, 1)))
+        minimum = (changedI[0], changedJ[0], changedK[0])
+        maximum = (changedI[-1] + 1, changedJ[-1] + 1, changedK[-1] + 1)
+        return (tuple(int(ijkOffset[axis] + minimum[axis]) for axis in range(3)),
+                tuple(int(ijkOffset[axis] + maximum[axis]) for axis in range(3)))
+
+    boxes = [(tuple(offset), tuple(offset[axis] + array.shape[2 - axis] for axis in range(3)))
+             for array, offset in ((previousArray, previousOffset), (labelArray, ijkOffset)) if array.size > 0]
+    if not boxes:
+        return None
+    return (tuple(int(min(box[0][axis] for box in boxes)) for axis in range(3)),
+            tuple(int(max(box[1][axis] for box in boxes)) for axis in range(3)))
+
+
+def box_slice_range(box, ijkToReference, numberOfSlices):
+    """
+    Get the (first, last + 1) range of reference slices that nearest neighbor resampling can map into an index box
+    ((I, J, K) minimum, (I, J, K) maximum + 1) of a labelmap, given the 4x4 matrix from the labelmap index space
+    to the reference index space (None if the labelmap is on the reference grid). Returns None if the range is empty.
+    """
+    minimum, maximum = box
+    if ijkToReference is None:
+        first, last = minimum[2], maximum[2]
+    else:
+        # Corners of the voxels at the edges of the box, with a margin of one slice for rounding
+        corners = np.array([[i, j, k, 1.0] for i in (minimum[0] - 0.5, maximum[0] - 0.5)
+                            for j in (minimum[1] - 0.5, maximum[1] - 0.5) for k in (minimum[2] - 0.5, maximum[2] - 0.5)])
+        referenceK = corners @ np.asarray(ijkToReference, dtype=float)[2]
+        first = int(np.floor(referenceK.min()))
+        last = int(np.ceil(referenceK.max())) + 1
+    first = max(first, 0)
+    last = min(last, numberOfSlices)
+    if first >= last:
+        return None
+    return first, last
+
+
+class LiveSliceCounts:
+    """
+    Per-slice voxel counts of segments in the K index space of a reference volume.
+    A copy of the last labelmap of each layer is kept to find the slices changed by the next update.
+    """
+
+    def __init__(self, numberOfSlices):
+        self.numberOfSlices = numberOfSlices
+        # {segmentId: voxel count of each reference slice}
+        self.counts = {}
+        # {tuple of segment IDs: (labelArray, ijkOffset) of the last update}
+        self.snapshots = {}
+
+    def set_counts(self, segmentId, sliceCounts, firstSlice=0, sliceRange=None):
+        """
+        Replace the counts of a segment in the reference slices of sliceRange ((first, last + 1), all slices by default)
+        with the counts of consecutive slices starting at reference slice firstSlice; slices of the range that
+        sliceCounts does not cover are empty, the counts of other slices are kept.
+        Returns the (first, last + 1) range of slices whose presence changed, or None if it did not change.
+        """
+        counts = self.counts.get(segmentId)
+        if counts is None:
+            counts = self.counts[segmentId] = np.zeros(self.numberOfSlices, dtype=np.int64)
+        first, last = sliceRange if sliceRange is not None else (0, self.numberOfSlices)
+        first = max(first, 0)
+        last = min(last, self.numberOfSlices)
+        if first >= last:
+            return None
+        wasPresent = counts[first:last] > 0
+        counts[first:last] = 0
+        copyFirst = max(first, firstSlice)
+        copyLast = min(last, firstSlice + len(sliceCounts))
+        if copyFirst < copyLast:
+            counts[copyFirst:copyLast] = sliceCounts[copyFirst - firstSlice:copyLast - firstSlice]
+        changed = np.flatnonzero((counts[first:last] > 0) != wasPresent)
+        if len(changed) == 0:
+            return None
+        return first + int(changed[0]), first + int(changed[-1]) + 1
+
+    def changed_slice_range(self, segmentIds, labelArray, ijkOffset, ijkToReference=None):
+        """
+        Compare the labelmap (K, J, I) of segments stored in the same layer, whose first voxel is at the (I, J, K)
+        index ijkOffset, with the one of their last update and keep a copy of it.
+        ijkToReference is the 4x4 matrix from the labelmap index space to the reference index space
+        (None if the labelmap is on the reference grid).
+        Returns the (first, last + 1) range of reference slices to recount: all slices the first time, None if nothing changed.
+        """
+        key = tuple(segmentIds)
+        previous = self.snapshots.pop(key, None)
+        # A segment moved to another layer is recounted there from scratch
+        for otherKey in [otherKey for otherKey in self.snapshots if set(otherKey) & set(key)]:
+            del self.snapshots[otherKey]
+        self.snapshots[key] = (labelArray.copy(), tuple(ijkOffset))
+        if previous is None:
+            return 0, self.numberOfSlices
+        box = changed_box(previous[0], previous[1], labelArray, ijkOffset)
+        if box is None:
+            return None
+        return box_slice_range(box, ijkToReference, self.numberOfSlices)
+
+    def update_labelmap(self, segmentIds, labelArray, ijkOffset, labelValues):
+        """
+        Update the counts of segments stored in the same layer from their labelmap (K, J, I) on the reference grid,
+        cropped to the reference volume, whose first voxel is at the reference (I, J, K) index ijkOffset;
+        labelValues are the label values of the segments. Only the slices that changed since the last update are counted.
+        Returns {segmentId: (first, last + 1) range of slices whose presence changed, or None}.
+        """
+        sliceRange = self.changed_slice_range(segmentIds, labelArray, ijkOffset)
+        if sliceRange is None:
+            return dict.fromkeys(segmentIds)
+        first, last = sliceRange
+        firstK = min(max(first - ijkOffset[2], 0), labelArray.shape[0])
+        lastK = min(max(last - ijkOffset[2], firstK), labelArray.shape[0])
+        labelCounts = slice_label_counts(labelArray[firstK:lastK], max(labelValues))
+        return {segmentId: self.set_counts(segmentId, labelCounts[:, labelValue], ijkOffset[2] + firstK, sliceRange)
+                for segmentId, labelValue in zip(segmentIds, labelValues)}
+
+    def remove(self, segmentId):
+        self.counts.pop(segmentId, None)
+        for key in [key for key in self.snapshots if segmentId in key]:
+            del self.snapshots[key]
+
+    def slice_numbers(self, segmentId):
+        return np.flatnonzero(self.counts[segmentId]).tolist()
+
+    def intervals(self, segmentId):
+        return SliceIntervals.from_mask(self.counts[segmentId] > 0)
+
+    def voxel_count(self, segmentId):
+        return int(self.counts[segmentId].sum())
@@ -0,0 +1,354 @@
+"""
+Bit-packed slice presence masks and set operations across segments and cases.
+
+SliceMask stores the presence of a segment in each slice as one bit (numpy.packbits), so a volume of 512 slices
+takes 64 bytes. Intersection, union and difference are bitwise operations on the packed bytes and counts use a
+byte lookup table, without expanding masks to slice index lists. PresenceMaskStore keeps the masks of a cohort,
+{caseId: {segmentName: SliceMask}}, and answers cohort-wide questions (overlap between segments of every case,
+cases with a segment on a slice) on a matrix of packed masks with one row per case. It can be saved to and
+loaded from an NPZ file.
+"""
+import os
+
+import numpy as np
+
+from .Intervals import SliceIntervals
+
+# Number of set bits of each byte value
+_BIT_COUNTS = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def masks_path(outputPath):
+    """
+    Get the path of the slice masks file of an output CSV file, e.g. output.csv -> output_masks.npz.
+    """
+    basePath, extension = os.path.splitext(outputPath)
+    if extension.lower() != '.csv':
+        basePath = outputPath
+    return basePath + '_masks.npz'
+
+
+def packed_length(numberOfSlices):
+    return (numberOfSlices + 7) // 8
+
+
+def bit_count(packedBits, axis=None):
+    """
+    Count the set bits of packed masks, in total or along an axis (e.g. axis=-1 for one count per row).
+    """
+    return _BIT_COUNTS[packedBits].sum(axis=axis, dtype=np.int64)
+
+
+def _pad(bits, length):
+    if len(bits) >= length:
+        return bits
+    return np.concatenate((bits, np.zeros(length - len(bits), dtype=np.uint8)))
+
+
+class SliceMask:
+    """
+    Presence of a segment in each of numberOfSlices slices, bit-packed (bit order little: slice i is bit i % 8 of byte i // 8).
+    Behaves like a read-only sequence of slice indices (iteration, len, in), like SliceIntervals.
+    Set operations between masks of different lengths treat the missing slices as empty.
+    """
+
+    def __init__(self, bits, numberOfSlices):
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.numberOfSlices = int(numberOfSlices)
+
+    @classmethod
+    def from_mask(cls, mask):
+        """
+        Create from a boolean presence mask (one value per slice).
+        """
+        mask = np.asarray(mask, dtype=bool)
+        return cls(np.packbits(mask, bitorder='little'), len(mask))
+
+    @classmethod
+    def from_indices(cls, sliceIndices, numberOfSlices=None):
+        """
+        Create from slice indices, a list or SliceIntervals. Without numberOfSlices, the mask ends at the last slice.
+        """
+        if isinstance(sliceIndices, SliceIntervals):
+            indices = sliceIndices.to_array()
+        else:
+            indices = np.asarray(list(sliceIndices) if sliceIndices is not None else [], dtype=np.int64)
+        if numberOfSlices is None:
+            numberOfSlices = int(indices.max()) + 1 if indices.size else 0
+        mask = np.zeros(numberOfSlices, dtype=bool)
+        mask[indices[(indices >= 0) & (indices < numberOfSlices)]] = True
+        return cls.from_mask(mask)
+
+    def to_mask(self):
+        return np.unpackbits(self.bits, count=self.numberOfSlices, bitorder='little').view(bool)
+
+    def to_array(self):
+        return np.flatnonzero(self.to_mask())
+
+    def to_list(self):
+        return self.to_array().tolist()
+
+    def to_intervals(self):
+        return SliceIntervals.from_mask(self.to_mask())
+
+    @property
+    def count(self):
+        return int(bit_count(self.bits))
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return bool(self.bits.any())
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __contains__(self, sliceIndex):
+        return 0 <= sliceIndex < self.numberOfSlices and bool(self.bits[sliceIndex >> 3] >> (sliceIndex & 7) & 1)
+
+    def __repr__(self):
+        return f"SliceMask('{self.to_intervals().format()}', {self.numberOfSlices})"
+
+    def __eq__(self, other):
+        if not isinstance(other, SliceMask):
+            return NotImplemented
+        length = max(len(self.bits), len(other.bits))
+        return np.array_equal(_pad(self.bits, length), _pad(other.bits, length))
+
+    def _combine(self, other, operation):
+        length = max(len(self.bits), len(other.bits))
+        return SliceMask(operation(_pad(self.bits, length), _pad(other.bits, length)),
+                         max(self.numberOfSlices, other.numberOfSlices))
+
+    def __and__(self, other):
+        return self._combine(other, np.bitwise_and)
+
+    def __or__(self, other):
+        return self._combine(other, np.bitwise_or)
+
+    def __xor__(self, other):
+        return self._combine(other, np.bitwise_xor)
+
+    def __sub__(self, other):
+        return self._combine(other, lambda bits, otherBits: bits & ~otherBits)
+
+    def overlap(self, other):
+        """
+        Get (number of slices in both, number of slices in either, Dice coefficient of the slice sets).
+        The Dice coefficient of two empty masks is 1.
+        """
+        both = (self & other).count
+        either = (self | other).count
+        total = self.count + other.count
+        return both, either, 2.0 * both / total if total else 1.0
+
+
+class PresenceMaskStore:
+    """
+    Bit-packed slice presence of the segments of a cohort, {caseId: {segmentName: SliceMask}}.
+    """
+
+    def __init__(self):
+        self.masks = {}
+
+    def __len__(self):
+        return len(self.masks)
+
+    def __contains__(self, caseId):
+        return caseId in self.masks
+
+    def add_case(self, caseId, segmentResults, numberOfSlices=None):
+        """
+        Add or replace a case from its {segmentName: slice indices, SliceIntervals or SliceMask} results.
+        numberOfSlices is the number of slices of the reference volume; without it, masks end at the last slice of the case.
+        """
+        if numberOfSlices is None:
+            numberOfSlices = max((sliceNumbers.numberOfSlices if isinstance(sliceNumbers, SliceMask)
+                                  else SliceMask.from_indices(sliceNumbers).numberOfSlices
+                                  for sliceNumbers in segmentResults.values()), default=0)
+        self.masks[caseId] = {segmentName: sliceNumbers if isinstance(sliceNumbers, SliceMask)
+                              else SliceMask.from_indices(sliceNumbers, numberOfSlices)
+                              for segmentName, sliceNumbers in segmentResults.items()}
+
+    def remove_case(self, caseId):
+        self.masks.pop(caseId, None)
+
+    def get(self, caseId, segmentName):
+        """
+        Get the SliceMask of a segment of a case, or None.
+        """
+        return self.masks.get(caseId, {}).get(segmentName)
+
+    def case_ids(self):
+        return list(self.masks)
+
+    def segment_names(self):
+        names = {}
+        for segmentMasks in self.masks.values():
+            names.update(dict.fromkeys(segmentMasks))
+        return list(names)
+
+    @property
+    def nbytes(self):
+        return sum(mask.nbytes for segmentMasks in self.masks.values() for mask in segmentMasks.values())
+
+    def _case_masks(self, caseId, segmentNames=None):
+        segmentMasks = self.masks[caseId]
+        if segmentNames is None:
+            return list(segmentMasks.values())
+        return [segmentMasks[segmentName] for segmentName in segmentNames if segmentName in segmentMasks]
+
+    def union(self, caseId, segmentNames=None):
+        """
+        Get the slices of a case that contain any of the segments (all segments if segmentNames is None).
+        """
+        result = SliceMask(np.zeros(0, dtype=np.uint8), 0)
+        for mask in self._case_masks(caseId, segmentNames):
+            result = result | mask
+        return result
+
+    def slices_with_any_label(self, caseId):
+        """
+        Get the slices of a case that contain any segment, e.g. to select slices for training or review.
+        """
+        return self.union(caseId)
+
+    def intersection(self, caseId, segmentNames):
+        """
+        Get the slices of a case that contain all the given segments (empty if one of them is missing).
+        """
+        masks = self._case_masks(caseId, segmentNames)
+        if not masks or len(masks) < len(segmentNames):
+            return SliceMask(np.zeros(0, dtype=np.uint8), 0)
+        result = masks[0]
+        for mask in masks[1:]:
+            result = result & mask
+        return result
+
+    def compare_cases(self, caseIdA, caseIdB, segmentNames=None):
+        """
+        Compare the segments of two cases, e.g. two annotators' segmentations of the same volume.
+        Returns {segmentName: (slices in both, slices in either, Dice coefficient)} for the segment names of either case
+        (or segmentNames); a segment missing in one case counts as empty.
+        """
+        masksA = self.masks[caseIdA]
+        masksB = self.masks[caseIdB]
+        if segmentNames is None:
+            segmentNames = list(dict.fromkeys(list(masksA) + list(masksB)))
+        empty = SliceMask(np.zeros(0, dtype=np.uint8), 0)
+        return {segmentName: masksA.get(segmentName, empty).overlap(masksB.get(segmentName, empty))
+                for segmentName in segmentNames}
+
+    def segment_matrix(self, segmentName, caseIds=None):
+        """
+        Get the packed masks of a segment in all cases (or caseIds) as a (number of cases, bytes) uint8 matrix.
+        Rows of cases without the segment are empty. Returns (caseIds, matrix).
+        """
+        caseIds = list(self.masks) if caseIds is None else list(caseIds)
+        masks = [self.get(caseId, segmentName) for caseId in caseIds]
+        width = max((len(mask.bits) for mask in masks if mask is not None), default=0)
+        matrix = np.zeros((len(caseIds), width), dtype=np.uint8)
+        for row, mask in enumerate(masks):
+            if mask is not None:
+                matrix[row, :len(mask.bits)] = mask.bits
+        return caseIds, matrix
+
+    def cohort_overlap(self, segmentNameA, segmentNameB, caseIds=None):
+        """
+        Compare two segments in every case at once, with bitwise operations on the segment matrices.
+        Returns (caseIds, slices with both segments, slices with either segment) as arrays with one value per case.
+        """
+        caseIds, matrixA = self.segment_matrix(segmentNameA, caseIds)
+        _, matrixB = self.segment_matrix(segmentNameB, caseIds)
+        width = max(matrixA.shape[1], matrixB.shape[1])
+        matrixA = np.pad(matrixA, ((0, 0), (0, width - matrixA.shape[1])))
+        matrixB = np.pad(matrixB, ((0, 0), (0, width - matrixB.shape[1])))
+        return caseIds, bit_count(matrixA & matrixB, axis=-1), bit_count(matrixA | matrixB, axis=-1)
+
+    def slice_counts(self, segmentName, caseIds=None):
+        """
+        Get (caseIds, number of slices of the segment in each case).
+        """
+        caseIds, matrix = self.segment_matrix(segmentName, caseIds)
+        return caseIds, bit_count(matrix, axis=-1)
+
+    def cases_with_slice(self, segmentName, sliceIndex):
+        """
+        Get the IDs of the cases whose segment is present on a slice.
+        """
+        caseIds, matrix = self.segment_matrix(segmentName)
+        if sliceIndex < 0 or sliceIndex >> 3 >= matrix.shape[1]:
+            return []
+        present = (matrix[:, sliceIndex >> 3] >> (sliceIndex & 7)) & 1
+        return [caseIds[row] for row in np.flatnonzero(present)]
+
+    def save(self, path):
+        """
+        Save all masks to an NPZ file: one row per (case, segment) with the packed bits concatenated.
+        """
+        caseIds = []
+        segmentNames = []
+        numbersOfSlices = []
+        chunks = []
+        for caseId, segmentMasks in self.masks.items():
+            for segmentName, mask in segmentMasks.items():
+                caseIds.append(str(caseId))
+                segmentNames.append(segmentName)
+                numbersOfSlices.append(mask.numberOfSlices)
+                chunks.append(mask.bits)
+        lengths = np.array([len(chunk) for chunk in chunks], dtype=np.int64)
+        # np.savez adds .npz to paths without that extension, write through a file object instead
+        with open(path, 'wb') as f:
+            np.savez(f,
+                     ID=np.array(caseIds, dtype=str),
+                     SegmentName=np.array(segmentNames, dtype=str),
+                     NumberOfSlices=np.array(numbersOfSlices, dtype=np.int64),
+                     BitOffsets=np.concatenate(([0], np.cumsum(lengths))),
+                     Bits=np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint8))
+
+    def update_from_file(self, path):
+        """
+        Add or replace the cases saved in an NPZ file.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            offsets = data['BitOffsets']
+            bits = data['Bits']
+            loaded = {}
+            for row, (caseId, segmentName, numberOfSlices) in enumerate(zip(data['ID'].tolist(), data['SegmentName'].tolist(),
+                                                                            data['NumberOfSlices'].tolist())):
+                loaded.setdefault(caseId, {})[segmentName] = SliceMask(bits[offsets[row]:offsets[row + 1]].copy(), numberOfSlices)
+        self.masks.update(loaded)
+
+    @classmethod
+    def load(cls, path):
+        store = cls()
+        store.update_from_file(path)
+        return store
+
+
+def write_case_masks(store, caseIds, outputPath, appendMode=False, removedIds=()):
+    """
+    Save the masks of caseIds in a PresenceMaskStore to the masks file of a CSV output file (e.g. output_masks.npz).
+    In append mode, the other cases of an existing masks file are kept, except for the cases in removedIds.
+    Cases that are not in the store are not written.
+    """
+    masksOutputPath = masks_path(outputPath)
+    caseStore = PresenceMaskStore()
+    try:
+        if appendMode and os.path.exists(masksOutputPath):
+            caseStore.update_from_file(masksOutputPath)
+        for caseId in removedIds:
+            caseStore.masks.pop(caseId, None)
+        for caseId in caseIds:
+            if caseId in store:
+                caseStore.masks[caseId] = store.masks[caseId]
+        tempPath = masksOutputPath + '.tmp'
+        caseStore.save(tempPath)
+        os.replace(tempPath, masksOutputPath)
+    except (IOError, ValueError, KeyError) as e:
+        raise IOError(f"Could not write to file {masksOutputPath}: {e}")
@@ -0,0 +1,122 @@
+"""
+Volume to segmentation matching rules used by Multi Sample export.
+"""
+import bisect
+
+# Sorts after any character, so [prefix, prefix + PREFIX_END) contains all strings starting with prefix
+PREFIX_END = chr(0x10FFFF)
+
+
+def volume_base_name(fileName):
+    """
+    Get the base name of a volume file by removing the .nii.gz or .nii extension.
+    """
+    if fileName.endswith('.nii.gz'):
+        return fileName[:-7]
+    if fileName.endswith('.nii'):
+        return fileName[:-4]
+    return fileName
+
+
+class MatchResult:
+    """
+    Result of matching one volume: the selected segmentation index (or None) and all candidates.
+    The match is ambiguous when several candidates have the same preference as the selected one.
+    """
+
+    def __init__(self, volumeId, index, candidates, preferredCandidates):
+        self.volumeId = volumeId
+        self.index = index
+        self.candidates = candidates
+        self.preferredCandidates = preferredCandidates
+
+    @property
+    def ambiguous(self):
+        return len(self.preferredCandidates) > 1
+
+    def diagnostic(self, segmentationIdentifiers):
+        """
+        Get a structured description of an ambiguous match, or None if the match is not ambiguous.
+        """
+        if not self.ambiguous:
+            return None
+        return {
+            'volume': self.volumeId,
+            'selected': segmentationIdentifiers[self.index],
+            'candidates': [segmentationIdentifiers[index] for index in self.preferredCandidates],
+            'ignored': [segmentationIdentifiers[index] for index in self.candidates if index not in self.preferredCandidates],
+        }
+
+
+def format_match_diagnostic(diagnostic):
+    """
+    Get a warning message for an ambiguous match diagnostic.
+    """
+    candidates = ", ".join(f"'{candidate}'" for candidate in diagnostic['candidates'])
+    return (f"Volume '{diagnostic['volume']}' matches several segmentations ({candidates}), "
+            f"using '{diagnostic['selected']}'")
+
+
+class SegmentationIndex:
+    """
+    Sorted index of segmentation identifiers for matching many volumes by prefix.
+    Building the index is O(n log n), each lookup is O(log n + number of candidates).
+    """
+
+    def __init__(self, segmentationIdentifiers):
+        self.identifiers = list(segmentationIdentifiers)
+        entries = sorted((identifier, index) for index, identifier in enumerate(self.identifiers) if identifier)
+        self.sortedIdentifiers = [identifier for identifier, _ in entries]
+        self.sortedIndices = [index for _, index in entries]
+
+    def candidates(self, prefix):
+        """
+        Get the indices of all identifiers that start with prefix, in their original order.
+        """
+        first = bisect.bisect_left(self.sortedIdentifiers, prefix)
+        last = bisect.bisect_left(self.sortedIdentifiers, prefix + PREFIX_END, lo=first)
+        return sorted(self.sortedIndices[first:last])
+
+    def match(self, volumeBaseName, volumeId=None):
+        """
+        Select the segmentation matching a volume. All identifiers that start with the volume base name
+        are candidates (any suffix allowed, e.g. .seg.nrrd, _v2.seg.nrrd, (final).seg.nrrd),
+        ones containing " (final)" are preferred. The first one in original order is selected.
+        volumeId is the name used in diagnostics, the base name by default.
+        """
+        candidates = self.candidates(volumeBaseName)
+        finalPreferred = [index for index in candidates if ' (final)' in self.identifiers[index]]
+        preferredCandidates = finalPreferred if finalPreferred else candidates
+        index = preferredCandidates[0] if preferredCandidates else None
+        return MatchResult(volumeId or volumeBaseName, index, candidates, preferredCandidates)
+
+
+def select_matching_segmentation(volumeBaseName, segmentationIdentifiers):
+    """
+    Select the segmentation matching a volume and return its index in segmentationIdentifiers, or None.
+    To match many volumes against the same segmentations build a SegmentationIndex once instead.
+    """
+    return SegmentationIndex(segmentationIdentifiers).match(volumeBaseName).index
+
+
+def match_volumes(volumes, segmentationIdentifiers):
+    """
+    Match volumes, a list of (volumeBaseName, volumeId), with segmentation identifiers (see SegmentationIndex.match).
+    Returns (matches, diagnostics, warnings): the index of the segmentation of each volume (None if it has none),
+    the diagnostics of ambiguous matches, and the warnings of volumes without a segmentation or with an ambiguous match.
+    """
+    segmentationIndex = SegmentationIndex(segmentationIdentifiers)
+    matches = []
+    diagnostics = []
+    warnings = []
+    for volumeBaseName, volumeId in volumes:
+        match = segmentationIndex.match(volumeBaseName, volumeId)
+        matches.append(match.index)
+        if match.index is None:
+            warnings.append(f"Volume '{match.volumeId}' has no matching segmentation")
+            continue
+        diagnostic = match.diagnostic(segmentationIdentifiers)
+        if diagnostic:
+            diagnostics.append(diagnostic)
+            warnings.append(format_match_diagnostic(diagnostic))
+    return matches, diagnostics, warnings
@@ -0,0 +1,109 @@
+"""
+In-memory LRU cache of extracted slice presence, shared by the runs of a session.
+
+Entries are keyed by their owner (e.g. a segmentation node), a stamp that changes whenever the owner is modified
+(e.g. modified times) and a key of everything else that determines the result (reference geometry, segments, options).
+Presence is stored as SliceIntervals, so an entry takes a few bytes per run of slices. Storing an entry with a new
+stamp drops the entries of the same owner with an older stamp; least recently used entries are evicted when the total
+size exceeds the limit.
+"""
+import collections
+
+from .DiskCache import geometry_key
+from .Intervals import SliceIntervals
+
+DEFAULT_EXTRACTION_CACHE_SIZE = 64 * 1024 * 1024
+
+# Estimated bytes of bookkeeping per segment (dict entry, SliceIntervals object and array headers)
+_SEGMENT_OVERHEAD = 400
+
+
+def extraction_key(dimensions, ijkToRas, segmentKeys, options=None):
+    """
+    Get the key of an entry from the reference dimensions and IJK to RAS matrix, the (segmentId, segmentName)
+    of the segments and a dict of the options that change the extraction.
+    """
+    return (repr(geometry_key(dimensions, ijkToRas)), tuple(tuple(segmentKey) for segmentKey in segmentKeys),
+            tuple(sorted((options or {}).items())))
+
+
+class ExtractionCache:
+    """
+    LRU cache of {segmentName: SliceIntervals} results with a total size limit in bytes (0 disables it).
+    """
+
+    def __init__(self, maxSize=DEFAULT_EXTRACTION_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.totalSize = 0
+        self.hits = 0
+        self.misses = 0
+        # {(owner, stamp, key): (segmentResults, size)}, least recently used first
+        self._entries = collections.OrderedDict()
+        # {owner: stamp of its entries}
+        self._stamps = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, owner, stamp, key, asIntervals=False):
+        """
+        Get the cached {segmentName: slice indices} (SliceIntervals if asIntervals is set), or None.
+        Marks the entry as recently used.
+        """
+        entry = self._entries.get((owner, stamp, key))
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((owner, stamp, key))
+        self.hits += 1
+        segmentResults, _ = entry
+        if asIntervals:
+            return dict(segmentResults)
+        return {segmentName: intervals.to_list() for segmentName, intervals in segmentResults.items()}
+
+    def put(self, owner, stamp, key, segmentResults):
+        """
+        Store {segmentName: slice indices or SliceIntervals}. Entries of the owner with another stamp are dropped,
+        then least recently used entries are evicted if the cache is over its size limit.
+        """
+        if self.maxSize <= 0:
+            return
+        if self._stamps.get(owner, stamp) != stamp:
+            self.invalidate(owner)
+        segmentResults = {segmentName: sliceNumbers if isinstance(sliceNumbers, SliceIntervals)
+                          else SliceIntervals.from_indices(sliceNumbers or [])
+                          for segmentName, sliceNumbers in segmentResults.items()}
+        size = sum(intervals.starts.nbytes + intervals.stops.nbytes + len(segmentName) + _SEGMENT_OVERHEAD
+                   for segmentName, intervals in segmentResults.items())
+        if size > self.maxSize:
+            return
+        previousEntry = self._entries.pop((owner, stamp, key), None)
+        if previousEntry is not None:
+            self.totalSize -= previousEntry[1]
+        self._entries[(owner, stamp, key)] = (segmentResults, size)
+        self._stamps[owner] = stamp
+        self.totalSize += size
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache is within its size limit.
+        """
+        while self._entries and self.totalSize > self.maxSize:
+            (owner, _, _), (_, size) = self._entries.popitem(last=False)
+            self.totalSize -= size
+            if not any(entryOwner == owner for entryOwner, _, _ in self._entries):
+                self._stamps.pop(owner, None)
+
+    def invalidate(self, owner):
+        """
+        Remove the entries of an owner, e.g. when it was modified or removed.
+        """
+        for entryKey in [entryKey for entryKey in self._entries if entryKey[0] == owner]:
+            self.totalSize -= self._entries.pop(entryKey)[1]
+        self._stamps.pop(owner, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._stamps.clear()
+        self.totalSize = 0
@@ -0,0 +1,221 @@
+"""
+Prefetching pipeline for batch processing of cases stored in files.
+
+Loading a case (reading the files, often from network storage, and decompressing the segmentation) and computing
+its slice presence use different resources, so they can overlap: CasePrefetcher loads the next cases in a loader
+thread while the current one is processed, and ResultWriter writes the results of the previous cases in a writer
+thread. The queues between the stages are bounded and the loader only holds as many bytes as its memory budget
+allows, so a slow stage blocks the stages before it (backpressure) instead of filling memory.
+"""
+import os
+import queue
+import threading
+import time
+
+from .FileIO import NiftiHeader, SegmentationFile
+
+DEFAULT_PREFETCH_CASES = 2
+DEFAULT_PREFETCH_MEMORY = 512 * 1024 * 1024
+
+
+class ByteBudget:
+    """
+    Number of bytes held by the loader, limited to limit bytes. acquire() blocks until the requested bytes fit;
+    a request larger than the limit is granted when nothing else is held, so that one large case cannot stall
+    the pipeline.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.closed = False
+        self._condition = threading.Condition()
+
+    def acquire(self, size):
+        """
+        Wait until size bytes fit in the budget and reserve them. Returns False if the budget was closed.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.closed or self.used == 0 or self.used + size <= self.limit)
+            if self.closed:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size):
+        with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+    def close(self):
+        """
+        Wake up and refuse all pending and future requests.
+        """
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class PrefetchedCase:
+    """
+    Headers of a case with its segmentation data in memory, or the error message if it could not be loaded.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.volumeHeader = None
+        self.segmentationFile = None
+        self.errorMessage = None
+        self.size = 0
+
+
+class CasePrefetcher:
+    """
+    Loads (volumePath, segmentationPath) cases in a loader thread, at most prefetchCases cases ahead of
+    the consumer and holding at most memoryBudget bytes of segmentation data.
+    Iterating yields PrefetchedCase objects in input order; release() must be called when a case is processed
+    so that the loader can use its memory for the next ones.
+    If decode is set, segmentation data is decompressed by the loader; cases that do not fit in the budget
+    once decompressed are held compressed and decompressed while they are streamed.
+    Can be used as a context manager, the loader is stopped when leaving it.
+    """
+
+    def __init__(self, casePaths, prefetchCases=DEFAULT_PREFETCH_CASES, memoryBudget=DEFAULT_PREFETCH_MEMORY, decode=True):
+        self.casePaths = list(casePaths)
+        self.decode = decode
+        self.budget = ByteBudget(memoryBudget)
+        # Time the consumer waited for the loader, in seconds
+        self.waitTime = 0.0
+        self._queue = queue.Queue(maxsize=max(prefetchCases, 1))
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._load_cases, name='SliceStatPrefetch', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            startTime = time.perf_counter()
+            case = self._queue.get()
+            self.waitTime += time.perf_counter() - startTime
+            if case is None:
+                return
+            yield case
+
+    def _load_cases(self):
+        try:
+            for index, (volumePath, segmentationPath) in enumerate(self.casePaths):
+                if self._stopped.is_set():
+                    return
+                case = self._load_case(index, volumePath, segmentationPath)
+                if case is None:
+                    return
+                if not self._put(case):
+                    # Stopped while waiting for room in the queue
+                    self.release(case)
+                    return
+        finally:
+            self._put(None)
+
+    def _load_case(self, index, volumePath, segmentationPath):
+        case = PrefetchedCase(index)
+        try:
+            case.volumeHeader = NiftiHeader(volumePath)
+            case.segmentationFile = SegmentationFile(segmentationPath)
+            header = case.segmentationFile.header
+            decode = self.decode and header.dataSize <= self.budget.limit
+            size = header.dataSize if decode else os.path.getsize(header.dataPath)
+            if not self.budget.acquire(size):
+                return None
+            case.size = size
+            header.preload(decode)
+        except Exception as e:
+            case.errorMessage = str(e)
+            case.volumeHeader = case.segmentationFile = None
+        return case
+
+    def _put(self, case):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(case, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def release(self, case):
+        """
+        Drop the data of a processed case and return its memory to the budget.
+        """
+        case.volumeHeader = case.segmentationFile = None
+        self.budget.release(case.size)
+        case.size = 0
+
+    def close(self):
+        """
+        Stop the loader and drop the cases that were loaded but not processed.
+        """
+        self._stopped.set()
+        self.budget.close()
+        self._thread.join()
+        while True:
+            try:
+                case = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if case is not None:
+                self.release(case)
+
+
+class ResultWriter:
+    """
+    Calls onCaseDone(index, outcome) in a writer thread for each submitted result, in submission order,
+    so that writing results overlaps the processing of the next cases. At most maxPending results wait to be written,
+    submit() blocks when the writer falls behind. An exception raised by onCaseDone stops writing and is raised
+    again by the next submit() or by close().
+    Can be used as a context manager, pending results are written when leaving it.
+    """
+
+    def __init__(self, onCaseDone, maxPending=DEFAULT_PREFETCH_CASES):
+        self.onCaseDone = onCaseDone
+        self._error = None
+        self._queue = queue.Queue(maxsize=max(maxPending, 1))
+        self._thread = threading.Thread(target=self._write_results, name='SliceStatWriter', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        # Do not hide the exception that is being raised
+        self.close(raiseError=excType is None)
+
+    def _write_results(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is None:
+                try:
+                    self.onCaseDone(*item)
+                except BaseException as e:
+                    self._error = e
+
+    def submit(self, index, outcome):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((index, outcome))
+
+    def close(self, raiseError=True):
+        """
+        Wait until all submitted results are written.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if raiseError and self._error is not None:
+            raise self._error
@@ -0,0 +1,243 @@
+"""
+Slice presence computation on plain numpy arrays.
+Shared by the Slicer module logic and the headless batch engine, so it must not import Slicer.
+"""
+import numpy as np
+
+
+def slice_label_counts(labelArray, maxLabel, maxSlabVoxels=4 * 1024 * 1024):
+    """
+    Compute a per-slice label histogram of a labelmap array with shape (K, J, I).
+    Returns an array of shape (K, maxLabel + 1) with the voxel count of each label in each slice.
+    Slices are processed in slabs so the temporary index array stays below maxSlabVoxels elements.
+    Label values outside [0, maxLabel] are ignored.
+    """
+    numberOfSlices = labelArray.shape[0]
+    numberOfBins = maxLabel + 1
+    labelCounts = np.zeros((numberOfSlices, numberOfBins), dtype=np.int64)
+    if numberOfSlices == 0 or labelArray.size == 0:
+        return labelCounts
+
+    voxelsPerSlice = labelArray.size // numberOfSlices
+    slabSize = max(1, maxSlabVoxels // voxelsPerSlice)
+    for start in range(0, numberOfSlices, slabSize):
+        slab = labelArray[start:start + slabSize].reshape(-1, voxelsPerSlice)
+        slabSlices = slab.shape[0]
+        codes = slab.astype(np.intp)
+        valid = (codes >= 0) & (codes <= maxLabel)
+        codes += (np.arange(slabSlices, dtype=np.intp) * numberOfBins)[:, np.newaxis]
+        counts = np.bincount(codes[valid], minlength=slabSlices * numberOfBins)
+        labelCounts[start:start + slabSlices] = counts.reshape(slabSlices, numberOfBins)
+    return labelCounts
+
+
+def axis_label_counts(labelArray, maxLabel, maxSlabVoxels=4 * 1024 * 1024):
+    """
+    Compute the per-slice label histograms of a labelmap array with shape (K, J, I) along all three axes
+    in a single traversal.
+    Returns (kCounts, jCounts, iCounts) with shapes (K, maxLabel + 1), (J, maxLabel + 1) and (I, maxLabel + 1).
+    kCounts is the same as the result of slice_label_counts.
+    Label values outside [0, maxLabel] are ignored.
+    """
+    numberOfSlices, numberOfRows, numberOfColumns = labelArray.shape
+    numberOfBins = maxLabel + 1
+    kCounts = np.zeros((numberOfSlices, numberOfBins), dtype=np.int64)
+    jCounts = np.zeros((numberOfRows, numberOfBins), dtype=np.int64)
+    iCounts = np.zeros((numberOfColumns, numberOfBins), dtype=np.int64)
+    if labelArray.size == 0:
+        return kCounts, jCounts, iCounts
+
+    rowCodes = (np.arange(numberOfRows, dtype=np.intp) * numberOfBins)[:, np.newaxis]
+    columnCodes = np.arange(numberOfColumns, dtype=np.intp) * numberOfBins
+    slabSize = max(1, maxSlabVoxels // (numberOfRows * numberOfColumns))
+    for start in range(0, numberOfSlices, slabSize):
+        labels = labelArray[start:start + slabSize].astype(np.intp)
+        slabSlices = labels.shape[0]
+        valid = (labels >= 0) & (labels <= maxLabel)
+        sliceCodes = (np.arange(slabSlices, dtype=np.intp) * numberOfBins)[:, np.newaxis, np.newaxis]
+        kCounts[start:start + slabSlices] = np.bincount(
+            (labels + sliceCodes)[valid], minlength=slabSlices * numberOfBins).reshape(slabSlices, numberOfBins)
+        jCounts += np.bincount((labels + rowCodes)[valid], minlength=numberOfRows * numberOfBins).reshape(numberOfRows, numberOfBins)
+        iCounts += np.bincount((labels + columnCodes)[valid], minlength=numberOfColumns * numberOfBins).reshape(numberOfColumns, numberOfBins)
+    return kCounts, jCounts, iCounts
+
+
+def group_by_layer(segmentIds, layerIndexOf):
+    """
+    Group segment IDs by the labelmap layer they are stored in. layerIndexOf(segmentId) gets the layer index
+    of a segment; segments for which it is negative or raises (e.g. closed surface source) each get their own group.
+    Group order follows the first segment of each group.
+    """
+    groups = {}
+    for segmentId in segmentIds:
+        try:
+            layerIndex = layerIndexOf(segmentId)
+        except Exception:
+            layerIndex = -1
+        key = layerIndex if layerIndex >= 0 else ("segment", segmentId)
+        groups.setdefault(key, []).append(segmentId)
+    return list(groups.values())
+
+
+def slice_presence(labelArray):
+    """
+    Get the boolean presence of voxels with a value above zero in each slice of an array with shape (K, J, I).
+    """
+    if labelArray.dtype.kind not in 'bu':
+        labelArray = labelArray > 0
+    return np.any(labelArray, axis=tuple(range(1, labelArray.ndim)))
+
+
+def place_slice_counts(counts, croppedCounts, sliceOffset):
+    """
+    Copy the per-slice counts of a cropped array, whose first slice is slice sliceOffset of counts, into counts.
+    Slices outside counts are dropped. Returns counts.
+    """
+    firstSlice = max(sliceOffset, 0)
+    lastSlice = min(sliceOffset + croppedCounts.shape[0], counts.shape[0])
+    if firstSlice < lastSlice:
+        counts[firstSlice:lastSlice] = croppedCounts[firstSlice - sliceOffset:lastSlice - sliceOffset]
+    return counts
+
+
+def crop_to_reference(labelArray, ijkOffset, referenceDimensions):
+    """
+    Crop an array with shape (K, J, I), whose first voxel is at the reference index ijkOffset (I, J, K),
+    to the voxels inside a reference volume of referenceDimensions (I, J, K).
+    Returns (croppedArray, croppedIjkOffset); croppedArray is a view, it is empty if no voxel is inside.
+    """
+    croppedRanges = []
+    for axis in range(3):
+        arraySize = labelArray.shape[2 - axis]
+        first = min(max(0, -ijkOffset[axis]), arraySize)
+        stop = max(min(arraySize, referenceDimensions[axis] - ijkOffset[axis]), first)
+        croppedRanges.append((first, stop))
+    (firstI, stopI), (firstJ, stopJ), (firstK, stopK) = croppedRanges
+    croppedIjkOffset = tuple(ijkOffset[axis] + croppedRanges[axis][0] for axis in range(3))
+    return labelArray[firstK:stopK, firstJ:stopJ, firstI:stopI], croppedIjkOffset
+
+
+def slice_index_transform(sourceIjkToRas, referenceIjkToRas):
+    """
+    Get the coefficients (a, b, c, d) so that a*i + b*j + c*k + d is the reference K index
+    of the source voxel (i, j, k).
+    """
+    return reference_index_transform(sourceIjkToRas, referenceIjkToRas)[2]
+
+
+def reference_index_transform(sourceIjkToRas, referenceIjkToRas):
+    """
+    Get the 3x4 matrix that maps the source voxel (i, j, k, 1) to its reference (I, J, K) index.
+    """
+    sourceToReference = np.linalg.inv(np.asarray(referenceIjkToRas, dtype=float)) @ np.asarray(sourceIjkToRas, dtype=float)
+    return sourceToReference[:3]
+
+
+def integer_index_offset(sourceIjkToRas, referenceIjkToRas, tolerance=1e-3):
+    """
+    Get the reference (I, J, K) index of the source voxel (0, 0, 0) if the source grid is the reference grid
+    shifted by whole voxels (same axes and spacing, e.g. a cropped labelmap), otherwise None.
+    tolerance is in voxels.
+    """
+    sourceToReference = np.linalg.inv(np.asarray(referenceIjkToRas, dtype=float)) @ np.asarray(sourceIjkToRas, dtype=float)
+    if not np.allclose(sourceToReference[:3, :3], np.eye(3), rtol=0.0, atol=tolerance):
+        return None
+    offset = sourceToReference[:3, 3]
+    roundedOffset = np.rint(offset)
+    if np.any(np.abs(offset - roundedOffset) > tolerance):
+        return None
+    return tuple(int(value) for value in roundedOffset)
+
+
+class ReferenceSliceLabelCounter:
+    """
+    Accumulate the per-slice label histogram of a labelmap in the K index space of a reference geometry.
+    The labelmap can be added slab by slab (consecutive source slices), so it never has to be fully in memory.
+    Each voxel is assigned to the nearest reference voxel, voxels outside the reference volume are dropped.
+    referenceDimensions is the (I, J, K) size of the reference volume.
+    When the source slices are parallel to the reference slices and the source voxels inside the reference volume
+    form the same box in every slice, the histogram is computed on that box of the source slices and mapped as a whole,
+    otherwise every non-zero voxel is mapped (background is then not counted).
+    """
+
+    def __init__(self, maxLabel, sourceIjkToRas, referenceIjkToRas, referenceDimensions):
+        self.maxLabel = maxLabel
+        self.referenceDimensions = [int(size) for size in referenceDimensions]
+        self.numberOfReferenceSlices = self.referenceDimensions[2]
+        self.transform = reference_index_transform(sourceIjkToRas, referenceIjkToRas)
+        self.a, self.b, self.c, self.d = self.transform[2]
+        tolerance = 1e-6 * max(abs(self.c), 1.0)
+        inPlaneTolerance = 1e-6 * max(np.abs(self.transform[:2, :3]).max(), 1.0)
+        # The reference K index of a voxel only depends on k, and its reference I and J indices do not depend on k
+        self.parallelSlices = (abs(self.a) < tolerance and abs(self.b) < tolerance
+                               and bool(np.all(np.abs(self.transform[:2, 2]) < inPlaneTolerance)))
+        self.counts = np.zeros((self.numberOfReferenceSlices, maxLabel + 1), dtype=np.int64)
+        # {(rows, columns) of source slices: (row slice, column slice) of the voxels inside, or None if not a box}
+        self._footprints = {}
+
+    def reference_index(self, axis, i, j, k=0):
+        """
+        Get the reference index along axis (0: I, 1: J, 2: K) of the nearest reference voxel of source voxels (i, j, k).
+        """
+        transform = self.transform[axis]
+        return np.rint(transform[0] * i + transform[1] * j + transform[2] * k + transform[3]).astype(np.intp)
+
+    def footprint(self, numberOfRows, numberOfColumns):
+        """
+        Get the (row slice, column slice) box of the voxels of a source slice that are inside the reference volume
+        in I and J, or None if these voxels do not form a box. Only for parallel slices.
+        """
+        key = (numberOfRows, numberOfColumns)
+        if key not in self._footprints:
+            j, i = np.mgrid[0:numberOfRows, 0:numberOfColumns]
+            inside = np.ones((numberOfRows, numberOfColumns), dtype=bool)
+            for axis in range(2):
+                referenceIndices = self.reference_index(axis, i, j)
+                inside &= (referenceIndices >= 0) & (referenceIndices < self.referenceDimensions[axis])
+            rows = np.flatnonzero(inside.any(axis=1))
+            columns = np.flatnonzero(inside.any(axis=0))
+            if rows.size == 0:
+                box = (slice(0, 0), slice(0, 0))
+            else:
+                box = (slice(rows[0], rows[-1] + 1), slice(columns[0], columns[-1] + 1))
+                if not inside[box].all():
+                    box = None
+            self._footprints[key] = box
+        return self._footprints[key]
+
+    def add_slab(self, labelSlab, firstSlice=0):
+        """
+        Add source slices firstSlice ... firstSlice + len(labelSlab) - 1, labelSlab has shape (slices, J, I).
+        """
+        box = self.footprint(*labelSlab.shape[1:]) if self.parallelSlices else None
+        if box is not None:
+            counts = slice_label_counts(labelSlab[:, box[0], box[1]], self.maxLabel)
+            sourceSlices = firstSlice + np.arange(counts.shape[0])
+            referenceSlices = np.rint(self.c * sourceSlices + self.d).astype(np.intp)
+            valid = (referenceSlices >= 0) & (referenceSlices < self.numberOfReferenceSlices)
+            np.add.at(self.counts, referenceSlices[valid], counts[valid])
+            return
+
+        # Oblique slices, or a part inside the reference volume that is not a box: map every labelled voxel individually
+        for sliceOffset in range(labelSlab.shape[0]):
+            labelSlice = labelSlab[sliceOffset]
+            j, i = np.nonzero(labelSlice)
+            if j.size == 0:
+                continue
+            labels = labelSlice[j, i].astype(np.intp)
+            valid = (labels >= 0) & (labels <= self.maxLabel)
+            for axis in range(3):
+                referenceIndices = self.reference_index(axis, i, j, firstSlice + sliceOffset)
+                valid &= (referenceIndices >= 0) & (referenceIndices < self.referenceDimensions[axis])
+            np.add.at(self.counts, (referenceIndices[valid], labels[valid]), 1)
+
+
+def reference_slice_label_counts(labelArray, maxLabel, sourceIjkToRas, referenceIjkToRas, referenceDimensions):
+    """
+    Compute the per-slice label histogram of a labelmap in the K index space of a reference geometry.
+    See ReferenceSliceLabelCounter for the mapping rules, referenceDimensions is (I, J, K).
+    Returns an array of shape (K, maxLabel + 1).
+    """
+    counter = ReferenceSliceLabelCounter(maxLabel, sourceIjkToRas, referenceIjkToRas, referenceDimensions)
+    counter.add_slab(labelArray, 0)
+    return counter.counts
@@ -0,0 +1,157 @@
+"""
+Per-stage timing and allocation telemetry of exports.
+
+ExportProfiler records the wall time and the bytes allocated (traced by tracemalloc) of each stage
+of each case and segment, and which extraction path each segment used. The trace can be written
+as JSON and summarized per stage.
+Only allocations made by Python and numpy are traced; voxels owned by VTK or by worker processes are not.
+Computations that run in a worker thread while the caller does other work are timed in the thread itself
+(see timed_call and ExportProfiler.record_stage), without their allocations.
+"""
+import contextlib
+import datetime
+import json
+import os
+import time
+import tracemalloc
+
+TRACE_VERSION = 1
+
+
+def trace_path(outputPath):
+    """
+    Get the path of the JSON trace of an output CSV file, e.g. output.csv -> output_trace.json.
+    """
+    basePath, extension = os.path.splitext(outputPath)
+    if extension.lower() != '.csv':
+        basePath = outputPath
+    return basePath + '_trace.json'
+
+
+def timed_call(function, *args):
+    """
+    Call function(*args) and return (result, seconds), e.g. in a worker thread.
+    """
+    startCounter = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - startCounter
+
+
+class ExportProfiler:
+    """
+    Records stages (wall time, allocated bytes, peak bytes) and extraction paths of an export.
+    Call start() before and stop() after the export; memory is traced in between.
+    """
+
+    def __init__(self, traceMemory=True):
+        self.traceMemory = traceMemory
+        self.events = []
+        self.paths = []
+        self.startTime = None
+        self.totalSeconds = 0.0
+        self._startedTracing = False
+        self._stageActive = False
+
+    def start(self):
+        self.startTime = time.time()
+        self._startCounter = time.perf_counter()
+        if self.traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._startedTracing = True
+
+    def stop(self):
+        self.totalSeconds = time.perf_counter() - self._startCounter
+        if self._startedTracing:
+            tracemalloc.stop()
+            self._startedTracing = False
+
+    @contextlib.contextmanager
+    def stage(self, stageName, caseName=None, segment=None):
+        """
+        Record the wall time and memory of a stage. Stages do not nest; an inner stage is not recorded.
+        """
+        if self._stageActive:
+            yield
+            return
+        self._stageActive = True
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            memoryBefore, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        startCounter = time.perf_counter()
+        try:
+            yield
+        finally:
+            event = {
+                'stage': stageName,
+                'case': caseName,
+                'segment': segment,
+                'seconds': time.perf_counter() - startCounter,
+            }
+            if tracing and tracemalloc.is_tracing():
+                memoryAfter, peakMemory = tracemalloc.get_traced_memory()
+                event['allocatedBytes'] = memoryAfter - memoryBefore
+                event['peakBytes'] = max(peakMemory - memoryBefore, 0)
+            self.events.append(event)
+            self._stageActive = False
+
+    def record_stage(self, stageName, seconds, caseName=None, segment=None):
+        """
+        Record a stage timed elsewhere (e.g. by timed_call in a worker thread), without memory.
+        Like stage(), it is not recorded inside another stage.
+        """
+        if self._stageActive:
+            return
+        self.events.append({'stage': stageName, 'case': caseName, 'segment': segment, 'seconds': seconds})
+
+    def record_path(self, caseName, segment, path):
+        """
+        Record the extraction path used for a segment (or for a whole case if segment is None),
+        e.g. 'internal', 'cropped', 'surface', 'binaryLabelmap', 'exportFallback', 'worker', 'cache',
+        'memory'.
+        """
+        self.paths.append({'case': caseName, 'segment': segment, 'path': path})
+
+    def summary(self):
+        """
+        Get the totals per stage and the number of segments per extraction path.
+        """
+        stages = {}
+        for event in self.events:
+            total = stages.setdefault(event['stage'], {'count': 0, 'seconds': 0.0, 'allocatedBytes': 0, 'peakBytes': 0})
+            total['count'] += 1
+            total['seconds'] += event['seconds']
+            total['allocatedBytes'] += event.get('allocatedBytes', 0)
+            total['peakBytes'] = max(total['peakBytes'], event.get('peakBytes', 0))
+        pathCounts = {}
+        for path in self.paths:
+            pathCounts[path['path']] = pathCounts.get(path['path'], 0) + 1
+        return {'totalSeconds': self.totalSeconds, 'stages': stages, 'paths': pathCounts}
+
+    def format_summary(self):
+        """
+        Get a short text summary: total time, then stages by decreasing time and extraction path counts.
+        """
+        summary = self.summary()
+        lines = [f"Total: {summary['totalSeconds']:.2f} s"]
+        for stageName, total in sorted(summary['stages'].items(), key=lambda item: -item[1]['seconds']):
+            line = f"  {stageName}: {total['seconds']:.2f} s ({total['count']}x)"
+            if total['peakBytes']:
+                line += f", peak {total['peakBytes'] / (1024 * 1024):.1f} MB"
+            lines.append(line)
+        if summary['paths']:
+            lines.append("Extraction paths: " + ", ".join(f"{path} {count}" for path, count in sorted(summary['paths'].items())))
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            'version': TRACE_VERSION,
+            'startTime': datetime.datetime.fromtimestamp(self.startTime).isoformat() if self.startTime else None,
+            'summary': self.summary(),
+            'events': self.events,
+            'paths': self.paths,
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=1)
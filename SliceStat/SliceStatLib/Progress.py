@@ -0,0 +1,106 @@
+"""
+Progress reporting, cancellation and step-wise execution of export jobs.
+
+Long computations are written as generators ("steps") that yield whenever the caller may
+update the GUI or cancel, e.g. while voxel work runs in a worker thread or process.
+run_to_completion() runs such a generator in one go for scripts and batch use.
+"""
+import time
+
+
+class ExportCancelled(Exception):
+    """
+    Raised when an export is cancelled by the user.
+    """
+
+
+def run_to_completion(steps):
+    """
+    Run a steps generator until it finishes and return its return value.
+    """
+    while True:
+        try:
+            next(steps)
+        except StopIteration as e:
+            return e.value
+
+
+def format_duration(seconds):
+    """
+    Get a short text of a duration, e.g. "45 s", "3 min 20 s", "2 h 5 min".
+    """
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min {seconds % 60} s"
+    return f"{seconds // 3600} h {seconds % 3600 // 60} min"
+
+
+class ExportProgress:
+    """
+    Progress of an export job: completed cases, segments of the current case,
+    elapsed time and estimated remaining time.
+    """
+
+    def __init__(self, numberOfCases=1):
+        self.numberOfCases = numberOfCases
+        self.completedCases = 0
+        self.caseName = ""
+        self.numberOfSegments = 0
+        self.completedSegments = 0
+        self.message = ""
+        self.startTime = time.monotonic()
+
+    def start_case(self, caseName):
+        self.caseName = caseName
+        self.numberOfSegments = 0
+        self.completedSegments = 0
+
+    def set_segments(self, numberOfSegments):
+        self.numberOfSegments = numberOfSegments
+        self.completedSegments = 0
+
+    def segments_done(self, count=1):
+        self.completedSegments = min(self.completedSegments + count, self.numberOfSegments)
+
+    def case_done(self):
+        self.completedCases = min(self.completedCases + 1, self.numberOfCases)
+        self.numberOfSegments = 0
+        self.completedSegments = 0
+
+    @property
+    def fraction(self):
+        """Completed fraction of the job, between 0 and 1."""
+        if self.numberOfCases <= 0:
+            return 1.0
+        caseFraction = self.completedSegments / self.numberOfSegments if self.numberOfSegments else 0.0
+        return min((self.completedCases + caseFraction) / self.numberOfCases, 1.0)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.startTime
+
+    @property
+    def remaining(self):
+        """Estimated remaining time in seconds, or None if nothing is completed yet."""
+        fraction = self.fraction
+        if fraction <= 0.0:
+            return None
+        return self.elapsed * (1.0 - fraction) / fraction
+
+    def format(self):
+        """
+        Get a progress text, e.g. "Volume 3/120: case3, segment 2/5 - about 2 min 10 s remaining".
+        """
+        text = f"Volume {min(self.completedCases + 1, self.numberOfCases)}/{self.numberOfCases}"
+        if self.caseName:
+            text += f": {self.caseName}"
+        if self.numberOfSegments:
+            text += f", segment {min(self.completedSegments + 1, self.numberOfSegments)}/{self.numberOfSegments}"
+        remaining = self.remaining
+        if remaining is not None:
+            text += f" - about {format_duration(remaining)} remaining"
+        if self.message:
+            text += f"\n{self.message}"
+        return text
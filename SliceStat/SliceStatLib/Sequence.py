@@ -0,0 +1,58 @@
+"""
+Slice statistics of segmentation sequences (e.g. a cardiac or perfusion time series), one segmentation per frame.
+
+Frames whose segmentation content, segments and reference geometry are the same as in an earlier frame reuse
+the results of that frame. The frames of a sequence are written as one group of a results CSV file,
+with Frame and FrameValue columns.
+"""
+import logging
+
+from .Checkpoint import open_checkpointed_csv
+from .CsvExport import frame_rows
+
+
+def process_frames_steps(frameValues, computeFrame, frameKeyOf=None, onFrameStarted=None, onFrameDone=None):
+    """
+    Steps generator of the frame loop of a sequence. Returns a list of (frameIndex, frameValue, segmentResults).
+    - computeFrame(frameIndex) is a steps generator returning the segment results of a frame.
+    - frameKeyOf(frameIndex) gets a key of everything that determines the results of a frame (e.g. a result cache key),
+      or None if it cannot be determined; frames with the key of an earlier frame are not computed again.
+    onFrameStarted(frameIndex) is called before each frame (it may raise ExportCancelled), onFrameDone(frameIndex, reused)
+    after it.
+    """
+    resultsByFrameKey = {}
+    frameResults = []
+    for frameIndex, frameValue in enumerate(frameValues):
+        if onFrameStarted is not None:
+            onFrameStarted(frameIndex)
+        frameKey = None
+        if frameKeyOf is not None:
+            try:
+                frameKey = frameKeyOf(frameIndex)
+            except Exception as e:
+                logging.debug(f"Could not compute the key of frame {frameValue}: {e}")
+        reused = frameKey is not None and frameKey in resultsByFrameKey
+        if reused:
+            segmentResults = resultsByFrameKey[frameKey]
+        else:
+            segmentResults = yield from computeFrame(frameIndex)
+            if frameKey is not None:
+                resultsByFrameKey[frameKey] = segmentResults
+        frameResults.append((frameIndex, frameValue, segmentResults))
+        if onFrameDone is not None:
+            onFrameDone(frameIndex, reused)
+    return frameResults
+
+
+def write_frames_csv(frameResults, outputPath, volumeId, appendMode=False, intervalColumn=False):
+    """
+    Write the frames of a sequence ((frameIndex, frameValue, segmentResults) list) to a results CSV file as one group
+    with the ID volumeId. In append mode, the frames of a sequence with the same ID are replaced.
+    """
+    try:
+        csvWriter, intervalColumn = open_checkpointed_csv(outputPath, appendMode, intervalColumn, resume=False,
+                                                          frameColumns=True)
+        csvWriter.add_case(volumeId, frame_rows(volumeId, frameResults, intervalColumn))
+        csvWriter.finish()
+    except IOError as e:
+        raise IOError(f"Could not write to file {outputPath}: {e}")
@@ -0,0 +1,284 @@
+"""
+Sharded export of large cohorts on several nodes, and deterministic merge of the shard outputs.
+
+Each case is assigned to one of shardCount shards by a stable hash of its case ID (volume ID), so every node
+selects the same subset from the same inputs regardless of file listing order. A shard writes a normal results
+CSV file sorted by case ID (output.shard-002-of-008.csv) and, when it is complete, a manifest
+(output.shard-002-of-008.csv.shard.json) with the cases assigned to it and the ones without rows.
+merge_shards() combines the shard files in case ID order into the output file (and optionally a columnar file),
+reading them one case at a time, and reports missing shards, missing cases and duplicate cases.
+
+Usage:
+    python -m SliceStatLib.Sharding <output.csv> [shard files...] [--columnar {parquet,feather,npz}] [--allow-incomplete]
+                                    [--index]
+
+Without shard files, the shards of the output file are found next to it.
+"""
+import argparse
+import csv
+import glob
+import heapq
+import json
+import logging
+import os
+import re
+import sys
+import zlib
+
+from .CohortIndexDb import build_index
+from .Columnar import COLUMNAR_FORMATS, DEFAULT_CHUNK_SIZE, ColumnarWriter, columnar_path
+from .CsvExport import iter_csv_groups, segment_results_from_rows
+
+SHARD_VERSION = 1
+
+_SHARD_PATTERN = re.compile(r'\.shard-(\d+)-of-(\d+)\.csv$')
+
+
+def shard_of(volumeId, shardCount):
+    """
+    Get the shard index (0 to shardCount - 1) of a case. It only depends on the case ID.
+    """
+    return zlib.crc32(str(volumeId).encode('utf-8')) % shardCount
+
+
+def check_shard(shardIndex, shardCount):
+    if shardCount < 1 or not 0 <= shardIndex < shardCount:
+        raise ValueError(f"Invalid shard {shardIndex} of {shardCount}, the shard index must be 0 to {shardCount - 1}.")
+
+
+def shard_path(outputPath, shardIndex, shardCount):
+    """
+    Get the path of the CSV file of a shard, e.g. output.csv -> output.shard-002-of-008.csv.
+    """
+    basePath, extension = os.path.splitext(outputPath)
+    if extension.lower() != '.csv':
+        basePath = outputPath
+    return f"{basePath}.shard-{shardIndex:03d}-of-{shardCount:03d}.csv"
+
+
+def shard_manifest_path(shardPath):
+    return shardPath + '.shard.json'
+
+
+def find_shards(outputPath):
+    """
+    Get the paths of the shard CSV files of an output file, sorted by shard count and index.
+    """
+    basePath, extension = os.path.splitext(outputPath)
+    if extension.lower() != '.csv':
+        basePath = outputPath
+    shardPaths = [path for path in glob.glob(glob.escape(basePath) + '.shard-*-of-*.csv') if _SHARD_PATTERN.search(path)]
+    return sorted(shardPaths, key=lambda path: tuple(int(number) for number in reversed(_SHARD_PATTERN.search(path).groups())))
+
+
+def write_shard_manifest(shardPath, shardIndex, shardCount, header, assignedIds, skippedIds=(), failedCases=None):
+    """
+    Write the manifest of a completed shard: the IDs of the cases assigned to it, of the ones without
+    segments (skippedIds) and {volumeId: error message} of the ones that failed.
+    """
+    manifest = {
+        'version': SHARD_VERSION,
+        'shardIndex': shardIndex,
+        'shardCount': shardCount,
+        'header': list(header),
+        'assigned': list(assignedIds),
+        'skipped': sorted(skippedIds),
+        'failed': dict(failedCases or {}),
+    }
+    manifestPath = shard_manifest_path(shardPath)
+    tempPath = manifestPath + '.tmp'
+    with open(tempPath, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tempPath, manifestPath)
+
+
+def read_shard_manifest(shardPath):
+    """
+    Read the manifest of a shard. Raises ValueError if the shard is not complete or the manifest is invalid.
+    """
+    manifestPath = shard_manifest_path(shardPath)
+    if not os.path.exists(manifestPath):
+        raise ValueError(f"Shard {shardPath} is not complete, it has no manifest {manifestPath}.")
+    try:
+        with open(manifestPath, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != SHARD_VERSION:
+            raise ValueError(f"unsupported version {manifest.get('version')}")
+        check_shard(int(manifest['shardIndex']), int(manifest['shardCount']))
+        manifest['assigned'] = [str(volumeId) for volumeId in manifest['assigned']]
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Could not read shard manifest {manifestPath}: {e}")
+    return manifest
+
+
+def _iter_shard_groups(shardPath, shardNumber):
+    """
+    Iterate over (volumeId, shardNumber, rows) of a shard CSV file, checking that cases are sorted by ID.
+    """
+    with open(shardPath, 'r', newline='', encoding='utf-8-sig') as csvfile:
+        next(csv.reader(csvfile), None)
+        previousId = None
+        for volumeId, rows in iter_csv_groups(csvfile):
+            if volumeId is None:
+                raise ValueError(f"Shard {shardPath} has rows without an ID before its first case.")
+            if previousId is not None and volumeId <= previousId:
+                raise ValueError(f"Shard {shardPath} is not sorted by case ID ('{volumeId}' after '{previousId}').")
+            previousId = volumeId
+            yield volumeId, shardNumber, rows
+
+
+def _case_values(rows):
+    # Rows without the ID cell, to compare the results of a case written by two shards
+    return [row[1:] for row in rows]
+
+
+def merge_shards(outputPath, shardPaths=None, columnarFormat=None, allowIncomplete=False, cohortIndex=False,
+                 chunkSize=DEFAULT_CHUNK_SIZE):
+    """
+    Merge the shard CSV files of an export into outputPath (Multi Sample CSV layout), with cases in ID order.
+    Without shardPaths, the shards of outputPath are found next to it (see find_shards).
+    If columnarFormat is set ('parquet', 'feather' or 'npz'), the results are also written to a columnar file.
+    Raises ValueError if shards have different headers or shard counts, or if a case is written by two shards
+    with different results. Missing shards and cases that are assigned to a shard but have no rows and were
+    not skipped are errors too, unless allowIncomplete is set; they are then reported in the warnings.
+    Cases that failed in a shard and identical duplicates are reported in the warnings.
+    If cohortIndex is set, the cohort index of outputPath (e.g. output_index.sqlite) is rebuilt from the merged file.
+    Returns the list of warnings.
+    """
+    shardPaths = list(shardPaths) if shardPaths else find_shards(outputPath)
+    if not shardPaths:
+        raise ValueError(f"No shards of {outputPath} were found.")
+
+    warnings = []
+    problems = []
+    manifests = []
+    shardNumbers = {}
+    for shardPath in shardPaths:
+        try:
+            manifest = read_shard_manifest(shardPath)
+        except ValueError as e:
+            problems.append(str(e))
+            continue
+        if not os.path.exists(shardPath):
+            problems.append(f"Shard file {shardPath} is missing.")
+            continue
+        shardKey = (manifest['shardIndex'], manifest['shardCount'])
+        if shardKey in shardNumbers:
+            raise ValueError(f"Shard {shardKey[0]} of {shardKey[1]} is given twice ({shardPath}).")
+        shardNumbers[shardKey] = len(manifests)
+        manifests.append((shardPath, manifest))
+    if not manifests:
+        raise ValueError("; ".join(problems) or f"No complete shards of {outputPath} were found.")
+
+    header = manifests[0][1]['header']
+    shardCount = manifests[0][1]['shardCount']
+    for shardPath, manifest in manifests:
+        if manifest['header'] != header:
+            raise ValueError(f"Shard {shardPath} has different columns: {manifest['header']} instead of {header}.")
+        if manifest['shardCount'] != shardCount:
+            raise ValueError(f"Shard {shardPath} is one of {manifest['shardCount']} shards, other shards are of {shardCount}.")
+    missingShards = sorted(set(range(shardCount)) - {manifest['shardIndex'] for _, manifest in manifests})
+    if missingShards:
+        problems.append(f"Shards {', '.join(map(str, missingShards))} of {shardCount} are missing.")
+
+    # Cases assigned to each shard; a case assigned to several shards is only expected from one of them
+    assignedShards = {}
+    for shardNumber, (shardPath, manifest) in enumerate(manifests):
+        for volumeId in manifest['assigned']:
+            assignedShards.setdefault(volumeId, []).append(shardNumber)
+        for volumeId, errorMessage in manifest['failed'].items():
+            warnings.append(f"Volume '{volumeId}' failed in shard {manifest['shardIndex']}: {errorMessage}")
+    for volumeId, shardNumbersOfCase in assignedShards.items():
+        if len(shardNumbersOfCase) > 1:
+            warnings.append(f"Volume '{volumeId}' is assigned to shards "
+                            f"{', '.join(str(manifests[number][1]['shardIndex']) for number in shardNumbersOfCase)}")
+    expectedIds = {volumeId for volumeId in assignedShards}
+    for _, manifest in manifests:
+        expectedIds -= set(manifest['skipped']) | set(manifest['failed'])
+
+    # K-way merge of the sorted shard files, a duplicate case comes from the shards one after the other
+    tempPath = outputPath + '.tmp'
+    writtenIds = set()
+    columnarWriter = None
+    columnarOutputPath = columnar_path(outputPath, columnarFormat) if columnarFormat else None
+    try:
+        if columnarFormat:
+            columnarWriter = ColumnarWriter(columnarOutputPath + '.tmp', columnarFormat)
+        columnarChunk = {}
+        with open(tempPath, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(header)
+            previousId = None
+            previousValues = None
+            shardGroups = [_iter_shard_groups(shardPath, shardNumber) for shardNumber, (shardPath, _) in enumerate(manifests)]
+            for volumeId, shardNumber, rows in heapq.merge(*shardGroups, key=lambda group: (group[0], group[1])):
+                shardIndex = manifests[shardNumber][1]['shardIndex']
+                if volumeId not in assignedShards:
+                    warnings.append(f"Volume '{volumeId}' in shard {shardIndex} is not assigned to any shard")
+                if volumeId == previousId:
+                    if _case_values(rows) != previousValues:
+                        raise ValueError(f"Volume '{volumeId}' is written by several shards with different results "
+                                         f"(shard {shardIndex}).")
+                    warnings.append(f"Volume '{volumeId}' is written by several shards, shard {shardIndex} is skipped")
+                    continue
+                previousId = volumeId
+                previousValues = _case_values(rows)
+                writer.writerows(rows)
+                writtenIds.add(volumeId)
+                if columnarWriter is not None:
+                    columnarChunk[volumeId] = segment_results_from_rows(rows)
+                    if len(columnarChunk) >= chunkSize:
+                        columnarWriter.write(columnarChunk)
+                        columnarChunk = {}
+        if columnarWriter is not None:
+            columnarWriter.write(columnarChunk)
+            columnarWriter.close()
+    except BaseException:
+        if columnarWriter is not None:
+            columnarWriter.close()
+        for path in (tempPath, columnarOutputPath + '.tmp' if columnarOutputPath else None):
+            if path and os.path.exists(path):
+                os.remove(path)
+        raise
+
+    missingIds = sorted(expectedIds - writtenIds)
+    if missingIds:
+        problems.append(f"{len(missingIds)} assigned volumes have no results: {', '.join(missingIds[:10])}"
+                        + (", ..." if len(missingIds) > 10 else ""))
+    if problems and not allowIncomplete:
+        os.remove(tempPath)
+        if columnarOutputPath:
+            os.remove(columnarOutputPath + '.tmp')
+        raise ValueError("Shards are incomplete: " + " ".join(problems))
+    warnings = problems + warnings
+
+    os.replace(tempPath, outputPath)
+    if columnarOutputPath:
+        os.replace(columnarOutputPath + '.tmp', columnarOutputPath)
+    if cohortIndex:
+        build_index(outputPath)
+    logging.info(f"Merged {len(writtenIds)} volumes from {len(manifests)} shards into {outputPath}")
+    return warnings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the shard CSV files of a sharded export into one output file.")
+    parser.add_argument("output", help="Output CSV file")
+    parser.add_argument("shards", nargs="*", help="Shard CSV files (default: the shards of the output file next to it)")
+    parser.add_argument("--columnar", choices=sorted(COLUMNAR_FORMATS),
+                        help="Also write the results to a columnar file next to the CSV file")
+    parser.add_argument("--allow-incomplete", action="store_true",
+                        help="Merge even if shards or cases are missing, and report them as warnings")
+    parser.add_argument("--index", action="store_true",
+                        help="Also build a SQLite cohort index next to the CSV file (e.g. output_index.sqlite)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    warnings = merge_shards(args.output, args.shards, args.columnar, args.allow_incomplete, args.index)
+    for warning in warnings:
+        logging.warning(warning)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Per-slice voxel count and area statistics of segments along the three index axes of the reference volume.
+"""
+import csv
+import os
+
+import numpy as np
+
+# Index axes of the reference volume, in the order of the statistics arrays
+AXES = ('K', 'J', 'I')
+
+STATISTICS_HEADER = ['ID', 'SegmentName', 'Axis', 'Slice', 'VoxelCount', 'Area_mm2']
+
+
+class SliceStatistics:
+    """
+    Per-slice voxel counts of one segment along the K, J and I axes of the reference volume,
+    with the reference voxel spacing (I, J, K order, in mm) for physical areas.
+    """
+
+    def __init__(self, kCounts, jCounts, iCounts, spacing):
+        self.counts = {
+            'K': np.asarray(kCounts, dtype=np.int64),
+            'J': np.asarray(jCounts, dtype=np.int64),
+            'I': np.asarray(iCounts, dtype=np.int64),
+        }
+        self.spacing = tuple(float(value) for value in spacing)
+
+    @classmethod
+    def from_label_counts(cls, axisCounts, labelValue, spacing):
+        """
+        Get the statistics of one label from (kCounts, jCounts, iCounts) label histograms (see axis_label_counts).
+        """
+        kCounts, jCounts, iCounts = axisCounts
+        return cls(kCounts[:, labelValue], jCounts[:, labelValue], iCounts[:, labelValue], spacing)
+
+    def voxel_counts(self, axis='K'):
+        """Number of segment voxels in each slice along an axis."""
+        return self.counts[axis]
+
+    def pixel_area(self, axis='K'):
+        """Area of one voxel in a slice along an axis, in mm²."""
+        spacingI, spacingJ, spacingK = self.spacing
+        return {'K': spacingI * spacingJ, 'J': spacingI * spacingK, 'I': spacingJ * spacingK}[axis]
+
+    def areas(self, axis='K'):
+        """Segment area in each slice along an axis, in mm²."""
+        return self.counts[axis] * self.pixel_area(axis)
+
+    def extent(self, axis='K'):
+        """First and last slice along an axis that contain the segment, or None if the segment is empty."""
+        slices = np.flatnonzero(self.counts[axis])
+        if slices.size == 0:
+            return None
+        return int(slices[0]), int(slices[-1])
+
+    @property
+    def voxelCount(self):
+        return int(self.counts['K'].sum())
+
+    @property
+    def volume(self):
+        """Segment volume in mm³."""
+        return self.voxelCount * float(np.prod(self.spacing))
+
+
+def statistics_path(outputPath):
+    """
+    Get the path of the statistics side table of an output CSV file, e.g. output.csv -> output_stats.csv.
+    """
+    basePath, extension = os.path.splitext(outputPath)
+    if extension.lower() != '.csv':
+        basePath = outputPath
+    return basePath + '_stats.csv'
+
+
+def statistics_rows(volumeId, segmentStatistics):
+    """
+    Get the side table rows of one volume: one row per non-empty slice of each segment on each axis.
+    Unlike the main CSV, every row has its ID.
+    """
+    rows = []
+    for segmentName, statistics in segmentStatistics.items():
+        for axis in AXES:
+            counts = statistics.voxel_counts(axis)
+            pixelArea = statistics.pixel_area(axis)
+            for sliceIndex in np.flatnonzero(counts).tolist():
+                voxelCount = int(counts[sliceIndex])
+                rows.append([volumeId, segmentName, axis, sliceIndex, voxelCount, round(voxelCount * pixelArea, 6)])
+    return rows
+
+
+def write_statistics_csv(allStatistics, outputPath, appendMode=False):
+    """
+    Write {volumeId: {segmentName: SliceStatistics}} to a statistics side table.
+    In append mode, rows of volumes that are in allStatistics are replaced, other rows are kept.
+    """
+    existingRows = []
+    if appendMode and os.path.exists(outputPath):
+        with open(outputPath, 'r', newline='', encoding='utf-8-sig') as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader, None)
+            existingRows = [row for row in reader if row and row[0] not in allStatistics]
+
+    tempPath = outputPath + '.tmp'
+    with open(tempPath, 'w', newline='', encoding='utf-8-sig') as csvfile:
+        writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(STATISTICS_HEADER)
+        writer.writerows(existingRows)
+        for volumeId, segmentStatistics in allStatistics.items():
+            writer.writerows(statistics_rows(volumeId, segmentStatistics))
+    os.replace(tempPath, outputPath)
@@ -0,0 +1,69 @@
+"""
+Bounded-memory slice presence for segmentation and labelmap files.
+The voxels are decompressed and scanned slab by slab, so files larger than the available memory
+can be processed; only one slab (at most memoryBudget bytes of voxels) is held at a time.
+"""
+from .FileIO import read_labelmap_header
+from .Intervals import SliceIntervals, slice_result
+from .Presence import ReferenceSliceLabelCounter
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+
+def segmentation_slice_indices(segmentationFile, referenceIjkToRas, referenceDimensions,
+                               memoryBudget=DEFAULT_MEMORY_BUDGET, asIntervals=False):
+    """
+    Stream a .seg.nrrd file (SegmentationFile) and compute the slice indices of each segment
+    in the K index space of a reference geometry of referenceDimensions (I, J, K).
+    All layers are scanned in the same pass; each slab is clipped to the reference volume.
+    Returns {segmentId: [slice indices]}, or {segmentId: SliceIntervals} if asIntervals is set.
+    """
+    segmentationIjkToRas = segmentationFile.ijk_to_ras()
+    counters = {}
+    for layerIndex in range(segmentationFile.numberOfLayers):
+        layerSegments = [segment for segment in segmentationFile.segments if segment.layer == layerIndex]
+        if not layerSegments:
+            continue
+        maxLabel = max(segment.labelValue for segment in layerSegments)
+        counters[layerIndex] = ReferenceSliceLabelCounter(
+            maxLabel, segmentationIjkToRas, referenceIjkToRas, referenceDimensions)
+
+    if counters:
+        for firstSlice, layerSlabs in segmentationFile.iter_layer_slabs(memoryBudget):
+            for layerIndex, counter in counters.items():
+                counter.add_slab(layerSlabs[layerIndex], firstSlice)
+
+    sliceIndicesBySegment = {}
+    for segment in segmentationFile.segments:
+        counter = counters.get(segment.layer)
+        if counter is None:
+            sliceIndicesBySegment[segment.segmentId] = SliceIntervals() if asIntervals else []
+            continue
+        sliceIndicesBySegment[segment.segmentId] = slice_result(counter.counts[:, segment.labelValue] > 0, asIntervals)
+    return sliceIndicesBySegment
+
+
+def labelmap_slice_indices(labelmapPath, labelValues, referenceIjkToRas=None, referenceDimensions=None,
+                           memoryBudget=DEFAULT_MEMORY_BUDGET, asIntervals=False):
+    """
+    Stream a labelmap volume file (.nii.gz, .nii or .nrrd) and compute the slice indices of each label value.
+    Slice indices are in the K index space of the reference geometry of referenceDimensions (I, J, K),
+    or of the labelmap itself if no reference geometry is given. Voxels outside the reference volume are not counted.
+    Returns {labelValue: [slice indices]}, or {labelValue: SliceIntervals} if asIntervals is set.
+    """
+    header = read_labelmap_header(labelmapPath)
+    labelmapIjkToRas = header.ijk_to_ras()
+    if referenceIjkToRas is None:
+        referenceIjkToRas = labelmapIjkToRas
+        referenceDimensions = header.dimensions
+
+    labelValues = [int(labelValue) for labelValue in labelValues]
+    maxLabel = max(labelValues) if labelValues else 0
+    counter = ReferenceSliceLabelCounter(maxLabel, labelmapIjkToRas, referenceIjkToRas, referenceDimensions)
+    for firstSlice, slab in header.iter_slabs(memoryBudget):
+        counter.add_slab(slab, firstSlice)
+
+    sliceIndicesByLabel = {}
+    for labelValue in labelValues:
+        sliceIndicesByLabel[labelValue] = slice_result(counter.counts[:, labelValue] > 0, asIntervals)
+    return sliceIndicesByLabel
@@ -0,0 +1,63 @@
+"""
+Slice presence of closed surface meshes, without rasterizing them to a labelmap.
+
+A slice of the reference volume contains a surface if the plane through its voxel centers (K = slice index)
+intersects one of the mesh polygons. For a closed surface this is the set of planes that cut the enclosed
+volume, so it matches the rasterized labelmap except for parts thinner than a voxel between two planes.
+Exact voxel semantics require rasterization.
+"""
+import numpy as np
+
+
+def ijk_bounds(bounds, rasToIjk):
+    """
+    Get the (min, max) IJK coordinates, each an array of 3 values, of an RAS bounding box
+    (xmin, xmax, ymin, ymax, zmin, zmax) projected into the index space of a volume.
+    """
+    rasToIjk = np.asarray(rasToIjk, dtype=float)
+    corners = np.array([[x, y, z, 1.0] for x in bounds[0:2] for y in bounds[2:4] for z in bounds[4:6]])
+    cornersIjk = corners @ rasToIjk[:3].T
+    return cornersIjk.min(axis=0), cornersIjk.max(axis=0)
+
+
+def surface_slice_presence(points, cellOffsets, cellConnectivity, rasToIjk, referenceDimensions):
+    """
+    Get the boolean presence of a surface mesh in each K slice of a reference volume.
+    points: (N, 3) RAS coordinates. cellOffsets, cellConnectivity: polygons as in vtkCellArray,
+    points of cell c are cellConnectivity[cellOffsets[c]:cellOffsets[c + 1]].
+    rasToIjk: 4x4 matrix of the reference volume. referenceDimensions: (I, J, K) size of the reference volume.
+    Polygons are not clipped in the slice plane; the mesh is only checked against the whole reference box.
+    """
+    numberOfSlices = referenceDimensions[2]
+    presence = np.zeros(numberOfSlices, dtype=bool)
+    points = np.asarray(points, dtype=float)
+    cellOffsets = np.asarray(cellOffsets, dtype=np.intp)
+    if numberOfSlices == 0 or len(points) == 0 or len(cellOffsets) < 2:
+        return presence
+
+    # Quick rejection from the bounds of the mesh projected into the reference index space
+    minimumIjk, maximumIjk = ijk_bounds([points[:, 0].min(), points[:, 0].max(), points[:, 1].min(), points[:, 1].max(),
+                                         points[:, 2].min(), points[:, 2].max()], rasToIjk)
+    if np.any(maximumIjk < -0.5) or np.any(minimumIjk > np.asarray(referenceDimensions) - 0.5):
+        return presence
+
+    # K coordinate of each point, then the K range of each non-empty polygon
+    rasToIjk = np.asarray(rasToIjk, dtype=float)
+    pointK = points @ rasToIjk[2, :3] + rasToIjk[2, 3]
+    cellK = pointK[np.asarray(cellConnectivity, dtype=np.intp)]
+    cellSizes = np.diff(cellOffsets)
+    starts = cellOffsets[:-1][cellSizes > 0]
+    if len(starts) == 0:
+        return presence
+    firstSlices = np.ceil(np.minimum.reduceat(cellK, starts)).astype(np.int64)
+    lastSlices = np.floor(np.maximum.reduceat(cellK, starts)).astype(np.int64)
+
+    # Mark the slice ranges of all polygons at once with a difference array
+    firstSlices = np.clip(firstSlices, 0, numberOfSlices)
+    lastSlices = np.clip(lastSlices, -1, numberOfSlices - 1)
+    crossing = firstSlices <= lastSlices
+    rangeChanges = np.zeros(numberOfSlices + 1, dtype=np.int64)
+    np.add.at(rangeChanges, firstSlices[crossing], 1)
+    np.add.at(rangeChanges, lastSlices[crossing] + 1, -1)
+    presence[:] = np.cumsum(rangeChanges[:-1]) > 0
+    return presence
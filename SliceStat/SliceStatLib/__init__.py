@@ -0,0 +1,62 @@
+"""
+Slicer independent helpers of the SliceStat module.
+Only numpy and the standard library are required, so these can be used in batch scripts
+and worker processes without starting Slicer.
+
+Submodules are imported on first use of one of their names, so importing a single submodule
+(e.g. SliceStatLib.Core in a worker process) does not import the others.
+"""
+import importlib
+
+# Names exported by each submodule
+_EXPORTS = {
+    'Presence': ['slice_label_counts', 'axis_label_counts', 'slice_presence', 'place_slice_counts', 'crop_to_reference',
+                 'slice_index_transform', 'integer_index_offset', 'reference_slice_label_counts', 'ReferenceSliceLabelCounter',
+                 'group_by_layer'],
+    'Matching': ['volume_base_name', 'select_matching_segmentation', 'SegmentationIndex', 'MatchResult', 'format_match_diagnostic',
+                 'match_volumes'],
+    'Surface': ['ijk_bounds', 'surface_slice_presence'],
+    'Intervals': ['SliceIntervals', 'slice_result', 'format_intervals'],
+    'CsvExport': ['CSV_HEADER', 'INTERVALS_COLUMN', 'FRAME_COLUMNS', 'csv_header', 'segment_rows', 'frame_rows',
+                  'segment_results_from_rows', 'iter_csv_groups', 'read_csv_header', 'read_csv_groups', 'write_csv', 'write_csv_all'],
+    'Checkpoint': ['CheckpointedCsvWriter', 'open_checkpointed_csv', 'checkpoint_path', 'partial_path'],
+    'CohortIndexDb': ['INDEX_VERSION', 'CohortIndex', 'index_path', 'write_index', 'build_index'],
+    'Sharding': ['SHARD_VERSION', 'shard_of', 'check_shard', 'shard_path', 'find_shards', 'write_shard_manifest',
+                 'read_shard_manifest', 'merge_shards'],
+    'Columnar': ['COLUMNAR_FORMATS', 'ColumnarWriter', 'columnar_path', 'write_columnar', 'read_columnar', 'iter_columnar_chunks'],
+    'Aggregates': ['SUMMARY_HEADER', 'QuantileSketch', 'SegmentAggregate', 'CohortAggregates', 'summary_path'],
+    'Statistics': ['AXES', 'STATISTICS_HEADER', 'SliceStatistics', 'statistics_path', 'statistics_rows', 'write_statistics_csv'],
+    'MemoryCache': ['DEFAULT_EXTRACTION_CACHE_SIZE', 'ExtractionCache', 'extraction_key'],
+    'Live': ['LiveSliceCounts', 'box_slice_range', 'changed_box'],
+    'Masks': ['SliceMask', 'PresenceMaskStore', 'bit_count', 'packed_length', 'masks_path', 'write_case_masks'],
+    'Progress': ['ExportCancelled', 'ExportProgress', 'run_to_completion', 'format_duration'],
+    'Profiling': ['TRACE_VERSION', 'ExportProfiler', 'timed_call', 'trace_path'],
+    'FileIO': ['NrrdHeader', 'NiftiHeader', 'SegmentationFile', 'SegmentInfo', 'read_labelmap_header'],
+    'Streaming': ['DEFAULT_MEMORY_BUDGET', 'segmentation_slice_indices', 'labelmap_slice_indices'],
+    'Pipeline': ['DEFAULT_PREFETCH_CASES', 'DEFAULT_PREFETCH_MEMORY', 'ByteBudget', 'CasePrefetcher', 'ResultWriter'],
+    'Core': ['label_slice_results', 'case_on_reference_grid', 'process_case', 'process_loaded_case'],
+    'DiskCache': ['CACHE_VERSION', 'DEFAULT_CACHE_SIZE', 'SCENE_EXTRACTION', 'FILE_EXTRACTION', 'ResultCache',
+                  'file_key', 'geometry_key', 'content_key', 'make_key', 'case_key'],
+    'Sequence': ['process_frames_steps', 'write_frames_csv'],
+    'Export': ['VOLUME_EXTENSIONS', 'SEGMENTATION_EXTENSIONS', 'create_process_pool', 'file_backed_case_paths', 'worker_case_paths',
+               'process_cases_steps', 'CohortExport', 'export_cases_steps'],
+}
+
+_MODULE_OF_NAME = {name: moduleName for moduleName, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_MODULE_OF_NAME)
+
+
+def __getattr__(name):
+    moduleName = _MODULE_OF_NAME.get(name)
+    if moduleName is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module('.' + moduleName, __name__), name)
+    # Later lookups do not go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
@@ -0,0 +1,349 @@
+"""
+Benchmark suite of the SliceStat computations.
+
+Synthetic segmentations are generated over a parameter grid (volume size, segment count, sparsity,
+shared or separate binary labelmap layers) with a fixed random seed, and the following are timed:
+
+- segmentation: per-slice label histograms of in-memory labelmaps, the voxel work of
+  SliceStatLogic.process_segmentation (one pass per shared layer, one pass per segment otherwise)
+- file: streaming a .seg.nrrd file against a .nii.gz reference, as done by headless batch export
+  and the Multi Sample worker processes (SliceStatLib.Core.process_case)
+- write_csv, write_csv_all: the CSV writers, including the in-place update of an existing file
+- matching: the volume/segmentation matching step of run_export_all (SliceStatLib.SegmentationIndex)
+
+Throughput (voxels/s, cases/min) and peak traced memory are recorded. Results are compared with a
+stored baseline, the run fails if a benchmark is slower than the baseline by more than the threshold.
+Baselines are machine specific, update them with --update-baseline after a deliberate change.
+
+Only numpy is required, Slicer is not started.
+
+Usage:
+    python SliceStatBenchmark.py [--quick] [--repeat N] [--baseline PATH] [--update-baseline]
+                                 [--threshold FRACTION] [--output PATH]
+"""
+import argparse
+import gzip
+import itertools
+import json
+import os
+import platform
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import SliceStatLib  # noqa: E402
+from SliceStatLib.Core import process_case  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SliceStatBenchmarkBaseline.json")
+DEFAULT_THRESHOLD = 0.25
+# Differences below this are timer noise, not regressions
+MIN_REGRESSION_SECONDS = 0.001
+SEED = 20240101
+
+# Parameter grids: volume shape (K, J, I), number of segments, fraction of slices covered by each segment
+FULL_GRID = {
+    'shape': [(64, 128, 128), (128, 256, 256)],
+    'segments': [1, 5, 20],
+    'sparsity': [0.05, 0.5],
+    'layers': ['shared', 'separate'],
+}
+QUICK_GRID = {
+    'shape': [(32, 64, 64)],
+    'segments': [1, 5],
+    'sparsity': [0.05, 0.5],
+    'layers': ['shared', 'separate'],
+}
+FULL_CASES = {'volumes': 2000, 'segments': 10, 'slices': 200}
+QUICK_CASES = {'volumes': 200, 'segments': 5, 'slices': 64}
+
+
+#
+# Synthetic data
+#
+
+def make_segmentation(shape, numberOfSegments, sparsity, layers, rng):
+    """
+    Create a synthetic segmentation: a list of (labelArray, labelValues) layers.
+    Each segment is a random box covering about sparsity of the slices.
+    Shared: one layer with label values 1..n (later segments overwrite earlier ones, as in a shared layer).
+    Separate: one binary layer per segment.
+    """
+    numberOfSlices, numberOfRows, numberOfColumns = shape
+    boxes = []
+    for _ in range(numberOfSegments):
+        sliceCount = max(1, int(round(numberOfSlices * sparsity)))
+        firstSlice = rng.integers(0, numberOfSlices - sliceCount + 1)
+        rowCount = rng.integers(numberOfRows // 8, numberOfRows // 2 + 1)
+        columnCount = rng.integers(numberOfColumns // 8, numberOfColumns // 2 + 1)
+        firstRow = rng.integers(0, numberOfRows - rowCount + 1)
+        firstColumn = rng.integers(0, numberOfColumns - columnCount + 1)
+        boxes.append((slice(firstSlice, firstSlice + sliceCount), slice(firstRow, firstRow + rowCount),
+                      slice(firstColumn, firstColumn + columnCount)))
+
+    if layers == 'shared':
+        labelArray = np.zeros(shape, dtype=np.uint8)
+        for labelValue, box in enumerate(boxes, start=1):
+            labelArray[box] = labelValue
+        return [(labelArray, list(range(1, numberOfSegments + 1)))]
+
+    segmentLayers = []
+    for box in boxes:
+        labelArray = np.zeros(shape, dtype=np.uint8)
+        labelArray[box] = 1
+        segmentLayers.append((labelArray, [1]))
+    return segmentLayers
+
+
+def write_nifti(path, shape):
+    """
+    Write an empty uint8 NIfTI-1 volume with identity geometry; shape is (K, J, I).
+    """
+    header = bytearray(348)
+    struct.pack_into('<i', header, 0, 348)
+    struct.pack_into('<8h', header, 40, 3, shape[2], shape[1], shape[0], 1, 1, 1, 1)
+    struct.pack_into('<h', header, 70, 2)
+    struct.pack_into('<h', header, 72, 8)
+    struct.pack_into('<8f', header, 76, 1, 1, 1, 1, 1, 1, 1, 1)
+    struct.pack_into('<f', header, 108, 352)
+    struct.pack_into('<2h', header, 252, 0, 1)
+    struct.pack_into('<12f', header, 280, 1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0)
+    header[344:348] = b'n+1\0'
+    with gzip.open(path, 'wb', compresslevel=1) as f:
+        f.write(bytes(header) + b'\0' * 4)
+        f.write(np.zeros(shape, dtype=np.uint8).tobytes())
+
+
+def write_segmentation(path, segmentLayers):
+    """
+    Write synthetic layers as a gzip .seg.nrrd file (4D if there are several layers).
+    The geometry matches write_nifti (RAS identity, stored as LPS).
+    """
+    shape = segmentLayers[0][0].shape
+    fields = ["NRRD0004", "type: unsigned char", "endian: little", "encoding: gzip",
+              "space: left-posterior-superior", "space origin: (0,0,0)"]
+    if len(segmentLayers) > 1:
+        voxels = np.stack([labelArray for labelArray, _ in segmentLayers], axis=-1)
+        fields += ["dimension: 4", f"sizes: {len(segmentLayers)} {shape[2]} {shape[1]} {shape[0]}",
+                   "space directions: none (-1,0,0) (0,-1,0) (0,0,1)", "kinds: list domain domain domain"]
+    else:
+        voxels = segmentLayers[0][0]
+        fields += ["dimension: 3", f"sizes: {shape[2]} {shape[1]} {shape[0]}",
+                   "space directions: (-1,0,0) (0,-1,0) (0,0,1)", "kinds: domain domain domain"]
+    segmentIndex = 0
+    for layer, (_, labelValues) in enumerate(segmentLayers):
+        for labelValue in labelValues:
+            fields += [f"Segment{segmentIndex}_ID:=Segment_{segmentIndex}",
+                       f"Segment{segmentIndex}_Name:=Segment {segmentIndex}",
+                       f"Segment{segmentIndex}_LabelValue:={labelValue}",
+                       f"Segment{segmentIndex}_Layer:={layer}"]
+            segmentIndex += 1
+    with open(path, 'wb') as f:
+        f.write(("\n".join(fields) + "\n\n").encode('ascii'))
+        f.write(gzip.compress(np.ascontiguousarray(voxels).tobytes(), compresslevel=1))
+
+
+def make_case_results(numberOfVolumes, numberOfSegments, numberOfSlices, rng):
+    """
+    Create {volumeId: {segmentName: [slice indices]}} results of a synthetic cohort.
+    """
+    allResults = {}
+    for volumeIndex in range(numberOfVolumes):
+        segmentResults = {}
+        for segmentIndex in range(numberOfSegments):
+            first = int(rng.integers(0, numberOfSlices))
+            last = int(rng.integers(first, numberOfSlices))
+            segmentResults[f"Segment {segmentIndex}"] = list(range(first, last + 1))
+        allResults[f"case{volumeIndex:06d}"] = segmentResults
+    return allResults
+
+
+#
+# Measurement
+#
+
+def measure(function, repeat):
+    """
+    Run function repeat times and once more with memory tracing.
+    Returns (best time in seconds, peak traced memory in bytes).
+    """
+    times = []
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peakMemory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peakMemory
+
+
+def segmentation_benchmarks(grid, repeat, rng, workDirectory):
+    results = {}
+    for shape, numberOfSegments, sparsity, layers in itertools.product(
+            grid['shape'], grid['segments'], grid['sparsity'], grid['layers']):
+        if layers == 'separate' and numberOfSegments == 1:
+            # Same as shared
+            continue
+        segmentLayers = make_segmentation(shape, numberOfSegments, sparsity, layers, rng)
+        numberOfVoxels = int(np.prod(shape)) * len(segmentLayers)
+        caseName = f"{shape[0]}x{shape[1]}x{shape[2]}_seg{numberOfSegments}_sp{sparsity:g}_{layers}"
+
+        def process():
+            for labelArray, labelValues in segmentLayers:
+                labelCounts = SliceStatLib.slice_label_counts(labelArray, max(labelValues))
+                for labelValue in labelValues:
+                    SliceStatLib.slice_result(labelCounts[:, labelValue] > 0)
+
+        seconds, peakMemory = measure(process, repeat)
+        results[f"segmentation/{caseName}"] = {
+            'seconds': seconds, 'voxelsPerSecond': numberOfVoxels / seconds, 'peakMemory': peakMemory}
+
+        volumePath = os.path.join(workDirectory, "volume.nii.gz")
+        segmentationPath = os.path.join(workDirectory, "volume.seg.nrrd")
+        write_nifti(volumePath, shape)
+        write_segmentation(segmentationPath, segmentLayers)
+        seconds, peakMemory = measure(lambda: process_case(volumePath, segmentationPath), repeat)
+        results[f"file/{caseName}"] = {
+            'seconds': seconds, 'voxelsPerSecond': numberOfVoxels / seconds,
+            'casesPerMinute': 60.0 / seconds, 'peakMemory': peakMemory}
+    return results
+
+
+def writer_benchmarks(cases, repeat, rng, workDirectory):
+    results = {}
+    allResults = make_case_results(cases['volumes'], cases['segments'], cases['slices'], rng)
+    outputPath = os.path.join(workDirectory, "output.csv")
+    numberOfVolumes = len(allResults)
+
+    seconds, peakMemory = measure(lambda: SliceStatLib.write_csv_all(allResults, outputPath), repeat)
+    results["write_csv_all/new"] = {'seconds': seconds, 'casesPerMinute': 60.0 * numberOfVolumes / seconds,
+                                    'peakMemory': peakMemory}
+
+    # Append mode with all IDs already in the file: in-place update of every group
+    seconds, peakMemory = measure(lambda: SliceStatLib.write_csv_all(allResults, outputPath, appendMode=True), repeat)
+    results["write_csv_all/update"] = {'seconds': seconds, 'casesPerMinute': 60.0 * numberOfVolumes / seconds,
+                                       'peakMemory': peakMemory}
+
+    volumeId, segmentResults = next(iter(allResults.items()))
+    singlePath = os.path.join(workDirectory, "single.csv")
+    seconds, peakMemory = measure(lambda: SliceStatLib.write_csv(segmentResults, singlePath, False, volumeId), repeat)
+    results["write_csv/single"] = {'seconds': seconds, 'casesPerMinute': 60.0 / seconds, 'peakMemory': peakMemory}
+    return results
+
+
+def matching_benchmarks(cases, repeat):
+    numberOfVolumes = cases['volumes']
+    volumeNames = [f"case{index:06d}" for index in range(numberOfVolumes)]
+    # Every volume has a segmentation, every tenth one also a "(final)" version
+    identifiers = [f"{name}.seg.nrrd" for name in volumeNames]
+    identifiers += [f"{name} (final).seg.nrrd" for name in volumeNames[::10]]
+
+    def match():
+        segmentationIndex = SliceStatLib.SegmentationIndex(identifiers)
+        for volumeName in volumeNames:
+            segmentationIndex.match(volumeName)
+
+    seconds, peakMemory = measure(match, repeat)
+    return {"matching/index": {'seconds': seconds, 'casesPerMinute': 60.0 * numberOfVolumes / seconds,
+                               'peakMemory': peakMemory}}
+
+
+#
+# Baseline comparison
+#
+
+def compare_with_baseline(results, baseline, threshold):
+    """
+    Get the list of regressions: (name, baseline seconds, current seconds) of benchmarks
+    that are slower than the baseline by more than threshold (and by more than MIN_REGRESSION_SECONDS).
+    """
+    regressions = []
+    for name, result in results.items():
+        baselineResult = baseline.get(name)
+        if not baselineResult:
+            continue
+        allowedSeconds = max(baselineResult['seconds'] * (1.0 + threshold), baselineResult['seconds'] + MIN_REGRESSION_SECONDS)
+        if result['seconds'] > allowedSeconds:
+            regressions.append((name, baselineResult['seconds'], result['seconds']))
+    return regressions
+
+
+def format_result(name, result):
+    text = f"{name:<55} {result['seconds'] * 1000:10.2f} ms"
+    if 'voxelsPerSecond' in result:
+        text += f" {result['voxelsPerSecond'] / 1e6:10.1f} Mvox/s"
+    if 'casesPerMinute' in result:
+        text += f" {result['casesPerMinute']:12.0f} cases/min"
+    text += f" {result['peakMemory'] / (1024 * 1024):8.1f} MB peak"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SliceStat computations.")
+    parser.add_argument("--quick", action="store_true", help="Use a small parameter grid")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs, the best is kept (default: 3)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown relative to the baseline (default: %(default)g)")
+    parser.add_argument("--output", help="Write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    gridName = 'quick' if args.quick else 'full'
+    grid = QUICK_GRID if args.quick else FULL_GRID
+    cases = QUICK_CASES if args.quick else FULL_CASES
+    rng = np.random.default_rng(SEED)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workDirectory:
+        results.update(segmentation_benchmarks(grid, args.repeat, rng, workDirectory))
+        results.update(writer_benchmarks(cases, args.repeat, rng, workDirectory))
+    results.update(matching_benchmarks(cases, args.repeat))
+
+    for name, result in results.items():
+        print(format_result(name, result))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baselines = json.load(f)
+
+    if args.update_baseline:
+        baselines[gridName] = {
+            'machine': f"{platform.system()} {platform.machine()}, Python {platform.python_version()}, numpy {np.__version__}",
+            'results': results,
+        }
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Baseline '{gridName}' stored in {args.baseline}")
+        return 0
+
+    if gridName not in baselines:
+        print(f"No '{gridName}' baseline in {args.baseline}, run with --update-baseline to create it")
+        return 0
+
+    regressions = compare_with_baseline(results, baselines[gridName]['results'], args.threshold)
+    for name, baselineSeconds, seconds in regressions:
+        print(f"REGRESSION {name}: {baselineSeconds * 1000:.2f} ms -> {seconds * 1000:.2f} ms")
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}")
+        return 1
+    print(f"No regression compared to the '{gridName}' baseline (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Synthetic NIfTI volumes and .seg.nrrd segmentations for the unit tests.
+"""
+import gzip
+import struct
+
+import numpy as np
+
+
+def write_nifti(path, shape, origin=(0.0, 0.0, 0.0), spacing=(1.0, 1.0, 1.0)):
+    """
+    Write an empty uint8 NIfTI-1 volume with axis-aligned RAS geometry (sform); shape is (K, J, I).
+    """
+    header = bytearray(348)
+    struct.pack_into('<i', header, 0, 348)
+    struct.pack_into('<8h', header, 40, 3, shape[2], shape[1], shape[0], 1, 1, 1, 1)
+    struct.pack_into('<h', header, 70, 2)
+    struct.pack_into('<h', header, 72, 8)
+    struct.pack_into('<8f', header, 76, 1, spacing[0], spacing[1], spacing[2], 1, 1, 1, 1)
+    struct.pack_into('<f', header, 108, 352)
+    struct.pack_into('<2h', header, 252, 0, 1)
+    struct.pack_into('<12f', header, 280, spacing[0], 0, 0, origin[0], 0, spacing[1], 0, origin[1],
+                     0, 0, spacing[2], origin[2])
+    header[344:348] = b'n+1\0'
+    with gzip.open(path, 'wb', compresslevel=1) as f:
+        f.write(bytes(header) + b'\0' * 4)
+        f.write(np.zeros(shape, dtype=np.uint8).tobytes())
+
+
+def write_segmentation(path, layers, origin=(0.0, 0.0, 0.0), spacing=(1.0, 1.0, 1.0)):
+    """
+    Write a gzip .seg.nrrd file (4D if there are several layers) with axis-aligned RAS geometry, stored as LPS.
+    layers is a list of (labelArray (K, J, I), {segmentName: labelValue}).
+    """
+    shape = layers[0][0].shape
+    lpsOrigin = (-origin[0], -origin[1], origin[2])
+    directions = f"(-{spacing[0]},0,0) (0,-{spacing[1]},0) (0,0,{spacing[2]})"
+    fields = ["NRRD0004", "type: unsigned char", "endian: little", "encoding: gzip",
+              "space: left-posterior-superior", "space origin: ({},{},{})".format(*lpsOrigin)]
+    if len(layers) > 1:
+        voxels = np.stack([labelArray for labelArray, _ in layers], axis=-1)
+        fields += ["dimension: 4", f"sizes: {len(layers)} {shape[2]} {shape[1]} {shape[0]}",
+                   f"space directions: none {directions}", "kinds: list domain domain domain"]
+    else:
+        voxels = layers[0][0]
+        fields += ["dimension: 3", f"sizes: {shape[2]} {shape[1]} {shape[0]}",
+                   f"space directions: {directions}", "kinds: domain domain domain"]
+    segmentIndex = 0
+    for layer, (_, segments) in enumerate(layers):
+        for segmentName, labelValue in segments.items():
+            fields += [f"Segment{segmentIndex}_ID:=Segment_{segmentIndex}",
+                       f"Segment{segmentIndex}_Name:={segmentName}",
+                       f"Segment{segmentIndex}_LabelValue:={labelValue}",
+                       f"Segment{segmentIndex}_Layer:={layer}"]
+            segmentIndex += 1
+    with open(path, 'wb') as f:
+        f.write(("\n".join(fields) + "\n\n").encode('ascii'))
+        f.write(gzip.compress(np.ascontiguousarray(voxels, dtype=np.uint8).tobytes(), compresslevel=1))
@@ -0,0 +1,122 @@
+"""
+Unit tests of the streaming cohort summary (SliceStatLib.Aggregates).
+
+Only numpy and the standard library are required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Aggregates import SUMMARY_HEADER, CohortAggregates, QuantileSketch, summary_path  # noqa: E402
+from SliceStatLib.Intervals import SliceIntervals  # noqa: E402
+
+
+def nearest_rank(values, q):
+    values = sorted(values)
+    return values[max(int(np.ceil(q * len(values))), 1) - 1]
+
+
+class QuantileSketchTest(unittest.TestCase):
+
+    def test_exact_below_bins(self):
+        rng = np.random.default_rng(0)
+        values = rng.integers(0, 64, 500)
+        sketch = QuantileSketch(64)
+        for value in values:
+            sketch.add(value)
+        self.assertEqual(sketch.binWidth, 1)
+        for q in (0.0, 0.1, 0.5, 0.9, 1.0):
+            self.assertEqual(sketch.quantile(q), nearest_rank(values, q))
+        self.assertIsNone(QuantileSketch(64).quantile(0.5))
+
+    def test_widened_within_bin_width(self):
+        rng = np.random.default_rng(1)
+        values = rng.integers(0, 1000, 500)
+        sketch = QuantileSketch(16)
+        for value in values:
+            sketch.add(value)
+        self.assertGreater(sketch.binWidth, 1)
+        self.assertEqual(sketch.total, len(values))
+        for q in (0.1, 0.5, 0.9):
+            self.assertLessEqual(abs(sketch.quantile(q) - nearest_rank(values, q)), sketch.binWidth)
+
+    def test_merge(self):
+        small = QuantileSketch(16)
+        large = QuantileSketch(16)
+        for value in range(10):
+            small.add(value)
+        for value in range(100, 400, 10):
+            large.add(value)
+        merged = QuantileSketch(16)
+        merged.merge(small)
+        merged.merge(large)
+        direct = QuantileSketch(16)
+        for value in list(range(10)) + list(range(100, 400, 10)):
+            direct.add(value)
+        self.assertEqual(merged.binWidth, direct.binWidth)
+        np.testing.assert_array_equal(merged.counts, direct.counts)
+        self.assertEqual(merged.total, 40)
+        with self.assertRaises(ValueError):
+            merged.merge(QuantileSketch(32))
+
+
+class CohortAggregatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def test_summary(self):
+        aggregates = CohortAggregates()
+        aggregates.add_case({'Liver': [10, 11, 12, 13], 'Tumor': []})
+        aggregates.add_case({'Liver': SliceIntervals.from_indices([5, 6]), 'Tumor': [12]})
+        aggregates.add_case({'Liver': [20, 21, 22, 23, 24, 25]})
+        self.assertEqual(aggregates.numberOfCases, 3)
+        rows = {row[0]: dict(zip(SUMMARY_HEADER, row)) for row in aggregates.summary_rows()}
+        liver = rows['Liver']
+        self.assertEqual((liver['Cases'], liver['EmptyCases']), (3, 0))
+        self.assertEqual((liver['SliceCountMin'], liver['SliceCountMax']), (2, 6))
+        self.assertAlmostEqual(liver['SliceCountMean'], 4.0)
+        self.assertAlmostEqual(liver['SliceCountStd'], round(float(np.std([4, 2, 6])), 3))
+        self.assertEqual(liver['SliceCountMedian'], 4)
+        self.assertEqual((liver['FirstSliceMin'], liver['FirstSliceMax']), (5, 20))
+        self.assertEqual((liver['LastSliceMin'], liver['LastSliceMax']), (6, 25))
+        tumor = rows['Tumor']
+        self.assertEqual((tumor['Cases'], tumor['EmptyCases']), (1, 1))
+        self.assertEqual(tumor['FirstSliceMin'], 12)
+
+    def test_empty_segment_row(self):
+        aggregates = CohortAggregates()
+        aggregates.add_case({'Tumor': []})
+        row = dict(zip(SUMMARY_HEADER, aggregates.summary_rows()[0]))
+        self.assertEqual((row['Cases'], row['EmptyCases']), (0, 1))
+        self.assertEqual((row['SliceCountMean'], row['SliceCountMedian'], row['FirstSliceMin']), ("", "", ""))
+
+    def test_write_csv(self):
+        self.assertEqual(summary_path('/data/output.csv'), '/data/output_summary.csv')
+        self.assertEqual(summary_path('/data/output'), '/data/output_summary.csv')
+        aggregates = CohortAggregates()
+        aggregates.add_case({'Liver': [1, 2]})
+        path = os.path.join(self.tempDir, 'summary.csv')
+        aggregates.write_csv(path)
+        with open(path, newline='', encoding='utf-8-sig') as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual(rows[0], SUMMARY_HEADER)
+        self.assertEqual(rows[1][:3], ['Liver', '1', '0'])
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Unit tests of the checkpointed CSV output of exports (SliceStatLib.Checkpoint).
+
+Only the standard library is required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import csv
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Checkpoint import CheckpointedCsvWriter, checkpoint_path, partial_path  # noqa: E402
+
+HEADER = ['Volume ID', 'Segment', 'Slice Numbers']
+
+
+def case_rows(volumeId, sliceNumbers='1'):
+    return [['\t' + volumeId, 'Liver', sliceNumbers], ['', 'Tumor', '']]
+
+
+class CheckpointedCsvWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.outputPath = os.path.join(self.tempDir.name, 'output.csv')
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def read_output(self):
+        with open(self.outputPath, newline='', encoding='utf-8-sig') as csvfile:
+            return list(csv.reader(csvfile))
+
+    def test_resume(self):
+        writer = CheckpointedCsvWriter(self.outputPath, HEADER, flushCases=2)
+        writer.add_case('case0', case_rows('case0'))
+        writer.skip_case('case1')
+        writer.add_case('case2', case_rows('case2'))
+        # Interrupted before case3 is checkpointed: its rows are in the partial file but not in the checkpoint
+        writer.flush()
+        with open(partial_path(self.outputPath), 'ab') as f:
+            f.write(b'\tcase3,Liver,1\r\n')
+
+        writer = CheckpointedCsvWriter(self.outputPath, HEADER, flushCases=2)
+        self.assertEqual(writer.resumedCases, 3)
+        self.assertEqual(writer.completed, {'case0', 'case1', 'case2'})
+        self.assertEqual(os.path.getsize(partial_path(self.outputPath)), writer.partialSize)
+        writer.add_case('case3', case_rows('case3', '4-5'))
+        self.assertEqual([volumeId for volumeId, _ in writer.iter_cases()], ['case0', 'case2', 'case3'])
+        writer.finish(['case3', 'case2', 'case1', 'case0'])
+
+        self.assertEqual(self.read_output(), [HEADER] + case_rows('case3', '4-5') + case_rows('case2') + case_rows('case0'))
+        self.assertFalse(os.path.exists(partial_path(self.outputPath)))
+        self.assertFalse(os.path.exists(checkpoint_path(self.outputPath)))
+
+    def test_every_case_is_checkpointed(self):
+        # Interrupted without close(): every finished case is in the checkpoint
+        writer = CheckpointedCsvWriter(self.outputPath, HEADER)
+        writer.add_case('case0', case_rows('case0'))
+        writer.skip_case('case1')
+        writer = CheckpointedCsvWriter(self.outputPath, HEADER)
+        self.assertEqual(writer.completed, {'case0', 'case1'})
+
+    def test_different_export_starts_over(self):
+        writer = CheckpointedCsvWriter(self.outputPath, HEADER)
+        writer.add_case('case0', case_rows('case0'))
+        writer.close()
+        self.assertEqual(CheckpointedCsvWriter(self.outputPath, HEADER, appendMode=True).completed, set())
+        writer = CheckpointedCsvWriter(self.outputPath, HEADER)
+        writer.add_case('case0', case_rows('case0'))
+        writer.close()
+        self.assertEqual(CheckpointedCsvWriter(self.outputPath, HEADER, resume=False).completed, set())
+
+    def test_append(self):
+        writer = CheckpointedCsvWriter(self.outputPath, HEADER)
+        writer.add_case('case0', case_rows('case0'))
+        writer.add_case('case1', case_rows('case1'))
+        writer.finish()
+
+        keptCases = []
+        writer = CheckpointedCsvWriter(self.outputPath, HEADER, appendMode=True)
+        writer.add_case('case2', case_rows('case2'))
+        writer.add_case('case0', case_rows('case0', '7'))
+        writer.finish(onKeptCase=lambda volumeId, rows: keptCases.append(volumeId))
+
+        # Rewritten cases are replaced in place, new cases are appended
+        self.assertEqual(self.read_output(), [HEADER] + case_rows('case0', '7') + case_rows('case1') + case_rows('case2'))
+        self.assertEqual(keptCases, ['case1'])
+
+        # A case processed again without rows is removed
+        writer = CheckpointedCsvWriter(self.outputPath, HEADER, appendMode=True)
+        writer.skip_case('case1')
+        writer.finish()
+        self.assertEqual(self.read_output(), [HEADER] + case_rows('case0', '7') + case_rows('case2'))
+
+
+if __name__ == "__main__":
+    unittest.main()
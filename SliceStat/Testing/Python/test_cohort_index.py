@@ -0,0 +1,70 @@
+"""
+Unit tests of the cohort index (SliceStatLib.CohortIndexDb).
+
+Only numpy and the standard library are required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import SliceStatLib  # noqa: E402
+
+
+class CohortIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        random.seed(0)
+        self.results = {}
+        for caseNumber in range(200):
+            segmentResults = {}
+            for segmentName in ('Liver', 'Tumor', 'Spleen'):
+                first = random.randint(0, 100)
+                segmentResults[segmentName] = [index for index in range(first, first + random.randint(0, 30))
+                                               if random.random() > 0.3]
+            self.results[f'case{caseNumber:03d}'] = segmentResults
+        self.cohortIndex = SliceStatLib.CohortIndex(os.path.join(self.tempDir, 'output_index.sqlite'))
+        self.cohortIndex.update(self.results)
+
+    def tearDown(self):
+        self.cohortIndex.close()
+        shutil.rmtree(self.tempDir)
+
+    def expected(self, segmentName=None, sliceIndex=None, minimumCount=None, maximumCount=None):
+        return sorted((caseId, name, len(sliceNumbers))
+                      for caseId, segmentResults in self.results.items() for name, sliceNumbers in segmentResults.items()
+                      if (segmentName is None or name == segmentName)
+                      and (sliceIndex is None or sliceIndex in sliceNumbers)
+                      and (minimumCount is None or len(sliceNumbers) >= minimumCount)
+                      and (maximumCount is None or len(sliceNumbers) <= maximumCount))
+
+    def test_query(self):
+        for arguments in [(None, 50), ('Liver', 50), ('Tumor', 0), ('Liver', None, 10, 20), ('Spleen', 80, 5, None), (None, 500)]:
+            self.assertEqual(self.cohortIndex.query(*arguments), self.expected(*arguments), arguments)
+
+    def test_slice_query_uses_intervals_index(self):
+        statements = []
+        self.cohortIndex.connection.set_trace_callback(statements.append)
+        self.cohortIndex.query('Liver', 50)
+        self.cohortIndex.connection.set_trace_callback(None)
+        plan = [row[3] for row in self.cohortIndex.connection.execute(
+            "EXPLAIN QUERY PLAN " + statements[-1].replace("?", "0"))]
+        self.assertIn("intervalsBySlice", plan[0])
+        self.assertFalse(any(step.startswith("SCAN") for step in plan), plan)
+
+    def test_replace_case(self):
+        self.cohortIndex.update({'case000': {'Liver': SliceStatLib.SliceIntervals.from_indices([3, 4, 7])}})
+        self.assertEqual(self.cohortIndex.query(sliceIndex=7, segmentName='Liver')[:1], [('case000', 'Liver', 3)])
+        self.assertIsNone(self.cohortIndex.segment_intervals('case000', 'Tumor'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Unit tests of the columnar export (SliceStatLib.Columnar).
+
+Only numpy and the standard library are required, Slicer is not started;
+Parquet and Feather are only tested if pyarrow is installed.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Columnar import ColumnarWriter, columnar_path, read_columnar, result_columns, write_columnar  # noqa: E402
+from SliceStatLib.Intervals import SliceIntervals  # noqa: E402
+
+RESULTS = {
+    'case0': {'Liver': [3, 4, 5], 'Tumor': []},
+    'case1': {'Liver': SliceIntervals.parse("10-12,20"), 'Tumor': [11]},
+    'case2': {'Liver': [0]},
+}
+
+
+class ColumnarTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def assertColumnsEqual(self, columns, expected):
+        self.assertEqual(sorted(columns), sorted(expected))
+        for name in expected:
+            np.testing.assert_array_equal(columns[name], expected[name], name)
+
+    def test_result_columns(self):
+        columns = result_columns(RESULTS)
+        self.assertEqual(columns['ID'].tolist(), ['case0', 'case0', 'case1', 'case1', 'case2'])
+        self.assertEqual(columns['SliceCount'].tolist(), [3, 0, 4, 1, 1])
+        self.assertEqual(columns['SliceOffsets'].tolist(), [0, 3, 3, 7, 8, 9])
+        self.assertEqual(columns['SliceNumbers'].tolist(), [3, 4, 5, 10, 11, 12, 20, 11, 0])
+
+    def test_columnar_path(self):
+        self.assertEqual(columnar_path('/data/output.csv', 'parquet'), '/data/output.parquet')
+        self.assertEqual(columnar_path('/data/output', 'npz'), '/data/output.npz')
+
+    def round_trip(self, columnarFormat):
+        path = columnar_path(os.path.join(self.tempDir.name, 'output.csv'), columnarFormat)
+        write_columnar(RESULTS, path, chunkSize=2)
+        self.assertColumnsEqual(read_columnar(path), result_columns(RESULTS))
+
+        # Append mode replaces the rows of updated volumes and keeps the others
+        write_columnar({'case3': {'Liver': [7]}, 'case0': {'Liver': [1]}}, path, appendMode=True)
+        self.assertColumnsEqual(read_columnar(path), result_columns({
+            'case1': RESULTS['case1'], 'case2': RESULTS['case2'], 'case3': {'Liver': [7]}, 'case0': {'Liver': [1]}}))
+
+    def test_npz(self):
+        self.round_trip('npz')
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+    def test_parquet(self):
+        self.round_trip('parquet')
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+    def test_feather(self):
+        self.round_trip('feather')
+
+    def test_iterable_is_written_in_chunks(self):
+        path = os.path.join(self.tempDir.name, 'output.npz')
+        chunkVolumes = []
+        writeColumns = ColumnarWriter.write_columns
+
+        def recordChunk(writer, columns):
+            chunkVolumes.append(sorted(set(columns['ID'].tolist())))
+            writeColumns(writer, columns)
+
+        consumed = []
+
+        def iterResults():
+            for volumeId, segmentResults in RESULTS.items():
+                consumed.append(volumeId)
+                yield volumeId, segmentResults
+
+        with mock.patch.object(ColumnarWriter, 'write_columns', recordChunk):
+            write_columnar(iterResults(), path, chunkSize=2)
+        self.assertEqual(chunkVolumes, [['case0', 'case1'], ['case2']])
+        self.assertEqual(consumed, ['case0', 'case1', 'case2'])
+        self.assertColumnsEqual(read_columnar(path), result_columns(RESULTS))
+        with self.assertRaises(ValueError):
+            write_columnar(iterResults(), path, appendMode=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,198 @@
+"""
+Unit tests of the Multi Sample export orchestration (SliceStatLib.Export).
+
+Only numpy and the standard library are required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import SliceStatLib  # noqa: E402
+
+
+class DictCache:
+    """
+    In-memory stand-in of SliceStatLib.ResultCache.
+    """
+
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, value):
+        self.entries[key] = value
+
+
+class ProcessCasesStepsTest(unittest.TestCase):
+
+    def compute_steps(self, results):
+        def computeCase(index):
+            yield
+            if isinstance(results[index], Exception):
+                raise results[index]
+            return results[index]
+        return computeCase
+
+    def test_cache_and_computed_cases(self):
+        resultCache = DictCache({'key0': {'A': [1]}})
+        done = []
+        outcomes = SliceStatLib.run_to_completion(SliceStatLib.process_cases_steps(
+            ['case0', 'case1', 'case2'], self.compute_steps([None, {'A': [2, 3]}, ValueError("bad file")]),
+            resultCache, lambda index: f'key{index}',
+            onCaseDone=lambda index, outcome, extractionPath: done.append((index, outcome, extractionPath))))
+        self.assertEqual(done, [(0, ({'A': [1]}, None), 'cache'), (1, ({'A': [2, 3]}, None), None),
+                                (2, (None, "bad file"), None)])
+        # Results are handed over to onCaseDone
+        self.assertEqual(outcomes, [(None, None), (None, None), (None, "bad file")])
+        self.assertEqual(resultCache.entries, {'key0': {'A': [1]}, 'key1': {'A': [2, 3]}})
+
+    def test_cancel(self):
+        cancelled = []
+
+        def computeCase(index):
+            cancelled.append(True)
+            return {'A': [index]}
+            yield
+
+        outcomes = SliceStatLib.run_to_completion(SliceStatLib.process_cases_steps(
+            ['case0', 'case1'], computeCase, isCancelled=lambda: bool(cancelled)))
+        self.assertEqual(outcomes, [({'A': [0]}, None), None])
+
+
+class ExportCasesStepsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.outputPath = os.path.join(self.tempDir.name, 'output.csv')
+        self.results = {'case0': {'Liver': [1]}, 'case1': {'Liver': [2, 3]}, 'case2': {'Liver': [4]}}
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def computeCase(self, caseId):
+        yield
+        return self.results[caseId]
+
+    def test_resume_interrupted_export(self):
+        export = SliceStatLib.CohortExport(self.outputPath)
+        export.add_case('case1', (self.results['case1'], None))
+        export.close()
+
+        done = []
+        resumed = []
+        warnings = SliceStatLib.run_to_completion(SliceStatLib.export_cases_steps(
+            SliceStatLib.CohortExport(self.outputPath), ['case0', 'case1', 'case2'], self.computeCase,
+            caseOrder=['case2', 'case1', 'case0'],
+            onCaseDone=lambda caseId, outcome, extractionPath, written: done.append((caseId, written)),
+            onResumedCase=lambda caseId, segmentResults: resumed.append((caseId, segmentResults)),
+            writeInBackground=True))
+        self.assertEqual(warnings, ["Resumed an interrupted export: 1 volumes were already written"])
+        self.assertEqual(done, [('case0', True), ('case2', True)])
+        self.assertEqual(resumed, [('case1', {'Liver': [2, 3]})])
+        _, groups = SliceStatLib.read_csv_groups(self.outputPath)
+        self.assertEqual([volumeId for volumeId, _ in groups], ['case2', 'case1', 'case0'])
+
+    def test_cancel(self):
+        cancelled = []
+
+        def onCaseDone(caseId, outcome, extractionPath, written):
+            cancelled.append(True)
+
+        warnings = SliceStatLib.run_to_completion(SliceStatLib.export_cases_steps(
+            SliceStatLib.CohortExport(self.outputPath, resume=False), ['case0', 'case1', 'case2'], self.computeCase,
+            onCaseDone=onCaseDone, isCancelled=lambda: bool(cancelled)))
+        self.assertEqual(warnings, ["Export cancelled: 1 of 3 volumes were processed, their results were written"])
+        _, groups = SliceStatLib.read_csv_groups(self.outputPath)
+        self.assertEqual([volumeId for volumeId, _ in groups], ['case0'])
+
+    def test_file_backed_case_paths(self):
+        volumePath = os.path.join(self.tempDir.name, 'case0.nii.gz')
+        segmentationPath = os.path.join(self.tempDir.name, 'case0.seg.nrrd')
+        self.assertIsNone(SliceStatLib.file_backed_case_paths(volumePath, segmentationPath))
+        for path in (volumePath, segmentationPath, self.outputPath):
+            open(path, 'wb').close()
+        self.assertEqual(SliceStatLib.file_backed_case_paths(volumePath, segmentationPath), (volumePath, segmentationPath))
+        self.assertIsNone(SliceStatLib.file_backed_case_paths(self.outputPath, segmentationPath))
+        self.assertIsNone(SliceStatLib.file_backed_case_paths(volumePath, None))
+
+
+class CohortExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.outputPath = os.path.join(self.tempDir.name, 'output.csv')
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_export(self):
+        export = SliceStatLib.CohortExport(self.outputPath, cohortIndex=True, cohortSummary=True, columnarFormat='npz')
+        self.assertIsNone(export.add_case('case2', ({'Liver': [4, 5]}, None)))
+        self.assertEqual(export.add_case('case1', ({'Liver': []}, None)), "Volume 'case1' has no matching segments")
+        self.assertEqual(export.add_case('case3', (None, "bad file")), "Failed to process volume 'case3': bad file")
+        self.assertIsNone(export.add_case('case0', ({'Liver': [1], 'Tumor': [1, 2]}, None)))
+        export.close()
+        export.finish(['case0', 'case1', 'case2', 'case3'])
+
+        _, groups = SliceStatLib.read_csv_groups(self.outputPath)
+        self.assertEqual([volumeId for volumeId, _ in groups], ['case0', 'case2'])
+        self.assertTrue(os.path.exists(SliceStatLib.summary_path(self.outputPath)))
+        columns = SliceStatLib.read_columnar(SliceStatLib.columnar_path(self.outputPath, 'npz'))
+        self.assertEqual(columns['ID'].tolist(), ['case2', 'case0', 'case0'])
+        self.assertEqual(columns['SliceNumbers'].tolist(), [4, 5, 1, 1, 2])
+        with SliceStatLib.CohortIndex(SliceStatLib.index_path(self.outputPath)) as cohortIndex:
+            self.assertEqual(cohortIndex.cases_with_segment('Liver', sliceIndex=5), ['case2'])
+        self.assertFalse(os.path.exists(SliceStatLib.checkpoint_path(self.outputPath)))
+
+    def test_append_removes_cases_without_segments(self):
+        export = SliceStatLib.CohortExport(self.outputPath, cohortIndex=True, columnarFormat='npz')
+        export.add_case('case0', ({'Liver': [1]}, None))
+        export.add_case('case1', ({'Liver': [2]}, None))
+        export.close()
+        export.finish(['case0', 'case1'])
+
+        export = SliceStatLib.CohortExport(self.outputPath, appendMode=True, cohortIndex=True, columnarFormat='npz')
+        export.add_case('case0', ({'Liver': []}, None))
+        export.close()
+        export.finish(['case0'])
+        _, groups = SliceStatLib.read_csv_groups(self.outputPath)
+        self.assertEqual([volumeId for volumeId, _ in groups], ['case1'])
+        columns = SliceStatLib.read_columnar(SliceStatLib.columnar_path(self.outputPath, 'npz'))
+        self.assertEqual(columns['ID'].tolist(), ['case1'])
+        with SliceStatLib.CohortIndex(SliceStatLib.index_path(self.outputPath)) as cohortIndex:
+            self.assertEqual(cohortIndex.query('Liver'), [('case1', 'Liver', 1)])
+
+    def test_nothing_written(self):
+        export = SliceStatLib.CohortExport(self.outputPath)
+        export.add_case('case0', ({'Liver': []}, None))
+        export.close()
+        self.assertFalse(export.has_output)
+        export.finish(['case0'])
+        self.assertFalse(os.path.exists(self.outputPath))
+        self.assertFalse(os.path.exists(SliceStatLib.checkpoint_path(self.outputPath)))
+
+    def test_shard(self):
+        caseIds = [f'case{index}' for index in range(10)]
+        export = SliceStatLib.CohortExport(self.outputPath, cohortIndex=True, shardIndex=1, shardCount=3)
+        shardIds = export.shard_cases(reversed(caseIds))
+        self.assertEqual(shardIds, sorted(caseId for caseId in caseIds if SliceStatLib.shard_of(caseId, 3) == 1))
+        for caseId in shardIds:
+            export.add_case(caseId, ({'Liver': [1]}, None))
+        export.close()
+        export.finish(shardIds, shardIds)
+        self.assertEqual(export.outputPath, SliceStatLib.shard_path(self.outputPath, 1, 3))
+        self.assertEqual(SliceStatLib.read_shard_manifest(export.outputPath)['assigned'], shardIds)
+        # The cohort index is written by the merge
+        self.assertFalse(os.path.exists(SliceStatLib.index_path(self.outputPath)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Unit tests of the in-memory cache of extracted slice presence (SliceStatLib.MemoryCache).
+
+Only numpy is required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Intervals import SliceIntervals  # noqa: E402
+from SliceStatLib.MemoryCache import ExtractionCache  # noqa: E402
+
+
+class ExtractionCacheTest(unittest.TestCase):
+
+    def test_put_get(self):
+        cache = ExtractionCache()
+        self.assertIsNone(cache.get('seg', 1, 'key'))
+        cache.put('seg', 1, 'key', {'Liver': [3, 4, 5, 9], 'Empty': []})
+        self.assertEqual(cache.get('seg', 1, 'key'), {'Liver': [3, 4, 5, 9], 'Empty': []})
+        intervals = cache.get('seg', 1, 'key', asIntervals=True)
+        self.assertIsInstance(intervals['Liver'], SliceIntervals)
+        self.assertEqual(intervals['Liver'].to_list(), [3, 4, 5, 9])
+        self.assertIsNone(cache.get('seg', 1, 'otherKey'))
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_new_stamp_invalidates_owner(self):
+        cache = ExtractionCache()
+        cache.put('seg', 1, 'a', {'Liver': [1]})
+        cache.put('seg', 1, 'b', {'Liver': [2]})
+        cache.put('other', 1, 'a', {'Liver': [3]})
+        self.assertEqual(len(cache), 3)
+        # The segmentation was modified: its entries with the old stamp are dropped, other owners are kept
+        cache.put('seg', 2, 'a', {'Liver': [4]})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('seg', 1, 'b'))
+        self.assertEqual(cache.get('seg', 2, 'a'), {'Liver': [4]})
+        self.assertEqual(cache.get('other', 1, 'a'), {'Liver': [3]})
+
+    def test_invalidate_and_clear(self):
+        cache = ExtractionCache()
+        cache.put('seg', 1, 'a', {'Liver': [1]})
+        cache.put('other', 1, 'a', {'Liver': [1]})
+        size = cache.totalSize
+        cache.invalidate('seg')
+        self.assertIsNone(cache.get('seg', 1, 'a'))
+        self.assertEqual(cache.totalSize, size // 2)
+        cache.clear()
+        self.assertEqual((len(cache), cache.totalSize), (0, 0))
+
+    def test_lru_eviction(self):
+        cache = ExtractionCache()
+        cache.put('seg', 1, 'a', {'Liver': [1]})
+        entrySize = cache.totalSize
+        cache.maxSize = 2 * entrySize
+        cache.put('seg', 1, 'b', {'Liver': [2]})
+        # Using 'a' makes 'b' the least recently used entry
+        cache.get('seg', 1, 'a')
+        cache.put('seg', 1, 'c', {'Liver': [3]})
+        self.assertIsNone(cache.get('seg', 1, 'b'))
+        self.assertIsNotNone(cache.get('seg', 1, 'a'))
+        self.assertIsNotNone(cache.get('seg', 1, 'c'))
+        self.assertEqual(cache.totalSize, 2 * entrySize)
+
+    def test_replace_and_limits(self):
+        cache = ExtractionCache()
+        cache.put('seg', 1, 'a', {'Liver': [1]})
+        cache.put('seg', 1, 'a', {'Liver': [2]})
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get('seg', 1, 'a'), {'Liver': [2]})
+        # Entries larger than the cache are not stored, a size of 0 disables the cache
+        cache.maxSize = 1
+        cache.put('seg', 1, 'b', {'Liver': [3]})
+        self.assertIsNone(cache.get('seg', 1, 'b'))
+        disabled = ExtractionCache(0)
+        disabled.put('seg', 1, 'a', {'Liver': [1]})
+        self.assertEqual(len(disabled), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+Unit tests of the NRRD and NIfTI header parsing and voxel reading (SliceStatLib.FileIO).
+
+Only numpy and the standard library are required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.FileIO import NiftiHeader, NrrdHeader, SegmentationFile, read_labelmap_header  # noqa: E402
+from SliceStatTestData import write_nifti, write_segmentation  # noqa: E402
+
+
+class NiftiHeaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_sform(self):
+        path = os.path.join(self.tempDir.name, 'volume.nii.gz')
+        write_nifti(path, (4, 3, 2), origin=(10.0, -20.0, 30.0), spacing=(0.5, 0.75, 2.0))
+        header = NiftiHeader(path)
+        self.assertEqual(header.dimensions, [2, 3, 4])
+        self.assertEqual(header.shape, (4, 3, 2))
+        np.testing.assert_allclose(header.ijk_to_ras(), [[0.5, 0, 0, 10], [0, 0.75, 0, -20], [0, 0, 2, 30], [0, 0, 0, 1]])
+        self.assertEqual(header.read_data().shape, (4, 3, 2))
+        self.assertIsInstance(read_labelmap_header(path), NiftiHeader)
+
+    def test_qform(self):
+        # Uncompressed file with only a qform: 180 degree rotation around K (quaternion b = c = 0, d = 1)
+        path = os.path.join(self.tempDir.name, 'volume.nii')
+        header = bytearray(352)
+        struct.pack_into('<i', header, 0, 348)
+        struct.pack_into('<8h', header, 40, 3, 2, 2, 2, 1, 1, 1, 1)
+        struct.pack_into('<h', header, 70, 2)
+        struct.pack_into('<8f', header, 76, -1, 1, 2, 3, 1, 1, 1, 1)
+        struct.pack_into('<f', header, 108, 352)
+        struct.pack_into('<2h', header, 252, 1, 0)
+        struct.pack_into('<6f', header, 256, 0, 0, 1, 5, 6, 7)
+        header[344:348] = b'n+1\0'
+        with open(path, 'wb') as f:
+            f.write(bytes(header) + bytes(range(8)))
+        niftiHeader = NiftiHeader(path)
+        # qfac (pixdim[0]) of -1 flips K
+        np.testing.assert_allclose(niftiHeader.ijk_to_ras(), [[-1, 0, 0, 5], [0, -2, 0, 6], [0, 0, -3, 7], [0, 0, 0, 1]])
+        np.testing.assert_array_equal(niftiHeader.read_data().ravel(), np.arange(8))
+
+    def test_not_nifti(self):
+        path = os.path.join(self.tempDir.name, 'volume.nii')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 400)
+        with self.assertRaises(ValueError):
+            NiftiHeader(path)
+
+
+class NrrdHeaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_segmentation(self):
+        path = os.path.join(self.tempDir.name, 'segmentation.seg.nrrd')
+        labelArray = np.zeros((5, 4, 3), dtype=np.uint8)
+        labelArray[1:3, 2, 1] = 2
+        write_segmentation(path, [(labelArray, {'Liver': 1, 'Tumor': 2})], origin=(1.0, 2.0, 3.0), spacing=(0.5, 0.5, 2.0))
+        segmentationFile = SegmentationFile(path)
+        self.assertEqual(segmentationFile.dimensions, [3, 4, 5])
+        self.assertEqual([(segment.segmentId, segment.name, segment.labelValue, segment.layer)
+                          for segment in segmentationFile.segments],
+                         [('Segment_0', 'Liver', 1, 0), ('Segment_1', 'Tumor', 2, 0)])
+        # Stored in LPS, returned in RAS
+        np.testing.assert_allclose(segmentationFile.ijk_to_ras(),
+                                   [[0.5, 0, 0, 1], [0, 0.5, 0, 2], [0, 0, 2, 3], [0, 0, 0, 1]])
+        np.testing.assert_array_equal(segmentationFile.read_layers()[0], labelArray)
+
+    def test_layers_and_slabs(self):
+        path = os.path.join(self.tempDir.name, 'segmentation.seg.nrrd')
+        first = np.zeros((6, 2, 2), dtype=np.uint8)
+        first[1, 0, 0] = 1
+        second = np.zeros((6, 2, 2), dtype=np.uint8)
+        second[4, 1, 1] = 1
+        write_segmentation(path, [(first, {'A': 1}), (second, {'B': 1})])
+        segmentationFile = SegmentationFile(path)
+        self.assertEqual(segmentationFile.numberOfLayers, 2)
+        self.assertEqual(segmentationFile.dimensions, [2, 2, 6])
+        self.assertEqual([segment.layer for segment in segmentationFile.segments], [0, 1])
+        layers = segmentationFile.read_layers()
+        np.testing.assert_array_equal(layers[0], first)
+        np.testing.assert_array_equal(layers[1], second)
+        # A budget smaller than a slice still streams one slice at a time; the slab buffer is reused, so copy it
+        slabs = [(firstSlice, layerSlabs[1].copy())
+                 for firstSlice, layerSlabs in segmentationFile.iter_layer_slabs(memoryBudget=1)]
+        self.assertEqual([firstSlice for firstSlice, _ in slabs], list(range(6)))
+        np.testing.assert_array_equal(np.concatenate([slab for _, slab in slabs]), second)
+
+    def test_raw_with_spacings(self):
+        path = os.path.join(self.tempDir.name, 'labelmap.nrrd')
+        voxels = np.arange(24, dtype='>i2').reshape((2, 3, 4))
+        with open(path, 'wb') as f:
+            f.write(b"NRRD0004\n# comment\ntype: short\ndimension: 3\nsizes: 4 3 2\nendian: big\nencoding: raw\n"
+                    b"spacings: 1.5 2 3\n\n")
+            f.write(voxels.tobytes())
+        header = read_labelmap_header(path)
+        self.assertIsInstance(header, NrrdHeader)
+        self.assertEqual(header.dimensions, [4, 3, 2])
+        np.testing.assert_allclose(np.diag(header.ijk_to_ras()), [1.5, 2, 3, 1])
+        data = header.read_data()
+        self.assertTrue(data.dtype.isnative)
+        np.testing.assert_array_equal(data, np.arange(24).reshape((2, 3, 4)))
+
+    def test_not_nrrd(self):
+        path = os.path.join(self.tempDir.name, 'labelmap.nrrd')
+        with open(path, 'wb') as f:
+            f.write(b"P5\n")
+        with self.assertRaises(ValueError):
+            NrrdHeader(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Unit tests of the run-length slice interval representation (SliceStatLib.Intervals).
+
+Only numpy is required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Intervals import SliceIntervals, format_intervals, slice_result  # noqa: E402
+
+
+class SliceIntervalsTest(unittest.TestCase):
+
+    def test_from_mask(self):
+        mask = np.zeros(20, dtype=bool)
+        mask[[0, 1, 2, 5, 9, 10, 19]] = True
+        intervals = SliceIntervals.from_mask(mask)
+        self.assertEqual(intervals.starts.tolist(), [0, 5, 9, 19])
+        self.assertEqual(intervals.stops.tolist(), [3, 6, 11, 20])
+        self.assertEqual(intervals.to_list(), np.flatnonzero(mask).tolist())
+        self.assertEqual(intervals.count, 7)
+
+    def test_from_indices(self):
+        # Any order, duplicates allowed
+        intervals = SliceIntervals.from_indices([12, 3, 4, 5, 3, 13, 20])
+        self.assertEqual(intervals.format(), "3-5,12-13,20")
+        self.assertEqual(list(intervals), [3, 4, 5, 12, 13, 20])
+        self.assertFalse(SliceIntervals.from_indices([]))
+
+    def test_format_and_parse(self):
+        for text in ["12-87,90-95,100", "0", ""]:
+            self.assertEqual(SliceIntervals.parse(text).format(), text)
+        self.assertEqual(SliceIntervals.parse(" 1-3, 7 "), SliceIntervals([1, 7], [4, 8]))
+        self.assertEqual(format_intervals([1, 2, 3, 7]), "1-3,7")
+        self.assertEqual(format_intervals(None), "")
+
+    def test_contains(self):
+        intervals = SliceIntervals.parse("2-4,8")
+        self.assertIn(3, intervals)
+        self.assertNotIn(5, intervals)
+        self.assertNotIn(-1, intervals)
+        np.testing.assert_array_equal(intervals.contains(np.arange(10)),
+                                      [False, False, True, True, True, False, False, False, True, False])
+        self.assertFalse(SliceIntervals().contains(0))
+
+    def test_intersection(self):
+        first = SliceIntervals.parse("0-9,20-29,40")
+        second = SliceIntervals.parse("5-24,28-45")
+        self.assertEqual(first.intersection(second).format(), "5-9,20-24,28-29,40")
+        self.assertEqual(first.overlap(second), 13)
+        self.assertEqual(first.overlap(SliceIntervals()), 0)
+
+    def test_slice_result(self):
+        mask = np.array([False, True, True, False, True])
+        self.assertEqual(slice_result(mask), [1, 2, 4])
+        self.assertEqual(slice_result(mask, asIntervals=True), SliceIntervals([1, 4], [3, 5]))
+
+
+if __name__ == "__main__":
+    unittest.main()
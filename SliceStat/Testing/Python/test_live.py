@@ -0,0 +1,134 @@
+"""
+Unit tests of the live per-slice counts updated from labelmap edits (SliceStatLib.Live).
+
+Only numpy is required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import SliceStatLib.Live  # noqa: E402
+from SliceStatLib.Live import LiveSliceCounts, box_slice_range, changed_box  # noqa: E402
+
+
+def reference_counts(labelArray, kOffset, numberOfSlices, labelValue):
+    counts = np.zeros(numberOfSlices, dtype=np.int64)
+    counts[kOffset:kOffset + labelArray.shape[0]] = (labelArray == labelValue).sum(axis=(1, 2))
+    return counts
+
+
+class ChangedBoxTest(unittest.TestCase):
+
+    def test_equal(self):
+        labelArray = np.ones((3, 4, 5), dtype=np.uint8)
+        self.assertIsNone(changed_box(labelArray, (0, 0, 0), labelArray.copy(), (0, 0, 0)))
+
+    def test_changed_voxels(self):
+        previous = np.zeros((6, 5, 4), dtype=np.uint8)
+        current = previous.copy()
+        current[2, 1, 3] = 1
+        current[4, 3, 0] = 2
+        self.assertEqual(changed_box(previous, (10, 20, 30), current, (10, 20, 30)), ((10, 21, 32), (14, 24, 35)))
+
+    def test_different_extents(self):
+        previous = np.zeros((2, 2, 2), dtype=np.uint8)
+        current = np.zeros((3, 2, 2), dtype=np.uint8)
+        self.assertEqual(changed_box(previous, (0, 0, 5), current, (1, 0, 6)), ((0, 0, 5), (3, 2, 9)))
+        self.assertEqual(changed_box(np.zeros((0, 2, 2)), (0, 0, 0), current, (1, 0, 6)), ((1, 0, 6), (3, 2, 9)))
+
+
+class BoxSliceRangeTest(unittest.TestCase):
+
+    def test_reference_grid(self):
+        self.assertEqual(box_slice_range(((0, 0, 3), (4, 4, 7)), None, 10), (3, 7))
+        self.assertEqual(box_slice_range(((0, 0, 8), (4, 4, 12)), None, 10), (8, 10))
+        self.assertIsNone(box_slice_range(((0, 0, 12), (4, 4, 14)), None, 10))
+
+    def test_resampled(self):
+        # Labelmap slices twice as thick as the reference slices, shifted by 4 reference slices
+        ijkToReference = np.diag([1.0, 1.0, 2.0, 1.0])
+        ijkToReference[2, 3] = 4
+        first, last = box_slice_range(((0, 0, 2), (4, 4, 3)), ijkToReference, 20)
+        # Labelmap slice 2 covers reference slices 7 and 8 (centers 8 +- 1), one slice of margin on each side
+        self.assertLessEqual(first, 7)
+        self.assertGreaterEqual(last, 9)
+        self.assertLessEqual(last - first, 4)
+
+
+class LiveSliceCountsTest(unittest.TestCase):
+
+    def test_set_counts_replaces_range(self):
+        liveCounts = LiveSliceCounts(10)
+        self.assertEqual(liveCounts.set_counts('A', np.array([1, 2, 3]), 2), (2, 5))
+        self.assertEqual(liveCounts.set_counts('A', np.array([0, 5]), 6, (6, 8)), (7, 8))
+        self.assertEqual(liveCounts.counts['A'].tolist(), [0, 0, 1, 2, 3, 0, 0, 5, 0, 0])
+        # Slices of the range not covered by the counts are emptied, the presence of others does not change
+        self.assertEqual(liveCounts.set_counts('A', np.array([7]), 4, (3, 5)), (3, 4))
+        self.assertEqual(liveCounts.counts['A'].tolist(), [0, 0, 1, 0, 7, 0, 0, 5, 0, 0])
+        self.assertIsNone(liveCounts.set_counts('A', np.array([9]), 4, (4, 5)))
+        self.assertEqual(liveCounts.voxel_count('A'), 15)
+        self.assertEqual(liveCounts.slice_numbers('A'), [2, 4, 7])
+
+    def test_update_labelmap(self):
+        rng = np.random.default_rng(1)
+        numberOfSlices = 12
+        labelArray = (rng.random((8, 6, 5)) < 0.3).astype(np.uint8) * rng.integers(1, 3, (8, 6, 5)).astype(np.uint8)
+        ijkOffset = (0, 0, 2)
+        liveCounts = LiveSliceCounts(numberOfSlices)
+        changed = liveCounts.update_labelmap(['A', 'B'], labelArray, ijkOffset, [1, 2])
+        self.assertIsNotNone(changed['A'])
+        for segmentId, labelValue in (('A', 1), ('B', 2)):
+            np.testing.assert_array_equal(liveCounts.counts[segmentId],
+                                          reference_counts(labelArray, 2, numberOfSlices, labelValue))
+
+        # Nothing changed: nothing is counted
+        with mock.patch.object(SliceStatLib.Live, 'slice_label_counts') as counter:
+            self.assertEqual(liveCounts.update_labelmap(['A', 'B'], labelArray, ijkOffset, [1, 2]), {'A': None, 'B': None})
+        counter.assert_not_called()
+
+        # Painting in labelmap slices 3 and 4 only recounts reference slices 5 and 6
+        labelArray[3:5, 2:4, 1:3] = 1
+        countedShapes = []
+
+        def counting(array, maxLabel):
+            countedShapes.append(array.shape)
+            return SliceStatLib.Presence.slice_label_counts(array, maxLabel)
+
+        with mock.patch.object(SliceStatLib.Live, 'slice_label_counts', counting):
+            changed = liveCounts.update_labelmap(['A', 'B'], labelArray, ijkOffset, [1, 2])
+        self.assertEqual(countedShapes, [(2, 6, 5)])
+        for segmentId, labelValue in (('A', 1), ('B', 2)):
+            np.testing.assert_array_equal(liveCounts.counts[segmentId],
+                                          reference_counts(labelArray, 2, numberOfSlices, labelValue))
+
+    def test_update_labelmap_extent_change(self):
+        liveCounts = LiveSliceCounts(10)
+        labelArray = np.ones((4, 2, 2), dtype=np.uint8)
+        liveCounts.update_labelmap(['A'], labelArray, (0, 0, 1), [1])
+        self.assertEqual(liveCounts.slice_numbers('A'), [1, 2, 3, 4])
+        # The labelmap shrinks to 2 slices starting at slice 5: slices of the previous extent are emptied
+        self.assertEqual(liveCounts.update_labelmap(['A'], labelArray[:2], (0, 0, 5), [1]), {'A': (1, 7)})
+        self.assertEqual(liveCounts.slice_numbers('A'), [5, 6])
+
+    def test_remove(self):
+        liveCounts = LiveSliceCounts(4)
+        liveCounts.update_labelmap(['A', 'B'], np.ones((1, 1, 1), dtype=np.uint8), (0, 0, 0), [1, 2])
+        liveCounts.remove('B')
+        self.assertNotIn('B', liveCounts.counts)
+        self.assertEqual(liveCounts.snapshots, {})
+        # A segment moved to another layer replaces the snapshot of its previous layer
+        liveCounts.update_labelmap(['A', 'C'], np.ones((1, 1, 1), dtype=np.uint8), (0, 0, 0), [1, 2])
+        liveCounts.update_labelmap(['A'], np.ones((1, 1, 1), dtype=np.uint8), (0, 0, 0), [1])
+        self.assertEqual(list(liveCounts.snapshots), [('A',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
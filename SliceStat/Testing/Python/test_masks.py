@@ -0,0 +1,135 @@
+"""
+Unit tests of the bit-packed slice masks and their set operations (SliceStatLib.Masks).
+
+Only numpy is required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Intervals import SliceIntervals  # noqa: E402
+from SliceStatLib.Masks import PresenceMaskStore, SliceMask, bit_count, masks_path, write_case_masks  # noqa: E402
+
+
+class SliceMaskTest(unittest.TestCase):
+
+    def test_conversions(self):
+        mask = SliceMask.from_indices([0, 3, 8, 9, 17], 20)
+        self.assertEqual(mask.nbytes, 3)
+        self.assertEqual(mask.to_list(), [0, 3, 8, 9, 17])
+        self.assertEqual(list(mask), [0, 3, 8, 9, 17])
+        self.assertEqual((len(mask), mask.count), (5, 5))
+        self.assertIn(17, mask)
+        self.assertNotIn(16, mask)
+        self.assertNotIn(25, mask)
+        self.assertEqual(mask.to_intervals().to_list(), [0, 3, 8, 9, 17])
+        self.assertEqual(SliceMask.from_indices(SliceIntervals.from_indices([2, 3])), SliceMask.from_indices([2, 3], 16))
+        self.assertEqual(SliceMask.from_indices([5]).numberOfSlices, 6)
+        self.assertFalse(SliceMask.from_indices([], 10))
+
+    def test_set_operations(self):
+        rng = np.random.default_rng(0)
+        maskA = rng.random(37) < 0.5
+        maskB = rng.random(29) < 0.5
+        paddedB = np.concatenate((maskB, np.zeros(8, dtype=bool)))
+        a = SliceMask.from_mask(maskA)
+        b = SliceMask.from_mask(maskB)
+        # Slices missing from the shorter mask are empty
+        self.assertEqual((a & b).to_list(), np.flatnonzero(maskA & paddedB).tolist())
+        self.assertEqual((a | b).to_list(), np.flatnonzero(maskA | paddedB).tolist())
+        self.assertEqual((a ^ b).to_list(), np.flatnonzero(maskA ^ paddedB).tolist())
+        self.assertEqual((a - b).to_list(), np.flatnonzero(maskA & ~paddedB).tolist())
+        self.assertEqual((b - a).to_list(), np.flatnonzero(paddedB & ~maskA).tolist())
+        self.assertEqual((a | b).numberOfSlices, 37)
+
+    def test_overlap(self):
+        a = SliceMask.from_indices([1, 2, 3, 4], 10)
+        b = SliceMask.from_indices([3, 4, 5, 6, 7, 8], 10)
+        self.assertEqual(a.overlap(b), (2, 8, 0.4))
+        empty = SliceMask.from_indices([], 10)
+        self.assertEqual(empty.overlap(empty), (0, 0, 1.0))
+
+    def test_bit_count(self):
+        bits = np.array([[0xFF, 0x01], [0x00, 0x81]], dtype=np.uint8)
+        self.assertEqual(bit_count(bits), 11)
+        self.assertEqual(bit_count(bits, axis=-1).tolist(), [9, 2])
+
+
+class PresenceMaskStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.store = PresenceMaskStore()
+        self.store.add_case('case1', {'Liver': [1, 2, 3], 'Tumor': [2, 3, 9]}, 12)
+        self.store.add_case('case2', {'Liver': SliceIntervals.from_indices([5, 6]), 'Kidney': [0]}, 12)
+        self.store.add_case('case3', {'Liver': [], 'Tumor': [6]}, 12)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def test_case_operations(self):
+        self.assertEqual(self.store.segment_names(), ['Liver', 'Tumor', 'Kidney'])
+        self.assertEqual(self.store.union('case1').to_list(), [1, 2, 3, 9])
+        self.assertEqual(self.store.slices_with_any_label('case2').to_list(), [0, 5, 6])
+        self.assertEqual(self.store.intersection('case1', ['Liver', 'Tumor']).to_list(), [2, 3])
+        # A missing segment makes the intersection empty
+        self.assertFalse(self.store.intersection('case2', ['Liver', 'Tumor']))
+        self.assertIsNone(self.store.get('case2', 'Tumor'))
+
+    def test_compare_cases(self):
+        comparison = self.store.compare_cases('case1', 'case3')
+        self.assertEqual(comparison['Liver'], (0, 3, 0.0))
+        self.assertEqual(comparison['Tumor'], (0, 4, 0.0))
+        self.assertEqual(self.store.compare_cases('case1', 'case1', ['Tumor'])['Tumor'], (3, 3, 1.0))
+
+    def test_cohort_queries(self):
+        caseIds, both, either = self.store.cohort_overlap('Liver', 'Tumor')
+        self.assertEqual(caseIds, ['case1', 'case2', 'case3'])
+        self.assertEqual(both.tolist(), [2, 0, 0])
+        self.assertEqual(either.tolist(), [4, 2, 1])
+        self.assertEqual(self.store.slice_counts('Liver')[1].tolist(), [3, 2, 0])
+        self.assertEqual(self.store.cases_with_slice('Tumor', 6), ['case3'])
+        self.assertEqual(self.store.cases_with_slice('Liver', 100), [])
+        self.assertEqual(self.store.segment_matrix('Kidney', ['case2', 'case1'])[1].tolist(), [[1, 0], [0, 0]])
+
+    def test_save_load(self):
+        path = masks_path(os.path.join(self.tempDir, 'output.csv'))
+        self.assertEqual(os.path.basename(path), 'output_masks.npz')
+        self.store.save(path)
+        loaded = PresenceMaskStore.load(path)
+        self.assertEqual(loaded.case_ids(), self.store.case_ids())
+        for caseId in self.store.case_ids():
+            self.assertEqual(loaded.masks[caseId], self.store.masks[caseId])
+        self.assertEqual(loaded.get('case1', 'Tumor').numberOfSlices, 12)
+
+        # Cases of a file replace cases with the same ID and keep the others
+        update = PresenceMaskStore()
+        update.add_case('case1', {'Liver': [7]}, 12)
+        update.save(path)
+        loaded.update_from_file(path)
+        self.assertEqual(loaded.masks['case1'], {'Liver': SliceMask.from_indices([7], 12)})
+        self.assertIn('case2', loaded)
+        loaded.remove_case('case2')
+        self.assertEqual(len(loaded), 2)
+
+    def test_write_case_masks(self):
+        outputPath = os.path.join(self.tempDir, 'output.csv')
+        write_case_masks(self.store, ['case1', 'case2', 'missing'], outputPath)
+        self.assertEqual(PresenceMaskStore.load(masks_path(outputPath)).case_ids(), ['case1', 'case2'])
+        # Append mode keeps the other cases of the file, except the removed ones
+        write_case_masks(self.store, ['case3'], outputPath, appendMode=True, removedIds=['case1'])
+        self.assertEqual(PresenceMaskStore.load(masks_path(outputPath)).case_ids(), ['case2', 'case3'])
+        self.assertFalse(os.path.exists(masks_path(outputPath) + '.tmp'))
+
+
+if __name__ == '__main__':
+    unittest.main()
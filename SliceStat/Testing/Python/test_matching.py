@@ -0,0 +1,80 @@
+"""
+Unit tests of the volume to segmentation matching of Multi Sample export (SliceStatLib.Matching).
+
+Only the standard library is required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Matching import (SegmentationIndex, format_match_diagnostic, select_matching_segmentation,  # noqa: E402
+                                   match_volumes, volume_base_name)
+
+
+def linear_match(volumeBaseName, segmentationIdentifiers):
+    """
+    Matching rule of the original Multi Sample export: scan all segmentations, prefer " (final)", first in order.
+    """
+    candidates = [index for index, identifier in enumerate(segmentationIdentifiers) if identifier.startswith(volumeBaseName)]
+    finalPreferred = [index for index in candidates if ' (final)' in segmentationIdentifiers[index]]
+    preferred = finalPreferred or candidates
+    return preferred[0] if preferred else None
+
+
+class SegmentationIndexTest(unittest.TestCase):
+
+    def test_volume_base_name(self):
+        self.assertEqual(volume_base_name('case1.nii.gz'), 'case1')
+        self.assertEqual(volume_base_name('case1.nii'), 'case1')
+        self.assertEqual(volume_base_name('case1.nrrd'), 'case1.nrrd')
+
+    def test_same_as_linear_scan(self):
+        random.seed(0)
+        names = [f'case{number}' for number in range(40)]
+        identifiers = []
+        for _ in range(120):
+            suffix = random.choice(['.seg.nrrd', '_v2.seg.nrrd', ' (final).seg.nrrd', '0.seg.nrrd'])
+            identifiers.append(random.choice(names) + suffix)
+        identifiers.append('')
+        segmentationIndex = SegmentationIndex(identifiers)
+        for name in names + ['case', 'other']:
+            self.assertEqual(segmentationIndex.match(name).index, linear_match(name, identifiers), name)
+            self.assertEqual(select_matching_segmentation(name, identifiers), linear_match(name, identifiers), name)
+
+    def test_final_preferred(self):
+        identifiers = ['case1_v2.seg.nrrd', 'case1 (final).seg.nrrd', 'case1.seg.nrrd', 'case10.seg.nrrd']
+        match = SegmentationIndex(identifiers).match('case1', 'Case 1')
+        self.assertEqual(match.index, 1)
+        self.assertEqual(match.candidates, [0, 1, 2, 3])
+        self.assertFalse(match.ambiguous)
+        self.assertIsNone(match.diagnostic(identifiers))
+
+    def test_ambiguous(self):
+        identifiers = ['case1.seg.nrrd', 'case2.seg.nrrd', 'case1_v2.seg.nrrd']
+        match = SegmentationIndex(identifiers).match('case1')
+        self.assertEqual(match.index, 0)
+        diagnostic = match.diagnostic(identifiers)
+        self.assertEqual(diagnostic, {'volume': 'case1', 'selected': 'case1.seg.nrrd',
+                                      'candidates': ['case1.seg.nrrd', 'case1_v2.seg.nrrd'], 'ignored': []})
+        self.assertEqual(format_match_diagnostic(diagnostic),
+                         "Volume 'case1' matches several segmentations ('case1.seg.nrrd', 'case1_v2.seg.nrrd'), "
+                         "using 'case1.seg.nrrd'")
+        self.assertIsNone(SegmentationIndex(identifiers).match('case3').index)
+
+    def test_match_volumes(self):
+        identifiers = ['case1.seg.nrrd', 'case2.seg.nrrd', 'case1_v2.seg.nrrd']
+        matches, diagnostics, warnings = match_volumes([('case1', 'Case 1'), ('case2', 'Case 2'), ('case3', 'Case 3')],
+                                                       identifiers)
+        self.assertEqual(matches, [0, 1, None])
+        self.assertEqual([diagnostic['volume'] for diagnostic in diagnostics], ['Case 1'])
+        self.assertEqual(warnings, [format_match_diagnostic(diagnostics[0]), "Volume 'Case 3' has no matching segmentation"])
+
+
+if __name__ == "__main__":
+    unittest.main()
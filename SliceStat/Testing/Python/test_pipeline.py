@@ -0,0 +1,180 @@
+"""
+Unit tests of the prefetching batch pipeline and its backpressure (SliceStatLib.Pipeline).
+
+Only numpy and the standard library are required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.FileIO import SegmentationFile  # noqa: E402
+from SliceStatLib.Pipeline import ByteBudget, CasePrefetcher, ResultWriter  # noqa: E402
+from SliceStatTestData import write_nifti, write_segmentation  # noqa: E402
+
+# Time given to a background thread to reach the point where it blocks, in seconds
+SETTLE_TIME = 0.2
+
+
+def wait_until(condition, timeout=5.0):
+    endTime = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > endTime:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class ByteBudgetTest(unittest.TestCase):
+
+    def test_acquire_blocks_until_release(self):
+        budget = ByteBudget(100)
+        self.assertTrue(budget.acquire(60))
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: budget.acquire(60) and acquired.set())
+        thread.start()
+        self.assertFalse(acquired.wait(SETTLE_TIME))
+        budget.release(60)
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+        self.assertEqual(budget.used, 60)
+
+    def test_oversized_request_when_empty(self):
+        budget = ByteBudget(100)
+        self.assertTrue(budget.acquire(250))
+        self.assertEqual(budget.used, 250)
+
+    def test_close_wakes_waiters(self):
+        budget = ByteBudget(100)
+        budget.acquire(100)
+        results = []
+        thread = threading.Thread(target=lambda: results.append(budget.acquire(10)))
+        thread.start()
+        time.sleep(SETTLE_TIME)
+        budget.close()
+        thread.join(5)
+        self.assertEqual(results, [False])
+        self.assertFalse(budget.acquire(1))
+
+
+class CasePrefetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.casePaths = []
+        for index in range(4):
+            volumePath = os.path.join(self.tempDir.name, f"case{index}.nii.gz")
+            segmentationPath = os.path.join(self.tempDir.name, f"case{index}.seg.nrrd")
+            labelArray = np.zeros((8, 6, 5), dtype=np.uint8)
+            labelArray[index, 2, 2] = 1
+            write_nifti(volumePath, (8, 6, 5))
+            write_segmentation(segmentationPath, [(labelArray, {'A': 1})])
+            self.casePaths.append((volumePath, segmentationPath))
+        self.caseSize = SegmentationFile(self.casePaths[0][1]).header.dataSize
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_cases_in_order(self):
+        with CasePrefetcher(self.casePaths) as prefetcher:
+            indices = []
+            for case in prefetcher:
+                indices.append(case.index)
+                self.assertIsNone(case.errorMessage)
+                self.assertEqual(case.size, self.caseSize)
+                prefetcher.release(case)
+                self.assertIsNone(case.segmentationFile)
+        self.assertEqual(indices, [0, 1, 2, 3])
+        self.assertEqual(prefetcher.budget.used, 0)
+
+    def test_memory_budget_backpressure(self):
+        # The budget holds one decompressed case: the loader waits until the consumer releases it
+        with CasePrefetcher(self.casePaths, prefetchCases=4, memoryBudget=self.caseSize) as prefetcher:
+            cases = iter(prefetcher)
+            first = next(cases)
+            time.sleep(SETTLE_TIME)
+            self.assertEqual(prefetcher.budget.used, self.caseSize)
+            self.assertTrue(prefetcher._queue.empty())
+            prefetcher.release(first)
+            second = next(cases)
+            self.assertEqual(second.index, 1)
+            self.assertEqual(prefetcher.budget.used, self.caseSize)
+
+    def test_queue_backpressure(self):
+        # The loader stays at most prefetchCases cases ahead of the consumer
+        with CasePrefetcher(self.casePaths, prefetchCases=1) as prefetcher:
+            cases = iter(prefetcher)
+            first = next(cases)
+            self.assertTrue(wait_until(prefetcher._queue.full))
+            time.sleep(SETTLE_TIME)
+            # One case is queued and one is loaded and waits for room in the queue
+            self.assertEqual(prefetcher.budget.used, 3 * self.caseSize)
+            prefetcher.release(first)
+
+    def test_close_releases_pending_cases(self):
+        prefetcher = CasePrefetcher(self.casePaths, prefetchCases=2)
+        self.assertTrue(wait_until(prefetcher._queue.full))
+        prefetcher.close()
+        self.assertEqual(prefetcher.budget.used, 0)
+        self.assertFalse(prefetcher._thread.is_alive())
+
+    def test_load_error(self):
+        casePaths = [(os.path.join(self.tempDir.name, 'missing.nii.gz'), self.casePaths[0][1])] + self.casePaths[1:2]
+        with CasePrefetcher(casePaths) as prefetcher:
+            cases = list(prefetcher)
+        self.assertEqual([case.index for case in cases], [0, 1])
+        self.assertIsNotNone(cases[0].errorMessage)
+        self.assertIsNone(cases[0].segmentationFile)
+        self.assertIsNone(cases[1].errorMessage)
+
+
+class ResultWriterTest(unittest.TestCase):
+
+    def test_order_and_backpressure(self):
+        written = []
+        unblock = threading.Event()
+
+        def on_case_done(index, outcome):
+            unblock.wait(5)
+            written.append((index, outcome))
+
+        writer = ResultWriter(on_case_done, maxPending=1)
+        writer.submit(0, 'a')
+        writer.submit(1, 'b')
+        # The writer is blocked on the first result and one result is pending: the next submit waits
+        submitted = threading.Event()
+        thread = threading.Thread(target=lambda: writer.submit(2, 'c') or submitted.set())
+        thread.start()
+        self.assertFalse(submitted.wait(SETTLE_TIME))
+        unblock.set()
+        self.assertTrue(submitted.wait(5))
+        thread.join()
+        writer.close()
+        self.assertEqual(written, [(0, 'a'), (1, 'b'), (2, 'c')])
+
+    def test_error_is_raised(self):
+        def on_case_done(index, outcome):
+            raise OSError("disk full")
+
+        writer = ResultWriter(on_case_done)
+        writer.submit(0, 'a')
+        with self.assertRaises(OSError):
+            writer.close()
+        with self.assertRaises(OSError):
+            with ResultWriter(on_case_done) as writer:
+                writer.submit(0, 'a')
+                wait_until(lambda: writer._error is not None)
+                writer.submit(1, 'b')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+Unit tests of the slice presence computation on arrays (SliceStatLib.Presence).
+
+Only numpy is required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import SliceStatLib  # noqa: E402
+
+
+def grid(spacing=(1.0, 1.0, 1.0), origin=(0.0, 0.0, 0.0)):
+    """
+    Get an axis-aligned 4x4 IJK to RAS matrix.
+    """
+    matrix = np.diag(list(spacing) + [1.0])
+    matrix[:3, 3] = origin
+    return matrix
+
+
+class ReferenceSliceLabelCounterTest(unittest.TestCase):
+
+    def test_same_grid(self):
+        labelArray = np.zeros((10, 6, 8), dtype=np.uint8)
+        labelArray[2:5, 1:3, 1:3] = 1
+        labelArray[7, 4, 6] = 2
+        counts = SliceStatLib.reference_slice_label_counts(labelArray, 2, grid(), grid(), (8, 6, 10))
+        np.testing.assert_array_equal(counts, SliceStatLib.slice_label_counts(labelArray, 2))
+
+    def test_shifted_slices(self):
+        # Source slice k is reference slice k + 3, slices past the reference volume are dropped
+        labelArray = np.zeros((10, 4, 4), dtype=np.uint8)
+        labelArray[[0, 5, 9], 1, 1] = 1
+        counts = SliceStatLib.reference_slice_label_counts(labelArray, 1, grid(origin=(0, 0, 3)), grid(), (4, 4, 10))
+        self.assertEqual(np.flatnonzero(counts[:, 1]).tolist(), [3, 8])
+
+    def test_voxels_outside_in_plane_are_dropped(self):
+        # Reference volume of 20 x 30 x 40 voxels; the segmentation grid starts 5 voxels before it in I
+        # and is 30 voxels wide, so it extends past the reference volume on both sides in I
+        referenceDimensions = (20, 30, 40)
+        labelArray = np.zeros((40, 30, 30), dtype=np.uint8)
+        labelArray[5:8, 10, 0:3] = 1      # reference I -5..-3: outside
+        labelArray[3:13, 10, 26:30] = 2   # reference I 21..24: outside
+        labelArray[20:22, 10, 10] = 3     # reference I 5: inside
+        counts = SliceStatLib.reference_slice_label_counts(labelArray, 3, grid(origin=(-5, 0, 0)), grid(),
+                                                          referenceDimensions)
+        self.assertFalse(counts[:, 1].any())
+        self.assertFalse(counts[:, 2].any())
+        self.assertEqual(np.flatnonzero(counts[:, 3]).tolist(), [20, 21])
+
+    def test_voxels_outside_in_plane_are_dropped_from_slabs(self):
+        labelArray = np.zeros((12, 8, 8), dtype=np.uint8)
+        labelArray[:, 0, 0] = 1
+        labelArray[4, 7, 7] = 2
+        counter = SliceStatLib.ReferenceSliceLabelCounter(2, grid(origin=(-1, -1, 0)), grid(), (6, 6, 12))
+        for firstSlice in range(0, 12, 5):
+            counter.add_slab(labelArray[firstSlice:firstSlice + 5], firstSlice)
+        self.assertFalse(counter.counts[:, 1].any())
+        self.assertFalse(counter.counts[:, 2].any())
+
+    def test_rotated_in_plane(self):
+        # In-plane rotation by 90 degrees: source i is reference J, source j is reference -I
+        sourceIjkToRas = np.array([[0.0, -1.0, 0.0, 3.0],
+                                   [1.0, 0.0, 0.0, 0.0],
+                                   [0.0, 0.0, 1.0, 0.0],
+                                   [0.0, 0.0, 0.0, 1.0]])
+        labelArray = np.zeros((5, 8, 8), dtype=np.uint8)
+        labelArray[1, 0, 2] = 1   # reference (3, 2): inside
+        labelArray[2, 6, 2] = 1   # reference (-3, 2): outside
+        labelArray[3, 1, 7] = 1   # reference (2, 7): outside in J
+        counts = SliceStatLib.reference_slice_label_counts(labelArray, 1, sourceIjkToRas, grid(), (4, 4, 5))
+        self.assertEqual(np.flatnonzero(counts[:, 1]).tolist(), [1])
+
+    def test_oblique_slices(self):
+        # Source slices tilted against the reference slices: every voxel is mapped individually
+        angle = np.deg2rad(30)
+        sourceIjkToRas = np.eye(4)
+        sourceIjkToRas[1:3, 1:3] = [[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]]
+        labelArray = np.zeros((6, 10, 10), dtype=np.uint8)
+        labelArray[0, 4, 5] = 1   # reference K rint(4 * sin 30) = 2
+        labelArray[0, 4, 9] = 1   # reference I 9: outside
+        counter = SliceStatLib.ReferenceSliceLabelCounter(1, sourceIjkToRas, grid(), (8, 10, 6))
+        self.assertFalse(counter.parallelSlices)
+        counter.add_slab(labelArray, 0)
+        self.assertEqual(np.flatnonzero(counter.counts[:, 1]).tolist(), [2])
+        self.assertEqual(counter.counts[2, 1], 1)
+
+    def test_coarser_source_grid(self):
+        # Source voxels of 2 mm on a 1 mm reference: each source slice maps to every second reference slice
+        labelArray = np.ones((3, 2, 2), dtype=np.uint8)
+        counts = SliceStatLib.reference_slice_label_counts(labelArray, 1, grid(spacing=(2, 2, 2)), grid(), (3, 3, 10))
+        self.assertEqual(np.flatnonzero(counts[:, 1]).tolist(), [0, 2, 4])
+        # Only the source voxels at reference I, J 0 and 2 are inside a 3 x 3 reference volume
+        self.assertEqual(counts[0, 1], 4)
+
+
+class GroupByLayerTest(unittest.TestCase):
+
+    def test_groups(self):
+        layers = {'a': 0, 'b': 1, 'c': 0, 'd': -1, 'e': -1}
+
+        def layerIndexOf(segmentId):
+            if segmentId == 'f':
+                raise ValueError("no labelmap")
+            return layers[segmentId]
+
+        self.assertEqual(SliceStatLib.group_by_layer(['a', 'b', 'c', 'd', 'e', 'f'], layerIndexOf),
+                         [['a', 'c'], ['b'], ['d'], ['e'], ['f']])
+
+
+class CropToReferenceTest(unittest.TestCase):
+
+    def test_crop_past_all_edges(self):
+        # Labelmap of 6 x 5 x 4 (I, J, K) starting at reference voxel (-2, 1, -1) of a 3 x 4 x 10 volume
+        labelArray = np.arange(4 * 5 * 6).reshape((4, 5, 6))
+        cropped, ijkOffset = SliceStatLib.crop_to_reference(labelArray, (-2, 1, -1), (3, 4, 10))
+        self.assertEqual(ijkOffset, (0, 1, 0))
+        self.assertEqual(cropped.shape, (3, 3, 3))
+        np.testing.assert_array_equal(cropped, labelArray[1:, :3, 2:5])
+
+    def test_crop_outside(self):
+        labelArray = np.ones((2, 2, 2), dtype=np.uint8)
+        cropped, ijkOffset = SliceStatLib.crop_to_reference(labelArray, (5, 0, 0), (3, 3, 3))
+        self.assertEqual(cropped.size, 0)
+        self.assertEqual(SliceStatLib.slice_label_counts(cropped, 1).sum(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Unit tests of the per-stage profiling of exports (SliceStatLib.Profiling).
+
+Only the standard library is required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import concurrent.futures
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Profiling import ExportProfiler, timed_call, trace_path  # noqa: E402
+
+
+class ExportProfilerTest(unittest.TestCase):
+
+    def test_stages(self):
+        profiler = ExportProfiler(traceMemory=False)
+        profiler.start()
+        with profiler.stage('export', 'case0', 'Liver'):
+            # Stages do not nest
+            with profiler.stage('histogram', 'case0', 'Liver'):
+                pass
+            profiler.record_stage('histogram', 1.0, 'case0', 'Liver')
+        profiler.record_stage('histogram', 0.5, 'case0', 'Tumor')
+        profiler.record_path('case0', 'Liver', 'internal')
+        profiler.stop()
+        self.assertEqual([event['stage'] for event in profiler.events], ['export', 'histogram'])
+        summary = profiler.summary()
+        self.assertEqual(summary['stages']['histogram'], {'count': 1, 'seconds': 0.5, 'allocatedBytes': 0, 'peakBytes': 0})
+        self.assertEqual(summary['paths'], {'internal': 1})
+        self.assertIn("histogram: 0.50 s (1x)", profiler.format_summary())
+
+    def test_timed_call_in_worker_thread(self):
+        # The time measured in the worker does not include the time the caller takes to collect the result
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(timed_call, sorted, [3, 1, 2])
+            time.sleep(0.2)
+            result, seconds = future.result()
+        self.assertEqual(result, [1, 2, 3])
+        self.assertLess(seconds, 0.1)
+
+    def test_json_trace(self):
+        profiler = ExportProfiler()
+        profiler.start()
+        with profiler.stage('csv'):
+            bytearray(1024 * 1024)
+        profiler.stop()
+        with tempfile.TemporaryDirectory() as directory:
+            path = trace_path(os.path.join(directory, 'output.csv'))
+            self.assertEqual(os.path.basename(path), 'output_trace.json')
+            profiler.write_json(path)
+            with open(path, encoding='utf-8') as f:
+                trace = json.load(f)
+        self.assertEqual(trace['events'][0]['stage'], 'csv')
+        self.assertGreaterEqual(trace['events'][0]['peakBytes'], 1024 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Unit tests of the persistent result cache (SliceStatLib.DiskCache) and of the in-place update of
+Multi Sample CSV files in append mode (SliceStatLib.CsvExport).
+
+Only numpy and the standard library are required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import csv
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import SliceStatLib.DiskCache  # noqa: E402
+from SliceStatLib.CsvExport import write_csv_all  # noqa: E402
+from SliceStatLib.DiskCache import (CACHE_VERSION, FILE_EXTRACTION, ResultCache, case_key, content_key,  # noqa: E402
+                                    geometry_key, make_key)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tempDir.name, 'cache')
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_put_and_get(self):
+        cache = ResultCache(self.directory)
+        self.assertIsNone(cache.get('missing'))
+        self.assertIsNone(cache.get(None))
+        cache.put('key', {'Liver': [1, 2, 3], 'Tumor': []})
+        self.assertEqual(ResultCache(self.directory).get('key'), {'Liver': [1, 2, 3], 'Tumor': []})
+        cache.clear()
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.totalSize, 0)
+
+    def test_least_recently_used_eviction(self):
+        cache = ResultCache(self.directory)
+        for time, key in enumerate(['a', 'b', 'c']):
+            cache.put(key, {'Liver': [1, 2, 3]})
+            path = os.path.join(self.directory, key + '.json')
+            os.utime(path, ns=(time * 10 ** 9, time * 10 ** 9))
+        entrySize = cache.totalSize // 3
+        # Reading 'a' makes it the most recently used entry, 'b' is then evicted first
+        cache.get('a')
+        cache.maxSize = 3 * entrySize
+        cache.put('d', {'Liver': [1, 2, 3]})
+        self.assertEqual(sorted(os.listdir(self.directory)), ['a.json', 'c.json', 'd.json'])
+        self.assertEqual(cache.totalSize, 3 * entrySize)
+
+    def test_key(self):
+        geometry = geometry_key((10, 20, 30), [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
+        key = make_key(['content', 'abc'], geometry, [['Segment_1', 'Liver']])
+        self.assertEqual(key, make_key(['content', 'abc'], geometry, [['Segment_1', 'Liver']]))
+        self.assertNotEqual(key, make_key(['content', 'abc'], geometry, [['Segment_1', 'Liver']], FILE_EXTRACTION))
+        self.assertNotEqual(key, make_key(['content', 'abc'], geometry, [['Segment_1', 'Liver']],
+                                          options={'exactVoxelSlices': True}))
+        # Entries of an older cache version are not used anymore
+        with mock.patch.object(SliceStatLib.DiskCache, 'CACHE_VERSION', CACHE_VERSION + 1):
+            self.assertNotEqual(key, make_key(['content', 'abc'], geometry, [['Segment_1', 'Liver']]))
+        self.assertEqual(key, case_key(['content', 'abc'], (10, 20, 30), np.eye(4), [['Segment_1', 'Liver']]))
+
+    def test_content_key(self):
+        voxels = np.zeros((2, 3, 4), dtype=np.uint8)
+        layers = [((0, 3, 0, 2, 0, 1), np.eye(4), voxels)]
+        key = content_key([('Segment_1', 1)], layers)
+        self.assertEqual(key, content_key([('Segment_1', 1)], [((0, 3, 0, 2, 0, 1), np.eye(4), voxels.copy())]))
+        self.assertNotEqual(key, content_key([('Segment_1', 2)], layers))
+        voxels[1, 2, 3] = 1
+        self.assertNotEqual(key, content_key([('Segment_1', 1)], layers))
+
+
+class AppendCsvTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.outputPath = os.path.join(self.tempDir.name, 'output.csv')
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def read_output(self):
+        with open(self.outputPath, newline='', encoding='utf-8-sig') as csvfile:
+            return list(csv.reader(csvfile))
+
+    def test_update_in_place(self):
+        write_csv_all({'case0': {'Liver': [1]}, 'case1': {'Liver': [2]}}, self.outputPath)
+        write_csv_all({'case2': {'Liver': [3]}, 'case0': {'Liver': [4, 5]}}, self.outputPath, appendMode=True)
+        self.assertEqual(self.read_output(), [['ID', 'SegmentName', 'SliceNumbers', 'SliceCount'],
+                                              ['\tcase0', 'Liver', '4,5', '2'], ['\tcase1', 'Liver', '2', '1'],
+                                              ['\tcase2', 'Liver', '3', '1']])
+
+    def test_append_to_empty_file(self):
+        open(self.outputPath, 'w').close()
+        write_csv_all({'case0': {'Liver': [1]}}, self.outputPath, appendMode=True)
+        self.assertEqual(self.read_output(), [['ID', 'SegmentName', 'SliceNumbers', 'SliceCount'],
+                                              ['\tcase0', 'Liver', '1', '1']])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Unit tests of the frame loop and CSV output of segmentation sequences (SliceStatLib.Sequence).
+
+Only numpy and the standard library are required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import csv
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Progress import ExportCancelled, run_to_completion  # noqa: E402
+from SliceStatLib.Sequence import process_frames_steps, write_frames_csv  # noqa: E402
+
+
+class ProcessFramesStepsTest(unittest.TestCase):
+
+    def test_unchanged_frames_are_reused(self):
+        frameKeys = ['a', 'b', 'a', None, None]
+        computed = []
+        done = []
+
+        def computeFrame(frameIndex):
+            yield
+            computed.append(frameIndex)
+            return {'Liver': [frameIndex]}
+
+        def frameKeyOf(frameIndex):
+            if frameIndex == 4:
+                raise RuntimeError("no reference volume")
+            return frameKeys[frameIndex]
+
+        frameResults = run_to_completion(process_frames_steps(
+            ['0', '0.5', '1', '1.5', '2'], computeFrame, frameKeyOf,
+            onFrameDone=lambda frameIndex, reused: done.append(reused)))
+        # Frames without a key are always computed
+        self.assertEqual(computed, [0, 1, 3, 4])
+        self.assertEqual(done, [False, False, True, False, False])
+        self.assertEqual(frameResults[2], (2, '1', {'Liver': [0]}))
+        self.assertEqual([frameValue for _, frameValue, _ in frameResults], ['0', '0.5', '1', '1.5', '2'])
+
+    def test_cancel(self):
+        def onFrameStarted(frameIndex):
+            if frameIndex == 1:
+                raise ExportCancelled("Processing cancelled")
+
+        def computeFrame(frameIndex):
+            return {'Liver': [frameIndex]}
+            yield
+
+        with self.assertRaises(ExportCancelled):
+            run_to_completion(process_frames_steps(['0', '1'], computeFrame, onFrameStarted=onFrameStarted))
+
+
+class WriteFramesCsvTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.outputPath = os.path.join(self.tempDir.name, 'output.csv')
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def read_rows(self):
+        with open(self.outputPath, newline='', encoding='utf-8-sig') as csvfile:
+            return list(csv.reader(csvfile))
+
+    def test_replace_sequence_in_append_mode(self):
+        write_frames_csv([(0, '0', {'Liver': [1, 2]}), (1, '0.5', {'Liver': [2]})], self.outputPath, 'heart')
+        rows = self.read_rows()
+        self.assertEqual(rows[0][-2:], ['Frame', 'FrameValue'])
+        self.assertEqual([(row[0].strip(), row[-2], row[-1]) for row in rows[1:]], [('heart', '0', '0'), ('', '1', '0.5')])
+
+        write_frames_csv([(0, '0', {'Liver': [3]})], self.outputPath, 'lung', appendMode=True)
+        write_frames_csv([(0, '0', {'Liver': [5]})], self.outputPath, 'heart', appendMode=True)
+        rows = self.read_rows()
+        self.assertEqual([row[0].strip() for row in rows[1:]], ['heart', 'lung'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Unit tests of the merge of sharded exports (SliceStatLib.Sharding).
+
+Only numpy and the standard library are required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import SliceStatLib  # noqa: E402
+
+
+class MergeShardsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.outputPath = os.path.join(self.tempDir.name, 'output.csv')
+        self.results = {f'case{index:02d}': {'Liver': list(range(index, index + 3)), 'Tumor': [index]}
+                        for index in range(12)}
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def export_shard(self, shardIndex, shardCount):
+        self.write_shard(shardIndex, shardCount, {volumeId: segmentResults for volumeId, segmentResults in self.results.items()
+                                                  if SliceStatLib.shard_of(volumeId, shardCount) == shardIndex})
+
+    def write_shard(self, shardIndex, shardCount, results):
+        export = SliceStatLib.CohortExport(self.outputPath, shardIndex=shardIndex, shardCount=shardCount)
+        shardIds = sorted(results)
+        for volumeId in shardIds:
+            export.add_case(volumeId, (results[volumeId], None))
+        export.close()
+        export.finish(shardIds, shardIds)
+
+    def export_unsharded(self):
+        outputPath = os.path.join(self.tempDir.name, 'unsharded.csv')
+        export = SliceStatLib.CohortExport(outputPath)
+        for volumeId in sorted(self.results):
+            export.add_case(volumeId, (self.results[volumeId], None))
+        export.close()
+        export.finish(sorted(self.results))
+        return outputPath
+
+    def test_merge(self):
+        for shardIndex in range(3):
+            self.export_shard(shardIndex, 3)
+        self.assertEqual(len(SliceStatLib.find_shards(self.outputPath)), 3)
+        self.assertEqual(SliceStatLib.merge_shards(self.outputPath, columnarFormat='npz', cohortIndex=True), [])
+        with open(self.outputPath, 'rb') as merged, open(self.export_unsharded(), 'rb') as unsharded:
+            self.assertEqual(merged.read(), unsharded.read())
+        self.assertTrue(os.path.exists(SliceStatLib.columnar_path(self.outputPath, 'npz')))
+        with SliceStatLib.CohortIndex(SliceStatLib.index_path(self.outputPath)) as cohortIndex:
+            self.assertEqual(cohortIndex.cases_with_segment('Tumor', sliceIndex=5), ['case05'])
+
+    def test_missing_shard(self):
+        self.export_shard(0, 2)
+        with self.assertRaises(ValueError):
+            SliceStatLib.merge_shards(self.outputPath)
+        self.assertFalse(os.path.exists(self.outputPath))
+        warnings = SliceStatLib.merge_shards(self.outputPath, allowIncomplete=True)
+        self.assertEqual(warnings, ["Shards 1 of 2 are missing."])
+        _, groups = SliceStatLib.read_csv_groups(self.outputPath)
+        self.assertEqual([volumeId for volumeId, _ in groups],
+                         sorted(volumeId for volumeId in self.results if SliceStatLib.shard_of(volumeId, 2) == 0))
+
+    def test_duplicate(self):
+        self.export_shard(0, 2)
+        # Shard 1 also writes a case of shard 0, e.g. after the shard assignment was changed
+        duplicateId = next(volumeId for volumeId in sorted(self.results) if SliceStatLib.shard_of(volumeId, 2) == 0)
+        results = {volumeId: segmentResults for volumeId, segmentResults in self.results.items()
+                   if SliceStatLib.shard_of(volumeId, 2) == 1 or volumeId == duplicateId}
+        self.write_shard(1, 2, results)
+        warnings = SliceStatLib.merge_shards(self.outputPath)
+        self.assertEqual(warnings, [f"Volume '{duplicateId}' is assigned to shards 0, 1",
+                                    f"Volume '{duplicateId}' is written by several shards, shard 1 is skipped"])
+
+        results[duplicateId] = {'Liver': [100], 'Tumor': []}
+        self.write_shard(1, 2, results)
+        with self.assertRaisesRegex(ValueError, "several shards with different results"):
+            SliceStatLib.merge_shards(self.outputPath)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Unit tests of the per-slice voxel counts and areas along all axes (SliceStatLib.Presence.axis_label_counts,
+SliceStatLib.Statistics).
+
+Only numpy and the standard library are required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import csv
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Presence import axis_label_counts, slice_label_counts  # noqa: E402
+from SliceStatLib.Statistics import SliceStatistics, statistics_rows, write_statistics_csv  # noqa: E402
+
+
+def reference_axis_counts(labelArray, maxLabel):
+    """
+    Per-slice label histograms along each axis computed one label and one axis at a time.
+    """
+    return tuple(np.stack([np.sum(labelArray == label, axis=tuple(a for a in range(3) if a != axis))
+                           for label in range(maxLabel + 1)], axis=1) for axis in range(3))
+
+
+class AxisLabelCountsTest(unittest.TestCase):
+
+    def test_same_as_per_axis_counts(self):
+        labelArray = np.random.default_rng(0).integers(0, 5, size=(7, 6, 5)).astype(np.uint8)
+        # Labels above maxLabel are ignored
+        for axisCounts, expected in zip(axis_label_counts(labelArray, 3), reference_axis_counts(labelArray, 3)):
+            np.testing.assert_array_equal(axisCounts, expected)
+        np.testing.assert_array_equal(axis_label_counts(labelArray, 3)[0], slice_label_counts(labelArray, 3))
+
+    def test_slabs(self):
+        # A slab budget of one slice gives the same result
+        labelArray = np.random.default_rng(1).integers(0, 3, size=(9, 4, 3)).astype(np.int16)
+        for axisCounts, expected in zip(axis_label_counts(labelArray, 2, maxSlabVoxels=1), axis_label_counts(labelArray, 2)):
+            np.testing.assert_array_equal(axisCounts, expected)
+
+    def test_empty(self):
+        kCounts, jCounts, iCounts = axis_label_counts(np.zeros((0, 4, 3), dtype=np.uint8), 2)
+        self.assertEqual((kCounts.shape, jCounts.shape, iCounts.shape), ((0, 3), (4, 3), (3, 3)))
+
+
+class SliceStatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        # 2 voxels on slice K=1 and 1 voxel on slice K=3, spacing 0.5 x 2 x 3 mm (I, J, K)
+        labelArray = np.zeros((4, 3, 2), dtype=np.uint8)
+        labelArray[1, 0, 0:2] = 1
+        labelArray[3, 2, 1] = 1
+        kCounts, jCounts, iCounts = axis_label_counts(labelArray, 1)
+        self.statistics = SliceStatistics(kCounts[:, 1], jCounts[:, 1], iCounts[:, 1], (0.5, 2.0, 3.0))
+
+    def test_areas(self):
+        self.assertEqual(self.statistics.voxel_counts('K').tolist(), [0, 2, 0, 1])
+        self.assertEqual(self.statistics.areas('K').tolist(), [0, 2.0, 0, 1.0])
+        self.assertEqual(self.statistics.areas('J').tolist(), [3.0, 0, 1.5])
+        self.assertEqual(self.statistics.areas('I').tolist(), [6.0, 12.0])
+        self.assertEqual(self.statistics.extent('K'), (1, 3))
+        self.assertEqual(self.statistics.voxelCount, 3)
+        self.assertEqual(self.statistics.volume, 9.0)
+        self.assertIsNone(SliceStatistics([0], [0], [0], (1, 1, 1)).extent())
+
+    def test_rows(self):
+        rows = statistics_rows('case0', {'Liver': self.statistics})
+        self.assertEqual(rows[:2], [['case0', 'Liver', 'K', 1, 2, 2.0], ['case0', 'Liver', 'K', 3, 1, 1.0]])
+        self.assertEqual(len(rows), 2 + 2 + 2)
+
+    def test_append(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'output_stats.csv')
+            write_statistics_csv({'case0': {'Liver': self.statistics}, 'case1': {'Liver': self.statistics}}, path)
+            write_statistics_csv({'case0': {'Tumor': self.statistics}}, path, appendMode=True)
+            with open(path, newline='', encoding='utf-8-sig') as csvfile:
+                rows = list(csv.reader(csvfile))[1:]
+        self.assertEqual([(row[0], row[1]) for row in rows], [('case1', 'Liver')] * 6 + [('case0', 'Tumor')] * 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
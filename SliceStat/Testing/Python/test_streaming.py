@@ -0,0 +1,123 @@
+"""
+Unit tests of the streamed slice presence of segmentation files (SliceStatLib.Streaming, SliceStatLib.Core)
+and of the headless batch export (SliceStatLib.Batch).
+"""
+import csv
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Batch import run_directory_batch  # noqa: E402
+from SliceStatLib.Checkpoint import open_checkpointed_csv  # noqa: E402
+from SliceStatLib.Core import process_case  # noqa: E402
+from SliceStatLib.DiskCache import ResultCache  # noqa: E402
+from SliceStatLib.FileIO import SegmentationFile  # noqa: E402
+from SliceStatLib.Streaming import segmentation_slice_indices  # noqa: E402
+from SliceStatTestData import write_nifti, write_segmentation  # noqa: E402
+
+# Reference volume of 20 x 30 x 40 voxels (I, J, K)
+VOLUME_SHAPE = (40, 30, 20)
+
+
+def segmentation_past_volume(inside=True):
+    """
+    Get a labelmap on a grid that starts 5 voxels before the reference volume in I and is 30 voxels wide,
+    so that it extends past the reference volume on both sides in I: segment A is at reference I -5..-3
+    on slices 5-7, segment C at reference I 21..24 on slices 3-12, and segment B (if inside is set) at I 5
+    on slices 20-21.
+    """
+    labelArray = np.zeros((40, 30, 30), dtype=np.uint8)
+    labelArray[5:8, 10, 0:3] = 1
+    labelArray[3:13, 10, 26:30] = 3
+    if inside:
+        labelArray[20:22, 10, 10] = 2
+    return labelArray
+
+
+class StreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.directory = self.tempDir.name
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def write_case(self, name, labelArray, origin=(-5.0, 0.0, 0.0)):
+        write_nifti(os.path.join(self.directory, name + ".nii.gz"), VOLUME_SHAPE)
+        write_segmentation(os.path.join(self.directory, name + ".seg.nrrd"),
+                           [(labelArray, {'A': 1, 'B': 2, 'C': 3})], origin=origin)
+
+    def test_segmentation_past_reference_volume(self):
+        self.write_case('case1', segmentation_past_volume())
+        segmentResults = process_case(os.path.join(self.directory, 'case1.nii.gz'),
+                                      os.path.join(self.directory, 'case1.seg.nrrd'))
+        self.assertEqual(segmentResults, {'A': [], 'B': [20, 21], 'C': []})
+
+    def test_small_memory_budget(self):
+        # One slice per slab gives the same result
+        self.write_case('case1', segmentation_past_volume())
+        segmentationFile = SegmentationFile(os.path.join(self.directory, 'case1.seg.nrrd'))
+        referenceIjkToRas = np.eye(4)
+        sliceIndices = segmentation_slice_indices(segmentationFile, referenceIjkToRas, VOLUME_SHAPE[::-1], memoryBudget=1)
+        self.assertEqual(sliceIndices, {'Segment_0': [], 'Segment_1': [20, 21], 'Segment_2': []})
+
+    def test_multiple_layers(self):
+        labelArray = segmentation_past_volume()
+        layers = [((labelArray == labelValue).astype(np.uint8), {segmentName: 1})
+                  for segmentName, labelValue in (('A', 1), ('B', 2), ('C', 3))]
+        write_nifti(os.path.join(self.directory, 'case1.nii.gz'), VOLUME_SHAPE)
+        write_segmentation(os.path.join(self.directory, 'case1.seg.nrrd'), layers, origin=(-5.0, 0.0, 0.0))
+        segmentResults = process_case(os.path.join(self.directory, 'case1.nii.gz'),
+                                      os.path.join(self.directory, 'case1.seg.nrrd'))
+        self.assertEqual(segmentResults, {'A': [], 'B': [20, 21], 'C': []})
+
+    def test_batch_has_no_rows_outside_reference_volume(self):
+        self.write_case('case1', segmentation_past_volume(inside=False))
+        self.write_case('case2', segmentation_past_volume())
+        outputPath = os.path.join(self.directory, 'out.csv')
+        warnings = run_directory_batch(self.directory, outputPath)
+        self.assertIn("Volume 'case1' has no matching segments", warnings)
+        with open(outputPath, newline='', encoding='utf-8-sig') as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual(rows[1:], [['\tcase2', 'A', '', '0'], ['', 'B', '20,21', '2'], ['', 'C', '', '0']])
+
+    def test_batch_resume(self):
+        self.write_case('case1', segmentation_past_volume())
+        self.write_case('case2', segmentation_past_volume())
+        outputPath = os.path.join(self.directory, 'out.csv')
+        # Checkpoint of an interrupted export that wrote case1 and a case that is no longer in the directory
+        csvWriter, _ = open_checkpointed_csv(outputPath)
+        csvWriter.add_case('case1', [['\tcase1', 'B', '20,21', '2']])
+        csvWriter.add_case('case0', [['\tcase0', 'B', '1', '1']])
+        csvWriter.close()
+        warnings = run_directory_batch(self.directory, outputPath)
+        self.assertIn("Resumed an interrupted export: 1 volumes were already written", warnings)
+        with open(outputPath, newline='', encoding='utf-8-sig') as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual([row[0] for row in rows[1:] if row[0]], ['\tcase1', '\tcase2', '\tcase0'])
+
+    def test_batch_paths_give_same_output(self):
+        # Prefetching, worker processes and the result cache go through the same export loop as the default batch
+        for name in ('case1', 'case2', 'case3'):
+            self.write_case(name, segmentation_past_volume())
+        expectedPath = os.path.join(self.directory, 'expected.csv')
+        run_directory_batch(self.directory, expectedPath)
+        with open(expectedPath, 'rb') as f:
+            expected = f.read()
+        resultCache = ResultCache(os.path.join(self.directory, 'cache'))
+        for index, options in enumerate(({'prefetchCases': 2}, {'numberOfWorkers': 2}, {'resultCache': resultCache},
+                                         {'resultCache': resultCache, 'prefetchCases': 2})):
+            outputPath = os.path.join(self.directory, f'out{index}.csv')
+            self.assertEqual(run_directory_batch(self.directory, outputPath, **options), [])
+            with open(outputPath, 'rb') as f:
+                self.assertEqual(f.read(), expected, options)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Unit tests of the slice presence of closed surface meshes (SliceStatLib.Surface).
+
+Only numpy is required, Slicer is not started.
+
+Usage:
+    python -m pytest SliceStat/Testing/Python
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from SliceStatLib.Surface import ijk_bounds, surface_slice_presence  # noqa: E402
+
+
+def box_mesh(minimum, maximum):
+    """
+    Get the points, cell offsets and connectivity of the 6 quads of an axis-aligned box in RAS.
+    """
+    points = np.array([[x, y, z] for x in (minimum[0], maximum[0]) for y in (minimum[1], maximum[1])
+                       for z in (minimum[2], maximum[2])])
+    quads = [[0, 1, 3, 2], [4, 5, 7, 6], [0, 1, 5, 4], [2, 3, 7, 6], [0, 2, 6, 4], [1, 3, 7, 5]]
+    return points, np.arange(0, 4 * len(quads) + 1, 4), np.array(quads).ravel()
+
+
+class SurfaceSlicePresenceTest(unittest.TestCase):
+
+    def test_box(self):
+        points, offsets, connectivity = box_mesh((1, 1, 2.3), (4, 4, 5.7))
+        presence = surface_slice_presence(points, offsets, connectivity, np.eye(4), (10, 10, 10))
+        self.assertEqual(np.flatnonzero(presence).tolist(), [3, 4, 5])
+
+    def test_spacing_and_origin(self):
+        # K spacing of 2 mm starting at z = -10: slice planes at z = -10, -8, ...
+        rasToIjk = np.linalg.inv(np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 2, -10], [0, 0, 0, 1]], dtype=float))
+        points, offsets, connectivity = box_mesh((1, 1, -7), (4, 4, -2))
+        presence = surface_slice_presence(points, offsets, connectivity, rasToIjk, (10, 10, 10))
+        self.assertEqual(np.flatnonzero(presence).tolist(), [2, 3, 4])
+
+    def test_clipped_to_reference(self):
+        points, offsets, connectivity = box_mesh((1, 1, -3), (4, 4, 20))
+        presence = surface_slice_presence(points, offsets, connectivity, np.eye(4), (10, 10, 10))
+        self.assertTrue(presence.all())
+        # Outside of the reference box in I
+        points, offsets, connectivity = box_mesh((20, 1, 2), (24, 4, 5))
+        self.assertFalse(surface_slice_presence(points, offsets, connectivity, np.eye(4), (10, 10, 10)).any())
+
+    def test_thin_surface_between_planes(self):
+        # Thinner than a voxel and between two slice planes: not present (unlike a rasterized labelmap)
+        points, offsets, connectivity = box_mesh((1, 1, 3.2), (4, 4, 3.8))
+        self.assertFalse(surface_slice_presence(points, offsets, connectivity, np.eye(4), (10, 10, 10)).any())
+
+    def test_empty(self):
+        presence = surface_slice_presence(np.zeros((0, 3)), [0], [], np.eye(4), (10, 10, 5))
+        self.assertEqual(presence.tolist(), [False] * 5)
+        # Empty cells are ignored
+        points, offsets, connectivity = box_mesh((1, 1, 1), (2, 2, 2))
+        offsets = np.concatenate(([0, 0], offsets))
+        self.assertEqual(np.flatnonzero(surface_slice_presence(points, offsets, connectivity, np.eye(4), (10, 10, 5))).tolist(),
+                         [1, 2])
+
+    def test_ijk_bounds(self):
+        minimum, maximum = ijk_bounds((-1, 1, 2, 4, 0, 10), np.diag([1.0, 0.5, -1.0, 1.0]))
+        self.assertEqual(minimum.tolist(), [-1, 1, -10])
+        self.assertEqual(maximum.tolist(), [1, 2, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()